@@ -1,6 +1,21 @@
 import logging
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+
+from agents.rule_engine import RuleEngine, extract_facts
+from utils.outbound_dispatcher import OutboundDispatcher
+from utils.escalation_coalescer import EscalationCoalescer
+
+# Endpoints behind the API calls rules can request
+API_CALL_ENDPOINTS = {
+    "crm_escalation": "POST /crm/escalate",
+    "risk_alert": "POST /risk_alert"
+}
+
+# Documents whose API calls are delivered ahead of everything else queued
+URGENT_INTENTS = ("fraud risk", "complaint")
+URGENT_PRIORITIES = ("critical",)
+URGENT_PRIORITY = 1
 
 class ActionRouter:
     """
@@ -8,30 +23,35 @@ class ActionRouter:
     Routes documents to appropriate workflows and escalates when needed.
     """
     
-    def __init__(self, memory_store):
+    def __init__(self, memory_store, rule_engine: Optional[RuleEngine] = None, dispatcher: Optional[OutboundDispatcher] = None,
+                 coalescer: Optional[EscalationCoalescer] = None):
         """Initialize the action router"""
         self.logger = logging.getLogger(__name__)
         self.memory_store = memory_store
         
-        # Define action rules
-        self.action_rules = {
-            "email_rules": {
-                "high_urgency": ["urgent", "critical", "emergency"],
-                "angry_tone": ["angry", "frustrated"],
-                "escalation_intents": ["complaint", "fraud risk"]
-            },
-            "json_rules": {
-                "critical_errors": ["invalid syntax", "critical"],
-                "schema_issues": ["schema mismatch", "type error"]
-            },
-            "pdf_rules": {
-                "high_value": 10000.0,  # Invoice amounts above this trigger alerts
-                "regulatory_keywords": ["gdpr", "fda", "hipaa", "sox"]
-            }
+        # Routing rules are declared in rules/routing_rules.json and compiled by the engine
+        self.rule_engine = rule_engine or RuleEngine()
+        
+        # Outbound API calls are queued and delivered in the background
+        self.dispatcher = dispatcher or OutboundDispatcher()
+        
+        # API calls rules can request by name
+        self.api_call_handlers = {
+            "crm_escalation": self._crm_escalation,
+            "risk_alert": self._risk_alert
         }
         
+        # Repeated escalations about the same sender/keyword are merged per window
+        self.coalescer = coalescer or EscalationCoalescer()
+        self.coalescer.on_close = self._on_coalesced_close
+        
         self.logger.info("Action Router initialized")
     
+    @property
+    def action_rules(self) -> Dict[str, Any]:
+        """Thresholds and keyword lists of the active rule set"""
+        return self.rule_engine.table.params
+    
     def route_document(self, classification_result: Dict[str, Any], specialized_result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Route a document based on classification and specialized analysis
@@ -46,34 +66,20 @@ class ActionRouter:
         try:
             self.logger.info(f"Routing document: {classification_result.get('filename', 'unknown')}")
             
-            routing_result = {
-                "document_id": classification_result.get("id"),
-                "filename": classification_result.get("filename"),
-                "document_format": classification_result.get("document_format"),
-                "business_intent": classification_result.get("business_intent"),
-                "timestamp": datetime.now().isoformat(),
-                "actions_triggered": [],
-                "escalations": [],
-                "api_calls": [],
-                "routing_decision": "processed"
-            }
+            facts = extract_facts(classification_result, specialized_result)
+            # One table for the whole decision, even if the rules are reloaded meanwhile
+            table = self.rule_engine.get_table()
+            outcome = table.evaluate(facts)
             
-            # Route based on document format and specialized analysis
-            if classification_result.get("document_format") == "Email":
-                routing_result.update(self._route_email(classification_result, specialized_result))
-            elif classification_result.get("document_format") == "JSON":
-                routing_result.update(self._route_json(classification_result, specialized_result))
-            elif classification_result.get("document_format") == "PDF":
-                routing_result.update(self._route_pdf(classification_result, specialized_result))
-            
-            # Route based on business intent
-            routing_result.update(self._route_by_intent(classification_result))
+            routing_result = self._build_routing_result(classification_result, specialized_result, outcome, table.version,
+                                                        urgent=self._is_urgent(facts, outcome))
             
             # Log routing decision
             self.memory_store._add_trace_log("document_routed", {
                 "filename": routing_result["filename"],
                 "actions_count": len(routing_result["actions_triggered"]),
                 "escalations_count": len(routing_result["escalations"]),
+                "coalesced_count": routing_result["coalesced_count"],
                 "routing_decision": routing_result["routing_decision"]
             })
             
@@ -85,236 +91,177 @@ class ActionRouter:
             self.logger.error(f"Routing error: {str(e)}")
             return self._create_fallback_routing(classification_result, str(e))
     
-    def _route_email(self, classification_result: Dict[str, Any], email_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        """Route email-specific actions"""
-        actions = []
-        escalations = []
-        api_calls = []
+    def route_batch(self, documents: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """
+        Route many documents in a single pass over the decision table
         
-        if email_result:
-            urgency = email_result.get("urgency_level", "").lower()
-            tone = email_result.get("tone", "").lower()
-            sender = email_result.get("sender_email", "unknown")
-            
-            # High urgency emails
-            if urgency in ["high", "critical"]:
-                actions.append({
-                    "action_type": "priority_queue",
-                    "reason": f"High urgency email from {sender}",
-                    "priority": "high"
-                })
-                
-                escalations.append({
-                    "escalation_type": "urgent_email",
-                    "target": "management",
-                    "reason": f"Urgent email requires immediate attention"
-                })
+        Args:
+            documents: List of (classification_result, specialized_result) pairs
             
-            # Angry tone handling
-            if tone == "angry":
-                actions.append({
-                    "action_type": "customer_service_alert",
-                    "reason": "Angry customer detected",
-                    "priority": "high"
-                })
-                
-                # Simulate CRM escalation
-                api_calls.append(self._simulate_crm_escalation(email_result))
+        Returns:
+            Routing results in the same order as the input
+        """
+        try:
+            facts_list = [extract_facts(c, s) for c, s in documents]
+            table = self.rule_engine.get_table()
+            outcomes = table.evaluate_batch(facts_list)
+        except Exception as e:
+            self.logger.error(f"Batch routing error: {str(e)}")
+            return [self._create_fallback_routing(c, str(e)) for c, _ in documents]
         
-        return {
-            "actions_triggered": actions,
-            "escalations": escalations,
-            "api_calls": api_calls
-        }
-    
-    def _route_json(self, classification_result: Dict[str, Any], json_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        """Route JSON-specific actions"""
-        actions = []
-        escalations = []
-        api_calls = []
+        results = []
+        for (classification_result, specialized_result), facts, outcome in zip(documents, facts_list, outcomes):
+            try:
+                routing_result = self._build_routing_result(classification_result, specialized_result, outcome, table.version,
+                                                            urgent=self._is_urgent(facts, outcome))
+            except Exception as e:
+                self.logger.error(f"Routing error: {str(e)}")
+                routing_result = self._create_fallback_routing(classification_result, str(e))
+            results.append(routing_result)
         
-        if json_result:
-            is_valid = json_result.get("is_valid_json", True)
-            severity = json_result.get("severity", "").lower()
-            validation_status = json_result.get("validation_status", "").lower()
-            
-            # Critical JSON issues
-            if not is_valid or severity == "critical":
-                actions.append({
-                    "action_type": "data_validation_alert",
-                    "reason": "Critical JSON validation failure",
-                    "priority": "critical"
-                })
-                
-                escalations.append({
-                    "escalation_type": "data_integrity",
-                    "target": "data_team",
-                    "reason": "JSON parsing or validation failed"
-                })
-                
-                # Simulate risk alert
-                api_calls.append(self._simulate_risk_alert(json_result))
-            
-            # Schema issues
-            elif "schema" in validation_status or "type" in validation_status:
-                actions.append({
-                    "action_type": "schema_review",
-                    "reason": "JSON schema inconsistencies detected",
-                    "priority": "medium"
-                })
+        self.memory_store._add_trace_log("batch_routed", {
+            "documents_count": len(results),
+            "actions_count": sum(len(r["actions_triggered"]) for r in results),
+            "escalations_count": sum(len(r["escalations"]) for r in results)
+        })
         
-        return {
-            "actions_triggered": actions,
-            "escalations": escalations,
-            "api_calls": api_calls
-        }
+        self.logger.info(f"Batch routed: {len(results)} documents")
+        return results
     
-    def _route_pdf(self, classification_result: Dict[str, Any], pdf_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        """Route PDF-specific actions"""
+    def _is_urgent(self, facts: Dict[str, Any], outcome: Dict[str, Any]) -> bool:
+        """Whether a document's follow-up calls should jump the outbound queue"""
+        if facts["intent"] in URGENT_INTENTS:
+            return True
+        for hit in outcome["hits"]:
+            if any(action.get("priority") in URGENT_PRIORITIES for action in hit["actions"]):
+                return True
+            if any("urgent" in escalation["escalation_type"] for escalation in hit["escalations"]):
+                return True
+        return False
+    
+    def _build_routing_result(self, classification_result: Dict[str, Any], specialized_result: Optional[Dict[str, Any]], outcome: Dict[str, Any],
+                              rules_version: Any, urgent: bool = False) -> Dict[str, Any]:
+        """Turn a rule engine outcome into a routing result, performing requested API calls"""
+        document_id = classification_result.get("id") or classification_result.get("filename")
         actions = []
         escalations = []
         api_calls = []
         
-        if pdf_result:
-            invoice_total = self._parse_amount(pdf_result.get("invoice_total", "0"))
-            regulatory_keywords = pdf_result.get("regulatory_keywords_found", [])
+        for hit in outcome["hits"]:
+            subject = hit["subject"]
             
-            # High-value invoices
-            if invoice_total > self.action_rules["pdf_rules"]["high_value"]:
-                actions.append({
-                    "action_type": "high_value_review",
-                    "reason": f"Invoice amount ${invoice_total:,.2f} exceeds threshold",
-                    "priority": "high"
-                })
-                
-                escalations.append({
-                    "escalation_type": "financial_review",
-                    "target": "finance_team",
-                    "reason": f"High-value invoice requires approval"
-                })
+            for action in hit["actions"]:
+                actions.append(self._coalesce(action, action["action_type"], "action", subject, document_id))
             
-            # Regulatory compliance
-            if regulatory_keywords:
-                actions.append({
-                    "action_type": "compliance_review",
-                    "reason": f"Regulatory keywords detected: {', '.join(regulatory_keywords)}",
-                    "priority": "high"
-                })
+            for escalation in hit["escalations"]:
+                escalations.append(self._coalesce(escalation, escalation["escalation_type"], escalation["target"], subject, document_id))
+            
+            for name in hit["api_calls"]:
+                if name not in self.api_call_handlers:
+                    continue
                 
-                escalations.append({
-                    "escalation_type": "compliance_alert",
-                    "target": "compliance_team",
-                    "reason": "Document contains regulatory compliance requirements"
-                })
+                if subject is not None:
+                    event, opened = self.coalescer.offer(name, API_CALL_ENDPOINTS[name], subject, document_id)
+                    if not opened:
+                        # Downstream already has an open alert for this subject
+                        api_calls.append({
+                            "endpoint": API_CALL_ENDPOINTS[name],
+                            "timestamp": datetime.now().isoformat(),
+                            "status": "coalesced",
+                            "coalesced_into": event["event_id"]
+                        })
+                        continue
                 
-                # Simulate risk alert for regulatory content
-                api_calls.append(self._simulate_risk_alert(pdf_result))
+                api_calls.append(self.api_call_handlers[name](specialized_result or {}, urgent))
+        
+        coalesced_count = sum(1 for item in actions + escalations + api_calls if "coalesced_into" in item)
         
         return {
+            "document_id": classification_result.get("id"),
+            "filename": classification_result.get("filename"),
+            "document_format": classification_result.get("document_format"),
+            "business_intent": classification_result.get("business_intent"),
+            "timestamp": datetime.now().isoformat(),
             "actions_triggered": actions,
             "escalations": escalations,
-            "api_calls": api_calls
+            "api_calls": api_calls,
+            "coalesced_count": coalesced_count,
+            "matched_rules": outcome["matched_rules"],
+            "rules_version": rules_version,
+            "urgent": urgent,
+            "routing_decision": "processed"
         }
     
-    def _route_by_intent(self, classification_result: Dict[str, Any]) -> Dict[str, Any]:
-        """Route based on business intent"""
-        actions = []
-        escalations = []
+    def _coalesce(self, item: Dict[str, Any], escalation_type: str, target: str, subject: Optional[str], document_id: Optional[str]) -> Dict[str, Any]:
+        """Mark an action or escalation as a duplicate of an open coalesced event"""
+        if subject is None:
+            return item
         
-        intent = classification_result.get("business_intent", "").lower()
+        event, opened = self.coalescer.offer(escalation_type, target, subject, document_id)
+        if opened:
+            return item
         
-        if intent == "complaint":
-            actions.append({
-                "action_type": "complaint_handling",
-                "reason": "Customer complaint requires attention",
-                "priority": "high"
-            })
-            
-            escalations.append({
-                "escalation_type": "customer_complaint",
-                "target": "customer_service",
-                "reason": "Complaint needs immediate response"
-            })
+        return {**item, "coalesced_into": event["event_id"]}
+    
+    def _on_coalesced_close(self, event: Dict[str, Any]) -> None:
+        """Report a closed coalescing window that merged duplicates"""
+        if event["count"] < 2:
+            return
         
-        elif intent == "fraud risk":
-            actions.append({
-                "action_type": "fraud_investigation",
-                "reason": "Potential fraud risk detected",
-                "priority": "critical"
-            })
-            
-            escalations.append({
-                "escalation_type": "security_alert",
-                "target": "security_team",
-                "reason": "Fraud risk requires immediate investigation"
-            })
+        self.memory_store._add_trace_log("escalations_coalesced", {
+            "event_id": event["event_id"],
+            "escalation_type": event["escalation_type"],
+            "target": event["target"],
+            "subject": event["subject"],
+            "count": event["count"],
+            "document_ids": event["document_ids"]
+        })
         
-        elif intent == "regulation":
-            actions.append({
-                "action_type": "regulatory_review",
-                "reason": "Regulatory document requires compliance review",
-                "priority": "medium"
+        # Tell the downstream system how many alerts were folded into the one it received
+        if event["escalation_type"] in API_CALL_ENDPOINTS:
+            self.dispatcher.enqueue(event["target"], {
+                "coalesced_event_id": event["event_id"],
+                "subject": event["subject"],
+                "count": event["count"],
+                "document_ids": event["document_ids"],
+                "window_seconds": event["window_seconds"]
             })
-        
-        return {
-            "actions_triggered": actions,
-            "escalations": escalations
-        }
     
-    def _simulate_crm_escalation(self, email_result: Dict[str, Any]) -> Dict[str, Any]:
-        """Simulate CRM escalation API call"""
-        api_call = {
-            "endpoint": "POST /crm/escalate",
-            "timestamp": datetime.now().isoformat(),
-            "payload": {
-                "sender_email": email_result.get("sender_email"),
-                "urgency": email_result.get("urgency_level"),
-                "tone": email_result.get("tone"),
-                "escalation_reason": "Angry customer email detected"
-            },
-            "response": {
-                "escalation_id": f"crm_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                "status": "created",
-                "assigned_to": "customer_service_team"
-            }
+    def _crm_escalation(self, email_result: Dict[str, Any], urgent: bool = False) -> Dict[str, Any]:
+        """Queue a CRM escalation API call"""
+        payload = {
+            "sender_email": email_result.get("sender_email"),
+            "urgency": email_result.get("urgency_level"),
+            "tone": email_result.get("tone"),
+            "escalation_reason": "Angry customer email detected"
         }
         
-        print(f"POST /crm/escalate - Customer escalation created")
-        print(f"Response: {api_call['response']}")
-        
-        return api_call
+        return self._queue_api_call("POST /crm/escalate", payload, urgent)
     
-    def _simulate_risk_alert(self, analysis_result: Dict[str, Any]) -> Dict[str, Any]:
-        """Simulate risk alert API call"""
-        api_call = {
-            "endpoint": "POST /risk_alert",
-            "timestamp": datetime.now().isoformat(),
-            "payload": {
-                "document_type": analysis_result.get("agent_type"),
-                "risk_factors": analysis_result.get("regulatory_keywords_found", []),
-                "severity": analysis_result.get("severity", "medium"),
-                "alert_reason": "Regulatory compliance or data validation issue"
-            },
-            "response": {
-                "alert_id": f"risk_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                "status": "created",
-                "assigned_to": "compliance_team"
-            }
+    def _risk_alert(self, analysis_result: Dict[str, Any], urgent: bool = False) -> Dict[str, Any]:
+        """Queue a risk alert API call"""
+        payload = {
+            "document_type": analysis_result.get("agent_type"),
+            "risk_factors": analysis_result.get("regulatory_keywords_found", []),
+            "severity": analysis_result.get("severity", "medium"),
+            "alert_reason": "Regulatory compliance or data validation issue"
         }
         
-        print(f"POST /risk_alert - Risk alert created")
-        print(f"Response: {api_call['response']}")
-        
-        return api_call
+        return self._queue_api_call("POST /risk_alert", payload, urgent)
     
-    def _parse_amount(self, amount_str: str) -> float:
-        """Parse amount string to float"""
-        try:
-            # Remove currency symbols and commas
-            cleaned = str(amount_str).replace('$', '').replace(',', '').replace('€', '').replace('£', '')
-            return float(cleaned)
-        except (ValueError, TypeError):
-            return 0.0
+    def _queue_api_call(self, endpoint: str, payload: Dict[str, Any], urgent: bool = False) -> Dict[str, Any]:
+        """Hand an API call to the outbound dispatcher without waiting for delivery"""
+        queued = self.dispatcher.enqueue(endpoint, payload, priority=URGENT_PRIORITY if urgent else 0)
+        
+        self.logger.info(f"{endpoint} queued with idempotency key {queued['idempotency_key']}")
+        
+        return {
+            "endpoint": endpoint,
+            "timestamp": datetime.now().isoformat(),
+            "payload": payload,
+            "idempotency_key": queued["idempotency_key"],
+            "status": queued["status"]
+        }
     
     def _create_fallback_routing(self, classification_result: Dict[str, Any], error: str) -> Dict[str, Any]:
         """Create fallback routing when errors occur"""
@@ -335,6 +282,7 @@ class ActionRouter:
                 "reason": "Action router encountered an error"
             }],
             "api_calls": [],
+            "urgent": False,
             "routing_decision": "fallback",
             "error": error
         }
@@ -3,8 +3,12 @@ import json
 import logging
 import re
 from datetime import datetime
-from typing import Dict, Any, List, Optional
-import google.generativeai as genai
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.gemini import get_model
+
+# Documents classified per model call by classify_batch
+CLASSIFY_BATCH_SIZE = int(os.environ.get("CLASSIFY_BATCH_SIZE", 8))
 
 class ClassifierAgent:
     """
@@ -16,13 +20,6 @@ class ClassifierAgent:
         """Initialize the classifier agent"""
         self.logger = logging.getLogger(__name__)
         
-        # Configure Gemini API
-        api_key = os.getenv("GEMINI_API_KEY", "your-api-key-here")
-        genai.configure(api_key=api_key)
-        
-        # Initialize the model
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
-        
         # Define classification schemas
         self.format_types = ["Email", "JSON", "PDF"]
         self.business_intents = ["RFQ", "Complaint", "Invoice", "Regulation", "Fraud Risk"]
@@ -30,6 +27,11 @@ class ClassifierAgent:
         # Define classification prompts
         self.classification_prompt = self._build_classification_prompt()
         
+    @property
+    def model(self):
+        """Gemini model, created on first use"""
+        return get_model()
+    
     def _build_classification_prompt(self) -> str:
         """Build the classification prompt for Gemini"""
         return f"""
@@ -107,6 +109,65 @@ Document Content to Classify:
             self.logger.error(f"Classification error for {filename}: {str(e)}")
             return self._create_fallback_classification(content, filename, str(e))
     
+    def classify_batch(self, documents: List[Tuple[str, str]], batch_size: int = CLASSIFY_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """
+        Classify many documents with one model call per chunk of documents
+        
+        Args:
+            documents: List of (content, filename) pairs
+            batch_size: Documents per model call
+            
+        Returns:
+            Classification results in the same order as the input
+        """
+        results = []
+        for start in range(0, len(documents), batch_size):
+            results.extend(self._classify_chunk(documents[start:start + batch_size]))
+        return results
+    
+    def _classify_chunk(self, documents: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Classify up to batch_size documents in a single request, falling back to one request each"""
+        if len(documents) == 1:
+            return [self.classify_document(documents[0][0], documents[0][1])]
+        
+        try:
+            self.logger.info(f"Classifying batch of {len(documents)} documents")
+            
+            sections = [
+                f"### Document {i + 1}\nFilename: {filename}\n\n{content[:2000]}"
+                for i, (content, filename) in enumerate(documents)
+            ]
+            full_prompt = (self.classification_prompt.rsplit("Respond ONLY", 1)[0] +
+                           f"Respond ONLY with a valid JSON array of exactly {len(documents)} objects, one per document "
+                           "in the order given, each in this exact format:\n"
+                           '{"document_format": "...", "business_intent": "...", "confidence_score": 0.95, '
+                           '"reasoning": "...", "key_indicators": ["..."]}\n\n'
+                           "Documents to Classify:\n\n" + "\n\n".join(sections))
+            
+            response = self.model.generate_content(full_prompt)
+            array_match = re.search(r'\[.*\]', response.text, re.DOTALL)
+            if not array_match:
+                raise ValueError("No JSON array found in response")
+            parsed = json.loads(array_match.group())
+            if not isinstance(parsed, list) or len(parsed) != len(documents):
+                raise ValueError(f"Expected {len(documents)} classifications, got {len(parsed) if isinstance(parsed, list) else 'none'}")
+            
+            results = []
+            for (content, filename), classification_result in zip(documents, parsed):
+                classification_result.update({
+                    "filename": filename,
+                    "timestamp": datetime.now().isoformat(),
+                    "content_length": len(content),
+                    "agent_type": "classifier",
+                    "model_used": "gemini-1.5-flash"
+                })
+                results.append(self._validate_classification(classification_result))
+            return results
+            
+        except Exception as e:
+            self.logger.warning(f"Batch classification failed, classifying one by one: {str(e)}")
+            return [self.classify_document(content, filename) for content, filename in documents]
+    
     def _parse_gemini_response(self, response_text: str) -> Dict[str, Any]:
         """Parse Gemini's JSON response"""
         try:
@@ -1,10 +1,10 @@
-import os
 import json
 import re
 import logging
 from datetime import datetime
 from typing import Dict, Any, List, Optional
-import google.generativeai as genai
+
+from utils.gemini import get_model
 
 class EmailAgent:
     """
@@ -16,19 +16,17 @@ class EmailAgent:
         """Initialize the email agent"""
         self.logger = logging.getLogger(__name__)
         
-        # Configure Gemini API
-        api_key = os.getenv("GEMINI_API_KEY", "your-api-key-here")
-        genai.configure(api_key=api_key)
-        
-        # Initialize the model
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
-        
         # Define analysis schema
         self.urgency_levels = ["Low", "Medium", "High", "Critical"]
         self.tone_types = ["Professional", "Friendly", "Angry", "Neutral", "Urgent", "Formal"]
         
         self.analysis_prompt = self._build_analysis_prompt()
         
+    @property
+    def model(self):
+        """Gemini model, created on first use"""
+        return get_model()
+    
     def _build_analysis_prompt(self) -> str:
         """Build the email analysis prompt for Gemini"""
         return f"""
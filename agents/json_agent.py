@@ -1,10 +1,10 @@
-import os
 import json
 import logging
 import re
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Union
-import google.generativeai as genai
+
+from utils.gemini import get_model
 
 class JSONAgent:
     """
@@ -12,16 +12,12 @@ class JSONAgent:
     Uses Gemini 1.5 Flash for intelligent JSON analysis.
     """
     
-    def __init__(self):
+    def __init__(self, dispatcher=None):
         """Initialize the JSON agent"""
         self.logger = logging.getLogger(__name__)
         
-        # Configure Gemini API
-        api_key = os.getenv("GEMINI_API_KEY", "your-api-key-here")
-        genai.configure(api_key=api_key)
-        
-        # Initialize the model
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        # Optional OutboundDispatcher for alerts raised by run_json_agent
+        self.dispatcher = dispatcher
         
         # Define validation categories
         self.validation_types = ["Valid", "Invalid Syntax", "Schema Mismatch", "Type Error", "Missing Fields"]
@@ -29,6 +25,11 @@ class JSONAgent:
         
         self.analysis_prompt = self._build_analysis_prompt()
         
+    @property
+    def model(self):
+        """Gemini model, created on first use"""
+        return get_model()
+    
     def _build_analysis_prompt(self) -> str:
         """Build the JSON analysis prompt for Gemini"""
         return f"""
@@ -257,11 +258,23 @@ JSON Content to Analyze:
             "error": error
         }
 
-    def simulate_api_response(self, validation_result: Dict[str, Any]) -> None:
-        """Simulate API response for integration"""
-        if validation_result.get("severity") in ["High", "Critical"]:
-            print(f"POST /risk_alert - JSON validation failed: {validation_result['validation_status']}")
-            print(f"Response: {{'alert_id': 'json_{datetime.now().strftime('%Y%m%d_%H%M%S')}', 'status': 'created'}}")
+    def simulate_api_response(self, validation_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Queue a risk alert for high severity validation failures"""
+        if validation_result.get("severity") not in ["High", "Critical"]:
+            return None
+        
+        payload = {
+            "document_type": "json",
+            "filename": validation_result.get("filename"),
+            "severity": validation_result.get("severity"),
+            "alert_reason": f"JSON validation failed: {validation_result.get('validation_status')}"
+        }
+        
+        if not self.dispatcher:
+            self.logger.info(f"POST /risk_alert - {payload['alert_reason']} (no dispatcher configured)")
+            return None
+        
+        return self.dispatcher.enqueue("POST /risk_alert", payload)
 
     def run_json_agent(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -1,10 +1,10 @@
-import os
 import json
 import re
 import logging
 from datetime import datetime
 from typing import Dict, Any, List, Optional
-import google.generativeai as genai
+
+from utils.gemini import get_model
 
 class PDFAgent:
     """
@@ -12,16 +12,12 @@ class PDFAgent:
     Uses Gemini 1.5 Flash for intelligent PDF content analysis.
     """
     
-    def __init__(self):
+    def __init__(self, dispatcher=None):
         """Initialize the PDF agent"""
         self.logger = logging.getLogger(__name__)
         
-        # Configure Gemini API
-        api_key = os.getenv("GEMINI_API_KEY", "your-api-key-here")
-        genai.configure(api_key=api_key)
-        
-        # Initialize the model
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        # Optional OutboundDispatcher for alerts raised by run_pdf_agent
+        self.dispatcher = dispatcher
         
         # Define detection patterns
         self.regulatory_keywords = ["GDPR", "FDA", "HIPAA", "SOX", "PCI", "ISO", "Compliance", "Regulation"]
@@ -29,6 +25,11 @@ class PDFAgent:
         
         self.analysis_prompt = self._build_analysis_prompt()
         
+    @property
+    def model(self):
+        """Gemini model, created on first use"""
+        return get_model()
+    
     def _build_analysis_prompt(self) -> str:
         """Build the PDF analysis prompt for Gemini"""
         return f"""
@@ -272,12 +273,24 @@ PDF Content to Analyze:
             "error": error
         }
 
-    def simulate_api_response(self, analysis_result: Dict[str, Any]) -> None:
-        """Simulate API response for compliance alerts"""
+    def simulate_api_response(self, analysis_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Queue a risk alert for compliance findings"""
         regulatory_keywords = analysis_result.get("regulatory_keywords_found", [])
-        if regulatory_keywords:
-            print(f"POST /risk_alert - Regulatory keywords detected: {', '.join(regulatory_keywords)}")
-            print(f"Response: {{'alert_id': 'pdf_{datetime.now().strftime('%Y%m%d_%H%M%S')}', 'status': 'created'}}")
+        if not regulatory_keywords:
+            return None
+        
+        payload = {
+            "document_type": "pdf",
+            "filename": analysis_result.get("filename"),
+            "risk_factors": regulatory_keywords,
+            "alert_reason": f"Regulatory keywords detected: {', '.join(regulatory_keywords)}"
+        }
+        
+        if not self.dispatcher:
+            self.logger.info(f"POST /risk_alert - {payload['alert_reason']} (no dispatcher configured)")
+            return None
+        
+        return self.dispatcher.enqueue("POST /risk_alert", payload)
 
     def run_pdf_agent(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
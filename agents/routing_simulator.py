@@ -0,0 +1,160 @@
+import json
+import time
+import logging
+import argparse
+from collections import Counter
+from typing import Dict, Any, List, Optional, Iterable
+
+from agents.rule_engine import RuleEngine, DecisionTable, CompiledRule, FactBatch, RULES_FILE
+
+class RoutingSimulator:
+    """
+    Offline what-if analysis for routing rules.
+    Replays stored documents through the current and a candidate decision table
+    and reports how actions and escalations would change.
+    """
+
+    def __init__(self, rule_engine: RuleEngine, memory_store=None):
+        """Initialize the simulator"""
+        self.logger = logging.getLogger(__name__)
+        self.rule_engine = rule_engine
+        self.memory_store = memory_store
+
+    def simulate(self, candidate_spec: Optional[Dict[str, Any]] = None, overrides: Optional[Dict[str, Any]] = None,
+                 records: Optional[Iterable[Dict[str, Any]]] = None, max_flips: int = 100) -> Dict[str, Any]:
+        """
+        Compare the active rules with a candidate rule set over a corpus
+
+        Args:
+            candidate_spec: Full rule specification to try; defaults to the active one
+            overrides: Dotted parameter overrides, e.g. {"pdf_rules.high_value": 5000}
+            records: Stored results to replay; defaults to everything in the memory store
+            max_flips: Maximum number of changed documents listed in the report
+
+        Returns:
+            Report with per-type counts for both rule sets and the documents whose
+            actions, escalations or API calls would change
+        """
+        started = time.perf_counter()
+
+        baseline = self.rule_engine.get_table()
+        candidate = DecisionTable(candidate_spec or baseline.spec, overrides)
+
+        if records is None:
+            records = self.memory_store.get_all_classifications()["classifications"] if self.memory_store else []
+        records = list(records)
+
+        # Fact columns are extracted once and shared by both tables
+        batch = FactBatch.from_documents([(r, r.get("specialized_analysis")) for r in records])
+
+        baseline_matches = baseline.match_batch(batch)
+        candidate_matches = candidate.match_batch(batch)
+
+        baseline_counts = _count(baseline_matches)
+        candidate_counts = _count(candidate_matches)
+
+        flipped = []
+        flipped_count = 0
+        for record, before, after in zip(records, baseline_matches, candidate_matches):
+            # Renamed or reordered rules that route a document the same way are not a flip
+            outcome_before, outcome_after = _outcome(before), _outcome(after)
+            if outcome_before == outcome_after:
+                continue
+
+            flipped_count += 1
+            if len(flipped) < max_flips:
+                before_ids = [r.rule_id for r in before]
+                after_ids = [r.rule_id for r in after]
+                flipped.append({
+                    "document_id": record.get("id"),
+                    "filename": record.get("filename"),
+                    "rules_added": [r for r in after_ids if r not in before_ids],
+                    "rules_removed": [r for r in before_ids if r not in after_ids],
+                    **{
+                        f"{kind}_{change}": sorted(items)
+                        for kind, old, new in zip(("actions", "escalations", "api_calls"), outcome_before, outcome_after)
+                        for change, items in (("added", new - old), ("removed", old - new)) if items
+                    }
+                })
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.logger.info(f"Routing simulation over {len(records)} documents: {flipped_count} flipped in {elapsed_ms:.1f} ms")
+
+        return {
+            "documents": len(records),
+            "baseline": baseline_counts,
+            "candidate": candidate_counts,
+            "delta": {
+                kind: _diff(baseline_counts[kind], candidate_counts[kind])
+                for kind in ("actions", "escalations", "api_calls")
+            },
+            "candidate_params": candidate.params,
+            "flipped_count": flipped_count,
+            "flipped": flipped,
+            "elapsed_ms": round(elapsed_ms, 2)
+        }
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    """Load stored results from a JSON Lines file, one record per line"""
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _outcome(rules: List[CompiledRule]) -> tuple:
+    """Action types, escalation type/target pairs and API call names a document's matched rules produce"""
+    return (
+        {a["action_type"] for r in rules for a in r.actions},
+        {f'{e["escalation_type"]} -> {e["target"]}' for r in rules for e in r.escalations},
+        {name for r in rules for name in r.api_calls}
+    )
+
+def _count(matches: List[List[CompiledRule]]) -> Dict[str, Dict[str, int]]:
+    """Tally action, escalation and API call types over per-document rule matches"""
+    rule_hits = Counter(rule for rules in matches for rule in rules)
+
+    actions = Counter()
+    escalations = Counter()
+    api_calls = Counter()
+    for rule, hits in rule_hits.items():
+        for action in rule.actions:
+            actions[action["action_type"]] += hits
+        for escalation in rule.escalations:
+            escalations[escalation["escalation_type"]] += hits
+        for name in rule.api_calls:
+            api_calls[name] += hits
+
+    return {
+        "actions": dict(actions),
+        "escalations": dict(escalations),
+        "api_calls": dict(api_calls),
+        "documents_with_escalations": sum(1 for rules in matches if any(r.escalations for r in rules))
+    }
+
+def _diff(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    """Non-zero count changes per type"""
+    keys = set(before) | set(after)
+    return {k: after.get(k, 0) - before.get(k, 0) for k in sorted(keys) if after.get(k, 0) != before.get(k, 0)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay an exported corpus through the active and a candidate rule set")
+    parser.add_argument("corpus", help="JSON Lines file of stored results")
+    parser.add_argument("--rules", default=RULES_FILE, help="Active rules file")
+    parser.add_argument("--candidate", help="Candidate rules file; defaults to the active rules")
+    parser.add_argument("--set", action="append", default=[], metavar="PARAM=VALUE",
+                        help="Parameter override such as pdf_rules.high_value=5000; repeatable")
+    parser.add_argument("--max-flips", type=int, default=100)
+    args = parser.parse_args()
+
+    candidate_spec = None
+    if args.candidate:
+        with open(args.candidate, 'r') as f:
+            candidate_spec = json.load(f)
+    overrides = {}
+    for item in args.set:
+        param, _, value = item.partition("=")
+        overrides[param] = json.loads(value)
+
+    logging.basicConfig(level=logging.INFO)
+    report = RoutingSimulator(RuleEngine(args.rules)).simulate(
+        candidate_spec, overrides, records=load_corpus(args.corpus), max_flips=args.max_flips
+    )
+    print(json.dumps(report, indent=2))
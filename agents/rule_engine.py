@@ -0,0 +1,483 @@
+import os
+import copy
+import json
+import time
+import logging
+import threading
+from itertools import compress
+from typing import Dict, Any, List, Optional, Tuple, Callable, Union
+
+RULES_FILE = os.environ.get("ROUTING_RULES_PATH", "rules/routing_rules.json")
+
+WILDCARD = "*"
+
+def parse_amount(amount_str: Any) -> float:
+    """Parse amount string to float"""
+    try:
+        # Remove currency symbols and commas
+        cleaned = str(amount_str).replace('$', '').replace(',', '').replace('€', '').replace('£', '')
+        return float(cleaned)
+    except (ValueError, TypeError):
+        return 0.0
+
+# How each routing fact is read from (classification_result, specialized_result or {})
+FACT_EXTRACTORS: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Any]] = {
+    "format": lambda c, s: str(c.get("document_format") or "").lower(),
+    "intent": lambda c, s: str(c.get("business_intent") or "").lower(),
+    "has_specialized": lambda c, s: bool(s),
+    "urgency": lambda c, s: str(s.get("urgency_level") or "").lower(),
+    "tone": lambda c, s: str(s.get("tone") or "").lower(),
+    "sender": lambda c, s: s.get("sender_email", "unknown"),
+    "is_valid_json": lambda c, s: s.get("is_valid_json", True),
+    "severity": lambda c, s: str(s.get("severity") or "").lower(),
+    "validation_status": lambda c, s: str(s.get("validation_status") or "").lower(),
+    "invoice_total": lambda c, s: parse_amount(s.get("invoice_total", "0")),
+    "regulatory_keywords": lambda c, s: s.get("regulatory_keywords_found") or [],
+    "regulatory_keywords_text": lambda c, s: ", ".join(s.get("regulatory_keywords_found") or [])
+}
+
+def extract_facts(classification_result: Dict[str, Any], specialized_result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Flatten a classification and its specialized analysis into the fields rules match on
+
+    Args:
+        classification_result: Initial classification from ClassifierAgent
+        specialized_result: Results from specialized agent (Email/JSON/PDF)
+
+    Returns:
+        Flat dictionary of routing facts
+    """
+    specialized = specialized_result or {}
+    return {name: extract(classification_result, specialized) for name, extract in FACT_EXTRACTORS.items()}
+
+class FactBatch:
+    """
+    Column-oriented view of many documents for batch rule evaluation.
+    Rows are grouped by raw (format, intent) and a fact column is only
+    extracted for a group when some rule reads it, then cached.
+    """
+
+    def __init__(self, size: int, groups: Dict[Tuple[str, str], List[int]], column_fn: Callable[[List[int], str], List[Any]]):
+        self.size = size
+        self.groups = groups
+        self._column_fn = column_fn
+        self._columns: Dict[Tuple[Tuple[str, str], str], List[Any]] = {}
+
+    @classmethod
+    def from_documents(cls, documents: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]) -> "FactBatch":
+        """Build a batch straight from (classification_result, specialized_result) pairs"""
+        pairs = [(c, s or {}) for c, s in documents]
+        fmt, intent = FACT_EXTRACTORS["format"], FACT_EXTRACTORS["intent"]
+
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for i, (c, s) in enumerate(pairs):
+            groups.setdefault((fmt(c, s), intent(c, s)), []).append(i)
+
+        def column(rows, field):
+            extract = FACT_EXTRACTORS[field]
+            return [extract(*pairs[i]) for i in rows]
+
+        return cls(len(pairs), groups, column)
+
+    @classmethod
+    def from_facts(cls, facts_list: List[Dict[str, Any]]) -> "FactBatch":
+        """Build a batch from already extracted facts"""
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for i, facts in enumerate(facts_list):
+            groups.setdefault((facts["format"], facts["intent"]), []).append(i)
+
+        def column(rows, field):
+            return [facts_list[i].get(field) for i in rows]
+
+        return cls(len(facts_list), groups, column)
+
+    def column(self, group: Tuple[str, str], field: str) -> List[Any]:
+        """Values of one fact for every row in a group"""
+        key = (group, field)
+        if key not in self._columns:
+            self._columns[key] = self._column_fn(self.groups[group], field)
+        return self._columns[key]
+
+# Leaf operators: each takes (fact value, rule value)
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "in": lambda a, b: a in b,
+    "not_in": lambda a, b: a not in b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "lte": lambda a, b: a is not None and a <= b,
+    "contains": lambda a, b: a is not None and b in a,
+    "nonempty": lambda a, b: bool(a),
+    "empty": lambda a, b: not a
+}
+
+class Condition:
+    """Compiled rule condition evaluable on one row or on whole columns"""
+
+    fields: Tuple[str, ...] = ()
+
+    def test(self, facts: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def mask(self, columns: Dict[str, List[Any]], n: int) -> List[bool]:
+        raise NotImplementedError
+
+class _Leaf(Condition):
+    def __init__(self, field: str, op: str, value: Any):
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {op}")
+        self.field = field
+        self.fields = (field,)
+        self.fn = OPERATORS[op]
+        # Membership tests against lists are done on sets
+        self.value = frozenset(value) if op in ("in", "not_in") and isinstance(value, list) else value
+
+    def test(self, facts):
+        return self.fn(facts.get(self.field), self.value)
+
+    def mask(self, columns, n):
+        fn, value = self.fn, self.value
+        return [fn(v, value) for v in columns[self.field]]
+
+class _All(Condition):
+    def __init__(self, parts: List[Condition]):
+        self.parts = parts
+        self.fields = tuple(f for p in parts for f in p.fields)
+
+    def test(self, facts):
+        return all(p.test(facts) for p in self.parts)
+
+    def mask(self, columns, n):
+        result = [True] * n
+        for part in self.parts:
+            result = [a and b for a, b in zip(result, part.mask(columns, n))]
+        return result
+
+class _Any(Condition):
+    def __init__(self, parts: List[Condition]):
+        self.parts = parts
+        self.fields = tuple(f for p in parts for f in p.fields)
+
+    def test(self, facts):
+        return any(p.test(facts) for p in self.parts)
+
+    def mask(self, columns, n):
+        result = [False] * n
+        for part in self.parts:
+            result = [a or b for a, b in zip(result, part.mask(columns, n))]
+        return result
+
+class _Not(Condition):
+    def __init__(self, part: Condition):
+        self.part = part
+        self.fields = part.fields
+
+    def test(self, facts):
+        return not self.part.test(facts)
+
+    def mask(self, columns, n):
+        return [not v for v in self.part.mask(columns, n)]
+
+class CompiledRule:
+    """A single routing rule with its condition compiled"""
+
+    __slots__ = ("rule_id", "format", "intent", "condition", "exclusive_group",
+                 "actions", "escalations", "api_calls", "coalesce_on")
+
+    def __init__(self, spec: Dict[str, Any], condition: Condition):
+        self.rule_id = spec["id"]
+        self.format = str(spec.get("format", WILDCARD)).lower()
+        self.intent = str(spec.get("intent", WILDCARD)).lower()
+        self.condition = condition
+        self.exclusive_group = spec.get("exclusive_group")
+        self.actions = spec.get("actions", [])
+        self.escalations = spec.get("escalations", [])
+        self.api_calls = spec.get("api_calls", [])
+        self.coalesce_on = spec.get("coalesce_on")
+
+    def render(self, facts: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Fill in reason templates for one matching document"""
+        actions = [_render_template(a, facts) for a in self.actions]
+        escalations = [_render_template(e, facts) for e in self.escalations]
+        return actions, escalations
+
+def _render_template(template: Dict[str, Any], facts: Dict[str, Any]) -> Dict[str, Any]:
+    """Format string values of an action/escalation template with the document facts"""
+    return {k: v.format(**facts) if isinstance(v, str) and "{" in v else v for k, v in template.items()}
+
+class DecisionTable:
+    """
+    Routing rules compiled into a table indexed by (format, intent).
+    Each key maps to the ordered tuple of rules that can apply to it.
+
+    Every matching rule adds to the outcome, so a document gets both its
+    format rules' and its intent rules' actions and escalations. The routing
+    code this replaced ran the intent step last and let it overwrite the
+    action and escalation lists, even with empty ones, which discarded every
+    format-specific action and escalation; only API calls survived. Rules that
+    must not combine share an exclusive_group, where the first match wins.
+    """
+
+    def __init__(self, spec: Dict[str, Any], overrides: Optional[Dict[str, Any]] = None):
+        """Compile a rule specification"""
+        self.spec = spec
+        self.version = spec.get("version", 1)
+        self.params = copy.deepcopy(spec.get("params", {}))
+
+        for path, value in (overrides or {}).items():
+            self._set_param(path, value)
+
+        self.rules = [CompiledRule(r, self._compile_rule_condition(r)) for r in spec.get("rules", [])]
+
+        ids = [r.rule_id for r in self.rules]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Duplicate rule ids in routing rules")
+
+        self.formats = {r.format for r in self.rules} - {WILDCARD}
+        self.intents = {r.intent for r in self.rules} - {WILDCARD}
+
+        # Pre-build every reachable key, including the wildcard fallbacks
+        self.index: Dict[Tuple[str, str], Tuple[CompiledRule, ...]] = {}
+        for fmt in self.formats | {WILDCARD}:
+            for intent in self.intents | {WILDCARD}:
+                self.index[(fmt, intent)] = tuple(
+                    r for r in self.rules
+                    if r.format in (fmt, WILDCARD) and r.intent in (intent, WILDCARD)
+                )
+
+    def key_for(self, facts: Dict[str, Any]) -> Tuple[str, str]:
+        """Map a document onto its decision table key"""
+        fmt = facts["format"] if facts["format"] in self.formats else WILDCARD
+        intent = facts["intent"] if facts["intent"] in self.intents else WILDCARD
+        return fmt, intent
+
+    def rules_for(self, facts: Dict[str, Any]) -> Tuple[CompiledRule, ...]:
+        """Get candidate rules for a document"""
+        return self.index[self.key_for(facts)]
+
+    def _set_param(self, path: str, value: Any) -> None:
+        """Override a dotted parameter path such as pdf_rules.high_value"""
+        node = self.params
+        *parents, leaf = path.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+
+    def _resolve(self, value: Any) -> Any:
+        """Resolve $section.name references against params"""
+        if isinstance(value, str) and value.startswith("$"):
+            node = self.params
+            for part in value[1:].split("."):
+                if not isinstance(node, dict) or part not in node:
+                    raise ValueError(f"Unknown rule parameter: {value}")
+                node = node[part]
+            return node
+        return value
+
+    def _compile_condition(self, spec: Optional[Dict[str, Any]]) -> Condition:
+        """Compile a condition specification into a Condition tree"""
+        if not spec:
+            return _All([])
+        if "all" in spec:
+            return _All([self._compile_condition(c) for c in spec["all"]])
+        if "any" in spec:
+            return _Any([self._compile_condition(c) for c in spec["any"]])
+        if "not" in spec:
+            return _Not(self._compile_condition(spec["not"]))
+        return _Leaf(spec["field"], spec.get("op", "eq"), self._resolve(spec.get("value")))
+
+    def _compile_rule_condition(self, rule: Dict[str, Any]) -> Condition:
+        condition = self._compile_condition(rule.get("when"))
+        if rule.get("requires_specialized"):
+            condition = _All([_Leaf("has_specialized", "eq", True), condition])
+        return condition
+
+    def evaluate(self, facts: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Evaluate the table for a single document
+
+        Args:
+            facts: Routing facts from extract_facts
+
+        Returns:
+            Dictionary with actions, escalations, api call names and matched rule ids
+        """
+        outcome = _empty_outcome()
+        fired_groups = set()
+
+        for rule in self.rules_for(facts):
+            if rule.exclusive_group and rule.exclusive_group in fired_groups:
+                continue
+            if not rule.condition.test(facts):
+                continue
+            if rule.exclusive_group:
+                fired_groups.add(rule.exclusive_group)
+            _apply(outcome, rule, facts)
+
+        return outcome
+
+    def match_batch(self, batch: Union[FactBatch, List[Dict[str, Any]]]) -> List[List[CompiledRule]]:
+        """
+        Find matching rules for many documents in one columnar pass.
+        Each rule's condition is evaluated over the fact columns of a whole group at once.
+
+        Args:
+            batch: FactBatch, or a list of routing facts per document
+
+        Returns:
+            Matching rules per document, in input order
+        """
+        if not isinstance(batch, FactBatch):
+            batch = FactBatch.from_facts(batch)
+
+        matches: List[List[CompiledRule]] = [[] for _ in range(batch.size)]
+
+        for group, rows in batch.groups.items():
+            rules = self.index[self.key_for({"format": group[0], "intent": group[1]})]
+            if not rules:
+                continue
+
+            n = len(rows)
+            fields = {f for rule in rules for f in rule.condition.fields}
+            columns = {f: batch.column(group, f) for f in fields}
+            fired_groups: Dict[str, List[bool]] = {}
+
+            for rule in rules:
+                mask = rule.condition.mask(columns, n)
+                exclusive = rule.exclusive_group
+                if exclusive:
+                    fired = fired_groups.setdefault(exclusive, [False] * n)
+                    mask = [m and not f for m, f in zip(mask, fired)]
+                    fired_groups[exclusive] = [m or f for m, f in zip(mask, fired)]
+
+                for row in compress(rows, mask):
+                    matches[row].append(rule)
+
+        return matches
+
+    def evaluate_batch(self, facts_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Evaluate many documents at once, rendering the full outcome for each"""
+        outcomes = []
+        for facts, rules in zip(facts_list, self.match_batch(facts_list)):
+            outcome = _empty_outcome()
+            for rule in rules:
+                _apply(outcome, rule, facts)
+            outcomes.append(outcome)
+        return outcomes
+
+    def describe(self) -> Dict[str, Any]:
+        """Summarize the compiled table"""
+        return {
+            "version": self.version,
+            "params": self.params,
+            "rule_count": len(self.rules),
+            "rules": [r.rule_id for r in self.rules],
+            "index_keys": len(self.index)
+        }
+
+def _empty_outcome() -> Dict[str, Any]:
+    return {"actions_triggered": [], "escalations": [], "api_calls": [], "matched_rules": [], "hits": []}
+
+# Placeholder values extractors and agents report when a fact is missing
+_MISSING_SUBJECTS = frozenset(("", "unknown", "none"))
+
+def _coalesce_subject(rule: CompiledRule, facts: Dict[str, Any]) -> Optional[str]:
+    """The subject a rule's escalations coalesce on; None (no coalescing) when the fact is missing"""
+    if not rule.coalesce_on:
+        return None
+    value = facts.get(rule.coalesce_on)
+    if value is None or str(value).strip().lower() in _MISSING_SUBJECTS:
+        return None
+    return str(value)
+
+def _apply(outcome: Dict[str, Any], rule: CompiledRule, facts: Dict[str, Any]) -> None:
+    actions, escalations = rule.render(facts)
+    outcome["actions_triggered"].extend(actions)
+    outcome["escalations"].extend(escalations)
+    outcome["api_calls"].extend(rule.api_calls)
+    outcome["matched_rules"].append(rule.rule_id)
+    
+    # Per-rule breakdown, used to coalesce repeated escalations about the same subject
+    outcome["hits"].append({
+        "rule_id": rule.rule_id,
+        "subject": _coalesce_subject(rule, facts),
+        "actions": actions,
+        "escalations": escalations,
+        "api_calls": rule.api_calls
+    })
+
+class RuleEngine:
+    """
+    Loads routing rules from a file and keeps a compiled DecisionTable.
+    The file is re-checked periodically and reloads swap the table atomically.
+    """
+
+    def __init__(self, rules_path: str = RULES_FILE, check_interval: float = 2.0):
+        """Initialize the rule engine"""
+        self.logger = logging.getLogger(__name__)
+        self.rules_path = rules_path
+        self.check_interval = check_interval
+        self._reload_lock = threading.RLock()
+        self._last_check = 0.0
+        self._mtime = None
+
+        self.table = self._load()
+        self.logger.info(f"Rule engine loaded {len(self.table.rules)} rules from {rules_path}")
+
+    def _load(self) -> DecisionTable:
+        """Read and compile the rules file"""
+        self._mtime = os.path.getmtime(self.rules_path)
+        with open(self.rules_path, 'r') as f:
+            return DecisionTable(json.load(f))
+
+    def reload(self) -> bool:
+        """
+        Recompile the rules file and swap it in
+
+        Returns:
+            True if the new table is active, False if the old one was kept
+        """
+        with self._reload_lock:
+            try:
+                table = self._load()
+            except Exception as e:
+                self.logger.error(f"Rule reload failed, keeping previous rules: {str(e)}")
+                return False
+
+            # Single reference assignment; readers see either the old or the new table
+            self.table = table
+            self.logger.info(f"Routing rules reloaded: {len(table.rules)} rules")
+            return True
+
+    def maybe_reload(self) -> None:
+        """Reload the rules file if it changed since the last check"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        try:
+            mtime = os.path.getmtime(self.rules_path)
+        except OSError:
+            return
+
+        if mtime != self._mtime:
+            with self._reload_lock:
+                # Of the request threads that noticed the change, only the first recompiles
+                if mtime != self._mtime:
+                    self.reload()
+
+    def get_table(self) -> DecisionTable:
+        """Get the current decision table, picking up file changes"""
+        self.maybe_reload()
+        return self.table
+
+    def evaluate(self, facts: Dict[str, Any]) -> Dict[str, Any]:
+        """Evaluate the current rules for one document"""
+        return self.get_table().evaluate(facts)
+
+    def evaluate_batch(self, facts_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Evaluate the current rules for a batch of documents"""
+        return self.get_table().evaluate_batch(facts_list)
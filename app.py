@@ -7,40 +7,31 @@ from flask import Flask, render_template, request, flash, redirect, url_for, jso
 from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 import traceback
-RUNS_FILE = 'data/runs.json'
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from agents.classifier import ClassifierAgent
+from agents.classifier import ClassifierAgent, CLASSIFY_BATCH_SIZE
 from agents.email_agent import EmailAgent
 from agents.json_agent import JSONAgent
 from agents.pdf_agent import PDFAgent
 from agents.action_router import ActionRouter
+from agents.routing_simulator import RoutingSimulator
 from memory_store import MemoryStore
+from utils.json_codec import encode_json, content_etag, compress, compress_chunks, RESPONSE_CODINGS
+from utils.outbound_dispatcher import OutboundDispatcher
+from utils.job_queue import JobQueue, QueueFull, FINISHED_STATES
+from utils.archive_ingest import BulkExtractor, BULK_MAX_TOTAL_BYTES
+from utils.document_ingest import ingest_stream
+from utils.dashboard_feed import DashboardFeed
+from utils.stream_limiter import StreamLimiter, SSE_RETRY_AFTER
+from utils.record_index import clean_filters
 from langflow_bridge import langflow_run
 from frontend.src.hooks.webhook_handler import handle_webhook
 from routes.langflow import langflow
 
 import requests
 from flask import Response, stream_with_context
-from utils.runs_store import save_run
-
-
-run_id = response_json["id"] 
-input_data = payload  # or specific fields
-
-save_run(run_id, input_data)
-
-@app.route('/api/langflow/stream/<run_id>', methods=['GET'])
-def stream_run_events(run_id):
-    def event_stream():
-        try:
-            with requests.get(f'http://langflow:7860/api/runs/{run_id}/events', stream=True) as r:
-                for line in r.iter_lines():
-                    if line:
-                        yield f"data: {line.decode('utf-8')}\n\n"
-        except Exception as e:
-            yield f"data: Error: {str(e)}\n\n"
-
-    return Response(stream_with_context(event_stream()), mimetype='text/event-stream')
+from utils.runs_store import get_run_journal
+from utils.langflow_client import stream_events
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -51,24 +42,16 @@ app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-prod
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 app.register_blueprint(langflow)
 
-import requests
-from flask import Flask, Response, request, stream_with_context
-
-app = Flask(__name__)
+@app.route('/api/langflow/stream/<run_id>', methods=['GET'])
+def stream_run_events(run_id):
+    # Holds a worker thread for the whole stream; deployments route this path to langflow_proxy instead
+    return event_stream_response(stream_events('GET', f'/api/runs/{run_id}/events'))
 
 @app.route('/api/langflow/runs', methods=['POST'])
 def langflow_runs():
-    langflow_url = "http://langflow:7860/api/runs"  # URL of the LangFlow service in docker-compose
+    # Holds a worker thread for the whole stream; deployments route this path to langflow_proxy instead
     payload = request.get_json()
-
-    # Make request to LangFlow with streaming
-    def generate():
-        with requests.post(langflow_url, json=payload, stream=True) as r:
-            for line in r.iter_lines():
-                if line:
-                    yield f"data: {line.decode()}\n\n"
-
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+    return event_stream_response(stream_events('POST', '/api/runs', json=payload))
 
 
 # Configure upload settings
@@ -84,11 +67,41 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Initialize components
 memory_store = MemoryStore()
+outbound_dispatcher = OutboundDispatcher()
 classifier_agent = ClassifierAgent()
 email_agent = EmailAgent()
-json_agent = JSONAgent()
-pdf_agent = PDFAgent()
-action_router = ActionRouter(memory_store)
+json_agent = JSONAgent(dispatcher=outbound_dispatcher)
+pdf_agent = PDFAgent(dispatcher=outbound_dispatcher)
+action_router = ActionRouter(memory_store, dispatcher=outbound_dispatcher)
+routing_simulator = RoutingSimulator(action_router.rule_engine, memory_store)
+job_queue = JobQueue()
+dashboard_feed = DashboardFeed(memory_store)
+memory_store.trace_listeners.append(dashboard_feed.wake)
+stream_limiter = StreamLimiter()
+
+# Pipeline event streams: keep-alive interval, and poll interval for jobs running in another process
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_POLL_SECONDS = 0.5
+
+def event_stream_response(stream):
+    """
+    Server-sent events response that holds one of the process's stream slots until
+    the client disconnects, or a 503 telling the client to retry if none is free
+    """
+    if not stream_limiter.acquire():
+        return jsonify({'error': 'Too many open event streams, try again shortly',
+                        'retry_after': SSE_RETRY_AFTER}), 503, {'Retry-After': str(SSE_RETRY_AFTER)}
+    response = Response(stream, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the response, whether the stream finished or the client went away
+    response.call_on_close(stream_limiter.release)
+    return response
+
+# Responses built per request are compressed from this size on, when the client accepts it
+RESPONSE_COMPRESS_MIN_BYTES = 1024
+
+# Chunks of a bulk upload processed concurrently within its job
+BULK_PARALLELISM = int(os.environ.get("BULK_PARALLELISM", 4))
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -100,9 +113,204 @@ def index():
     """Main page with upload form"""
     return render_template('index.html')
 
+def run_document_pipeline(content, filename, job=None, content_sha256=None):
+    """Classify, analyze and route a document, store the result and return its ID"""
+    stage_timings = {}
+    
+    def run_stage(name, fn, *args):
+        """Run one pipeline stage, timing it and reporting it to the job's event stream"""
+        if job:
+            job.stage(name)
+        stage_started = time.perf_counter()
+        result = fn(*args)
+        stage_timings[name] = (time.perf_counter() - stage_started) * 1000
+        if job:
+            job.stage_finished(name, stage_timings[name])
+        return result
+    
+    # Step 1: Classify the document
+    classification_result = run_stage('classify', classifier_agent.classify_document, content, filename)
+    
+    # Step 2: Run specialized agent based on format
+    specialized_result = None
+    analyze = specialized_analyzer(classification_result)
+    if analyze:
+        specialized_result = run_stage('analyze', analyze, content, filename)
+    
+    # Step 3: Route actions
+    routing_result = run_stage('route', action_router.route_document, classification_result, specialized_result)
+    if job:
+        for event in dispatched_actions(routing_result):
+            job.event('action_dispatched', **event)
+    
+    # Store all results in memory
+    return memory_store.store_classification({
+        **classification_result,
+        'specialized_analysis': specialized_result,
+        'routing_decisions': routing_result,
+        'stage_timings_ms': stage_timings,
+        'job_id': job.id if job else None,
+        'content_sha256': content_sha256
+    })
+
+def specialized_analyzer(classification_result):
+    """Agent method that analyzes documents of the classified format, or None if there is none"""
+    document_format = classification_result.get('document_format', '').lower()
+    if document_format == 'email':
+        return email_agent.analyze_email
+    if document_format == 'json':
+        return json_agent.analyze_json
+    if document_format == 'pdf':
+        return pdf_agent.analyze_pdf
+    return None
+
+def run_batch_pipeline(documents, job=None):
+    """
+    Run the pipeline over a chunk of documents with one classification call and one routing pass
+    
+    Returns one {'filename', 'result_id'} or {'filename', 'error'} entry per document
+    """
+    contents = [(document.text, document.filename) for document in documents]
+    
+    classify_started = time.perf_counter()
+    classifications = classifier_agent.classify_batch(contents)
+    # The chunk shares one model call, so each document is charged an equal share of it
+    classify_ms = (time.perf_counter() - classify_started) * 1000 / len(contents)
+    
+    specialized_results, timings = [], []
+    for (content, filename), classification_result in zip(contents, classifications):
+        stage_timings = {'classify': classify_ms}
+        specialized_result = None
+        analyze = specialized_analyzer(classification_result)
+        if analyze:
+            analyze_started = time.perf_counter()
+            try:
+                specialized_result = analyze(content, filename)
+            except Exception as e:
+                app.logger.error(f"Analysis failed for {filename}: {str(e)}")
+            stage_timings['analyze'] = (time.perf_counter() - analyze_started) * 1000
+        specialized_results.append(specialized_result)
+        timings.append(stage_timings)
+    
+    route_started = time.perf_counter()
+    routing_results = action_router.route_batch(list(zip(classifications, specialized_results)))
+    route_ms = (time.perf_counter() - route_started) * 1000 / len(contents)
+    
+    outcomes = []
+    for document, classification_result, specialized_result, routing_result, stage_timings in zip(
+            documents, classifications, specialized_results, routing_results, timings):
+        filename = document.filename
+        stage_timings['route'] = route_ms
+        try:
+            result_id = memory_store.store_classification({
+                **classification_result,
+                'specialized_analysis': specialized_result,
+                'routing_decisions': routing_result,
+                'stage_timings_ms': stage_timings,
+                'job_id': job.id if job else None,
+                'content_sha256': document.sha256
+            })
+            outcomes.append({'filename': filename, 'result_id': result_id})
+        except Exception as e:
+            app.logger.error(f"Storing result failed for {filename}: {str(e)}")
+            outcomes.append({'filename': filename, 'error': str(e)})
+    return outcomes
+
+def dispatched_actions(routing_result):
+    """One event per action, escalation and API call a routing decision dispatched"""
+    for action in routing_result.get('actions_triggered', []):
+        yield {'kind': 'action', 'type': action.get('action_type'), 'coalesced': 'coalesced_into' in action}
+    for escalation in routing_result.get('escalations', []):
+        yield {'kind': 'escalation', 'type': escalation.get('escalation_type'), 'target': escalation.get('target'),
+               'coalesced': 'coalesced_into' in escalation}
+    for call in routing_result.get('api_calls', []):
+        yield {'kind': 'api_call', 'endpoint': call.get('endpoint'), 'status': call.get('status')}
+
+def execution_time(result):
+    """Seconds the pipeline spent on a stored result, or None if it was not timed"""
+    timings = result.get('stage_timings_ms')
+    return round(sum(timings.values()) / 1000, 3) if timings else None
+
+def process_upload_job(payload, job):
+    """Job handler for uploaded documents"""
+    document = payload['document']
+    return {'result_id': run_document_pipeline(document.text, document.filename, job, document.sha256)}
+
+def process_trigger_job(payload, job):
+    """Job handler for workflows triggered through the API"""
+    flow_id = payload['flow_id']
+    content = payload['content']
+    filename = payload['filename']
+    
+    if flow_id == 'classifier-agent-flow':
+        # Full classification pipeline
+        return {'result_id': run_document_pipeline(content, filename, job)}
+    
+    job.stage('analyze')
+    started = time.perf_counter()
+    if flow_id == 'email-agent-flow':
+        result = email_agent.analyze_email(content, filename)
+    elif flow_id == 'json-agent-flow':
+        result = json_agent.analyze_json(content, filename)
+    else:
+        result = pdf_agent.analyze_pdf(content, filename)
+    job.stage_finished('analyze', (time.perf_counter() - started) * 1000)
+    
+    return {'result_id': memory_store.store_classification(result)}
+
+def process_batch_job(payload, job):
+    """Job handler for bulk uploads: chunks of documents run through the pipeline in parallel"""
+    documents = payload['documents']
+    chunks = [documents[i:i + CLASSIFY_BATCH_SIZE] for i in range(0, len(documents), CLASSIFY_BATCH_SIZE)]
+    progress = {'total': len(documents), 'completed': 0, 'failed': 0}
+    results, failures = [], []
+    
+    job.stage('process')
+    job.progress(**progress)
+    with ThreadPoolExecutor(max_workers=BULK_PARALLELISM, thread_name_prefix=f"batch-{job.id[:8]}") as pool:
+        futures = {pool.submit(run_batch_pipeline, chunk, job): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                outcomes = future.result()
+            except Exception as e:
+                app.logger.error(f"Batch {job.id} chunk failed: {str(e)}")
+                outcomes = [{'filename': document.filename, 'error': str(e)} for document in futures[future]]
+            for outcome in outcomes:
+                (results if 'result_id' in outcome else failures).append(outcome)
+            progress['completed'] = len(results)
+            progress['failed'] = len(failures)
+            job.progress(**progress)
+    
+    return {'results': results, 'failures': failures, **progress}
+
+# Someone is waiting on uploads; webhook callers retry, and batches and cron runs can wait
+job_queue.register('upload', process_upload_job, lane='interactive')
+job_queue.register('trigger', process_trigger_job, lane='webhook')
+job_queue.register('batch', process_batch_job, lane='batch')
+
+TRIGGER_LANES = {'manual': 'interactive', 'webhook': 'webhook', 'cron': 'batch'}
+
+def queue_full_response(e, error):
+    """429 telling the client when the lane it asked for should have room again"""
+    return jsonify({'error': error, 'retry_after': e.retry_after}), 429, {'Retry-After': str(e.retry_after)}
+
+def wants_json():
+    """Whether the client prefers JSON over an HTML page"""
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+def job_accepted_response(job):
+    """202 response pointing at the status endpoint of a queued job"""
+    status_url = url_for('api_get_job', job_id=job['job_id'])
+    return jsonify({
+        'job_id': job['job_id'],
+        'state': job['state'],
+        'status_url': status_url,
+        'stream_url': url_for('stream_langflow_run', run_id=job['job_id'])
+    }), 202, {'Location': status_url}
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    """Handle file upload and classification"""
+    """Handle file upload and queue it for classification"""
     try:
         # Check if file was uploaded
         if 'file' not in request.files:
@@ -119,49 +327,25 @@ def upload_file():
             flash('File type not allowed. Please upload: txt, pdf, json, eml, msg files', 'error')
             return redirect(url_for('index'))
         
-        # Save uploaded file
+        # Read the upload once, hashing, sniffing and decoding it in the same pass
         filename = secure_filename(file.filename or 'unknown')
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Read file content
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            # Try reading as binary for PDFs and convert to string
-            with open(filepath, 'rb') as f:
-                content = str(f.read())
-        
-        # Step 1: Classify the document
-        classification_result = classifier_agent.classify_document(content, filename)
-        
-        # Step 2: Run specialized agent based on format
-        specialized_result = None
-        document_format = classification_result.get('document_format', '').lower()
-        
-        if document_format == 'email':
-            specialized_result = email_agent.analyze_email(content, filename)
-        elif document_format == 'json':
-            specialized_result = json_agent.analyze_json(content, filename)
-        elif document_format == 'pdf':
-            specialized_result = pdf_agent.analyze_pdf(content, filename)
-        
-        # Step 3: Route actions
-        routing_result = action_router.route_document(classification_result, specialized_result)
+        document = ingest_stream(file.stream, filename, MAX_CONTENT_LENGTH)
         
-        # Store all results in memory
-        result_id = memory_store.store_classification({
-            **classification_result,
-            'specialized_analysis': specialized_result,
-            'routing_decisions': routing_result
-        })
-        
-        # Clean up uploaded file
-        os.remove(filepath)
+        # Classification runs on the job workers; the client polls the job status.
+        # A document identical to one still being processed joins that job instead.
+        job = job_queue.submit('upload', {'document': document}, meta=document.describe(),
+                               dedup_key=f"sha256:{document.sha256}")
         
-        flash('Document classified successfully!', 'success')
-        return redirect(url_for('view_results', result_id=result_id))
+        if wants_json():
+            return job_accepted_response(job)
+        return render_template('job.html', job=job, status_url=url_for('api_get_job', job_id=job['job_id'])), 202
+    
+    except QueueFull as e:
+        app.logger.warning(f"Upload rejected: {str(e)}")
+        if wants_json():
+            return queue_full_response(e, 'Too many documents queued, try again shortly')
+        flash('Too many documents are being processed. Please try again shortly.', 'error')
+        return redirect(url_for('index'))
         
     except Exception as e:
         app.logger.error(f"Error processing upload: {str(e)}")
@@ -169,6 +353,68 @@ def upload_file():
         flash(f'Error processing file: {str(e)}', 'error')
         return redirect(url_for('index'))
 
+@app.route('/upload/bulk', methods=['POST'])
+def upload_bulk():
+    """Accept many files and zip/tar archives in one request and queue them as a single batch"""
+    # Bulk requests may exceed the single-file limit; each document is still held to it
+    request.max_content_length = BULK_MAX_TOTAL_BYTES
+    uploads = request.files.getlist('files') + request.files.getlist('file')
+    if not uploads:
+        return jsonify({'error': 'No files uploaded'}), 400
+    
+    extractor = BulkExtractor(allowed_file, max_file_bytes=MAX_CONTENT_LENGTH)
+    documents = []
+    for upload in uploads:
+        documents.extend(extractor.extract(upload.filename or '', upload.stream))
+    
+    skipped = extractor.skipped
+    if not documents:
+        return jsonify({'error': 'No processable documents found', 'skipped': skipped[:100]}), 400
+    
+    try:
+        job = job_queue.submit('batch', {'documents': documents}, meta={
+            'documents': len(documents),
+            'bytes': extractor.total_bytes,
+            'uploads': [upload.filename for upload in uploads][:100]
+        })
+    except QueueFull as e:
+        app.logger.warning(f"Bulk upload rejected: {str(e)}")
+        return queue_full_response(e, 'Too many documents queued, try again shortly')
+    
+    response, status, headers = job_accepted_response(job)
+    body = response.get_json()
+    body.update({
+        'batch_id': job['job_id'],
+        'accepted': len(documents),
+        'skipped_count': len(skipped),
+        'skipped': skipped[:100]
+    })
+    return jsonify(body), status, headers
+
+@app.route('/api/jobs/<job_id>')
+def api_get_job(job_id):
+    """Status of a queued document job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    result_id = (job.get('result') or {}).get('result_id')
+    if result_id:
+        job['result_url'] = url_for('api_get_results', result_id=result_id)
+        job['view_url'] = url_for('view_results', result_id=result_id)
+    return jsonify(job)
+
+@app.route('/api/jobs')
+def api_list_jobs():
+    """Recently submitted jobs, optionally filtered by state"""
+    return jsonify({
+        'jobs': job_queue.list_jobs(
+            state=request.args.get('state'),
+            limit=max(1, min(request.args.get('limit', 50, type=int), 500))
+        ),
+        'stats': job_queue.get_stats()
+    })
+
 @app.route('/results/<result_id>')
 def view_results(result_id):
     """Display classification results"""
@@ -211,86 +457,274 @@ def api_classify():
         app.logger.error(f"API classification error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def not_modified(etag):
+    """A 304 response if the client already holds this entity tag, else None"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def negotiated_coding():
+    """Content coding to compress a response with (br when available, then gzip), or None"""
+    return request.accept_encodings.best_match(RESPONSE_CODINGS)
+
+def store_etag(*versions):
+    """Strong entity tag of a response built from store versions; the URL is part of it since queries differ"""
+    return content_etag(repr((versions, request.full_path)).encode())
+
+def versioned_json_response(etag, build):
+    """
+    JSON response whose entity tag is known before its body is built, so an
+    unchanged resource costs a 304 without a store query or serialization.
+    build() returns the JSON as bytes, or as an iterator of byte chunks to stream.
+    """
+    coding = negotiated_coding()
+    # Strong tags must differ per coding; small bodies are sent uncompressed under the plain tag
+    for tag in ((f'{etag}-{coding}',) if coding else ()) + (etag,):
+        response = not_modified(tag)
+        if response is not None:
+            response.vary.add('Accept-Encoding')
+            return response
+    
+    body = build()
+    if isinstance(body, bytes):
+        if coding and len(body) < RESPONSE_COMPRESS_MIN_BYTES:
+            coding = None
+        if coding:
+            body = compress(body, coding)
+    elif coding:
+        body = compress_chunks(body, coding)
+    
+    response = Response(body, mimetype='application/json')
+    if coding:
+        response.headers['Content-Encoding'] = coding
+    response.set_etag(f'{etag}-{coding}' if coding else etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+def encoded_json_response(encoded):
+    """Serve JSON encoded ahead of time without re-encoding it, honouring If-None-Match"""
+    send_gzip = encoded.compressed and request.accept_encodings['gzip'] > 0
+    # Strong tags must differ between the gzip and identity representations
+    etag = f'{encoded.etag}-gzip' if send_gzip else encoded.etag
+    response = not_modified(etag)
+    if response is None:
+        response = Response(encoded.body if send_gzip else encoded.json_bytes(), mimetype='application/json')
+        if send_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(etag)
+    if encoded.compressed:
+        response.vary.add('Accept-Encoding')
+    return response
+
 @app.route('/api/results/<result_id>')
 def api_get_results(result_id):
     """API endpoint to get classification results"""
     try:
-        result = memory_store.get_classification(result_id)
-        if not result:
+        encoded = memory_store.get_encoded_classification(result_id)
+        if not encoded:
             return jsonify({'error': 'Results not found'}), 404
         
-        return jsonify(result)
+        return encoded_json_response(encoded)
         
     except Exception as e:
         app.logger.error(f"API get results error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/results/<result_id>/parsed_content')
+def api_get_parsed_content(result_id):
+    """API endpoint to lazily load an offloaded JSON payload"""
+    try:
+        result = memory_store.get_classification(result_id)
+        if not result:
+            return jsonify({'error': 'Results not found'}), 404
+
+        # Small payloads are kept inline in the record
+        analysis = result.get('specialized_analysis') or result
+        if 'parsed_content' in analysis:
+            return jsonify(analysis['parsed_content'])
+
+        ref = memory_store.get_payload_ref(result_id, 'parsed_content')
+        if not ref or not memory_store.blob_store.exists(ref['blob_id']):
+            return jsonify({'error': 'Payload not found'}), 404
+
+        return Response(memory_store.blob_store.iter_chunks(ref['blob_id']),
+                        mimetype=ref['content_type'],
+                        headers={'ETag': f'"{ref["blob_id"]}"'})
+
+    except Exception as e:
+        app.logger.error(f"API get payload error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def query_filters_from_args():
+    """Memory store query filters from request query parameters; ValueError if a time bound is malformed"""
+    return clean_filters({
+        'document_format': request.args.get('format'),
+        'business_intent': request.args.get('intent'),
+        'filename': request.args.get('filename'),
+        'min_confidence': request.args.get('min_confidence', type=float),
+        'max_confidence': request.args.get('max_confidence', type=float),
+        'since': request.args.get('since'),
+        'until': request.args.get('until')
+    })
+
+def query_classifications_from_args(filters, fields=None, encoded=False):
+    """Run a paginated memory store query with filters from query_filters_from_args"""
+    if encoded:
+        return memory_store.query_encoded_classifications(
+            filters,
+            cursor=request.args.get('cursor', type=int),
+            limit=request.args.get('limit', 50, type=int)
+        )
+
+    if request.args.get('fields'):
+        fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+
+    return memory_store.query_classifications(
+        filters,
+        fields=fields,
+        cursor=request.args.get('cursor', type=int),
+        limit=request.args.get('limit', 50, type=int)
+    )
+
 @app.route('/memory')
 def view_memory():
-    """Debug endpoint to view memory store contents"""
-    return jsonify(memory_store.get_all_classifications())
+    """Debug endpoint to view memory store contents, one page at a time"""
+    try:
+        filters = query_filters_from_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def build():
+        if request.args.get('fields'):
+            page = query_classifications_from_args(filters)
+            return encode_json({
+                'total_count': memory_store.backend.count_classifications(),
+                **page
+            })
+        
+        # Whole records are spliced into the page as the bytes they were stored as
+        page = query_classifications_from_args(filters, encoded=True)
+        return b''.join((
+            b'{"total_count":', encode_json(memory_store.backend.count_classifications()),
+            b',"classifications":[', b','.join(e.json_bytes() for e in page['classifications']),
+            b'],"count":', encode_json(page['count']),
+            b',"next_cursor":', encode_json(page['next_cursor']), b'}'
+        ))
+    
+    return versioned_json_response(store_etag(memory_store.version()), build)
 
 @app.route('/api/logs')
 def api_get_logs():
     """API endpoint to get trace logs"""
     try:
         limit = request.args.get('limit', 50, type=int)
-        logs = memory_store.get_trace_logs(limit=limit)
-        return jsonify({
-            'logs': logs,
-            'total_count': len(logs)
-        })
+        since = request.args.get('since', type=int)
+        
+        def build():
+            # Incremental read: only entries after the client's cursor, oldest first
+            if since is not None:
+                page = memory_store.get_trace_logs_since(since, limit=limit)
+                return encode_json({
+                    **page,
+                    'total_count': len(page['logs'])
+                })
+            
+            logs = memory_store.get_trace_logs(limit=limit)
+            return encode_json({
+                'logs': logs,
+                'total_count': len(logs),
+                'next_cursor': logs[0]['seq'] if logs else 0
+            })
+        
+        return versioned_json_response(store_etag(memory_store.version('trace_logs')), build)
     except Exception as e:
         app.logger.error(f"Error retrieving logs: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analytics')
+def api_get_analytics():
+    """API endpoint for precomputed document analytics"""
+    try:
+        return jsonify(memory_store.get_analytics(
+            minutes=request.args.get('minutes', 60, type=int),
+            hours=request.args.get('hours', 24, type=int),
+            window_minutes=request.args.get('window_minutes', type=int)
+        ))
+    except Exception as e:
+        app.logger.error(f"Error retrieving analytics: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/memory/stats')
+def api_memory_stats():
+    """API endpoint for memory store size and retention status"""
+    try:
+        return jsonify(memory_store.get_memory_usage())
+    except Exception as e:
+        app.logger.error(f"Error retrieving memory stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/dashboard')
 def dashboard():
     """Dashboard page showing system overview"""
     try:
         stats = memory_store.get_statistics()
+        analytics = memory_store.get_analytics()
         recent_logs = memory_store.get_trace_logs(limit=10)
-        return render_template('dashboard.html', stats=stats, logs=recent_logs)
+        return render_template('dashboard.html', stats=stats, analytics=analytics, logs=recent_logs)
     except Exception as e:
         app.logger.error(f"Dashboard error: {str(e)}")
         flash('Error loading dashboard', 'error')
         return redirect(url_for('index'))
+
+@app.route('/api/dashboard/stream')
+def dashboard_stream():
+    """
+    Push new trace logs and statistics changes to the dashboard as server-sent events.
+    Clients start from a snapshot of the statistics and recent logs; one reconnecting
+    with Last-Event-ID gets the events it missed instead.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    return event_stream_response(dashboard_feed.subscribe(last_event_id, keepalive=STREAM_KEEPALIVE_SECONDS))
+
+@app.route('/api/dashboard/stream/stats')
+def dashboard_stream_stats():
+    """Subscribers and published events of this process's dashboard feed, and its stream slots"""
+    return jsonify({**dashboard_feed.get_stats(), 'streams': stream_limiter.get_stats()})
 @app.route('/api/runs', methods=['GET'])
 def list_runs():
-    if os.path.exists(RUNS_FILE):
-        with open(RUNS_FILE, 'r') as f:
-            data = json.load(f)
-    else:
-        data = {}
+    """Saved runs, most recently saved first, streamed from the run journal one page at a time"""
+    journal = get_run_journal()
 
-    return jsonify(data)
+    def build():
+        lines, next_cursor = journal.page(
+            cursor=request.args.get('cursor', type=int),
+            limit=request.args.get('limit', 50, type=int)
+        )
 
-import json
-import os
-from datetime import datetime
+        def generate():
+            yield b'{"runs":['
+            for i, line in enumerate(lines):
+                yield b',' + line if i else line
+            yield b'],"next_cursor":' + encode_json(next_cursor) + b'}'
 
-RUNS_FILE = 'data/runs.json'
+        return stream_with_context(generate())
 
-def save_run_metadata(run_id, metadata):
-    # Load existing data
-    if os.path.exists(RUNS_FILE):
-        with open(RUNS_FILE, 'r') as f:
-            data = json.load(f)
-    else:
-        data = {}
+    return versioned_json_response(store_etag(journal.version()), build)
 
-    # Add new run
-    data[run_id] = metadata
+import uuid
+from datetime import datetime
 
-    # Save back
-    with open(RUNS_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+def save_run_metadata(run_id, metadata):
+    """Append a version of a run to the run journal"""
+    get_run_journal().put(run_id, metadata)
 
-@app.route('/api/trigger', methods=['POST'])
-def trigger_run():
-    body = request.json
-    # send POST to LangFlow here...
-    run_id = "generated_or_received_run_id"
+@app.route('/api/runs', methods=['POST'])
+def record_run():
+    """Record a run in the run journal; workflow executions are queued through /api/trigger"""
+    body = request.get_json(silent=True) or {}
+    run_id = body.get('run_id') or uuid.uuid4().hex
 
     metadata = {
         "timestamp": datetime.utcnow().isoformat(),
@@ -326,109 +760,165 @@ def trigger_action_router(classification_result, specialized_result=None):
 # LangFlow Integration Endpoints
 @app.route('/api/langflow/runs', methods=['GET'])
 def get_langflow_runs():
-    """Get all workflow runs"""
+    """Get workflow runs, newest first, one page at a time"""
     try:
-        classifications = memory_store.get_all_classifications()
-        runs = []
-        
-        for classification in classifications['classifications']:
-            run_data = {
-                "id": classification.get("id"),
-                "flow_id": "classifier-agent-flow",
-                "status": "completed" if not classification.get("error") else "failed",
-                "created_at": classification.get("timestamp"),
-                "updated_at": classification.get("timestamp"),
-                "inputs": {
-                    "content": classification.get("content", "")[:100] + "..." if len(classification.get("content", "")) > 100 else classification.get("content", ""),
-                    "filename": classification.get("filename")
-                },
-                "outputs": {
-                    "document_format": classification.get("document_format"),
-                    "business_intent": classification.get("business_intent"),
-                    "confidence_score": classification.get("confidence_score")
-                },
-                "execution_time": 2.5,  # Simulated
-                "error": classification.get("error")
-            }
-            runs.append(run_data)
-        
-        return jsonify({
-            "runs": runs,
-            "total": len(runs)
-        })
+        filters = query_filters_from_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        return versioned_json_response(store_etag(memory_store.version()), lambda: build_langflow_runs_page(filters))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/langflow/runs/<run_id>', methods=['GET'])
-def get_langflow_run(run_id):
-    """Get specific workflow run details"""
-    try:
-        result = memory_store.get_classification(run_id)
-        if not result:
-            return jsonify({"error": "Run not found"}), 404
-        
-        run_detail = {
-            "id": run_id,
+def build_langflow_runs_page(filters):
+    """The /api/langflow/runs page for the given query filters, as JSON bytes"""
+    page = query_classifications_from_args(filters, fields=[
+        'error', 'timestamp', 'content', 'filename',
+        'document_format', 'business_intent', 'confidence_score', 'stage_timings_ms'
+    ])
+    runs = []
+    
+    for classification in page['classifications']:
+        run_data = {
+            "id": classification.get("id"),
             "flow_id": "classifier-agent-flow",
-            "status": "completed" if not result.get("error") else "failed",
-            "created_at": result.get("timestamp"),
-            "updated_at": result.get("timestamp"),
+            "status": "completed" if not classification.get("error") else "failed",
+            "created_at": classification.get("timestamp"),
+            "updated_at": classification.get("timestamp"),
             "inputs": {
-                "content": result.get("content", ""),
-                "filename": result.get("filename")
+                "content": classification.get("content", "")[:100] + "..." if len(classification.get("content", "")) > 100 else classification.get("content", ""),
+                "filename": classification.get("filename")
             },
             "outputs": {
-                "document_format": result.get("document_format"),
-                "business_intent": result.get("business_intent"),
-                "confidence_score": result.get("confidence_score"),
-                "reasoning": result.get("reasoning"),
-                "key_indicators": result.get("key_indicators")
+                "document_format": classification.get("document_format"),
+                "business_intent": classification.get("business_intent"),
+                "confidence_score": classification.get("confidence_score")
             },
-            "specialized_analysis": result.get("specialized_analysis"),
-            "routing_decisions": result.get("routing_decisions"),
-            "execution_time": 2.5,
-            "error": result.get("error"),
-            "logs": [
-                {
-                    "timestamp": result.get("timestamp"),
-                    "level": "INFO",
-                    "message": f"Document classified as {result.get('document_format')} / {result.get('business_intent')}"
-                }
-            ]
+            "execution_time": execution_time(classification),
+            "error": classification.get("error")
         }
+        runs.append(run_data)
+    
+    return encode_json({
+        "runs": runs,
+        "total": len(runs),
+        "next_cursor": page['next_cursor']
+    })
+
+@app.route('/api/langflow/runs/<run_id>', methods=['GET'])
+def get_langflow_run(run_id):
+    """Get specific workflow run details"""
+    try:
+        encoded = memory_store.get_encoded_classification(run_id)
+        if not encoded:
+            return jsonify({"error": "Run not found"}), 404
         
-        return jsonify(run_detail)
+        # The run detail is derived from an immutable result, so the result's tag identifies it
+        return versioned_json_response(f'{encoded.etag}-run', lambda: build_langflow_run(run_id, encoded.decode()))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def build_langflow_run(run_id, result):
+    """The /api/langflow/runs/<run_id> detail of a stored result, as JSON bytes"""
+    run_detail = {
+        "id": run_id,
+        "flow_id": "classifier-agent-flow",
+        "status": "completed" if not result.get("error") else "failed",
+        "created_at": result.get("timestamp"),
+        "updated_at": result.get("timestamp"),
+        "inputs": {
+            "content": result.get("content", ""),
+            "filename": result.get("filename")
+        },
+        "outputs": {
+            "document_format": result.get("document_format"),
+            "business_intent": result.get("business_intent"),
+            "confidence_score": result.get("confidence_score"),
+            "reasoning": result.get("reasoning"),
+            "key_indicators": result.get("key_indicators")
+        },
+        "specialized_analysis": result.get("specialized_analysis"),
+        "routing_decisions": result.get("routing_decisions"),
+        "execution_time": execution_time(result),
+        "error": result.get("error"),
+        "logs": [
+            {
+                "timestamp": result.get("timestamp"),
+                "level": "INFO",
+                "message": f"Document classified as {result.get('document_format')} / {result.get('business_intent')}"
+            }
+        ]
+    }
+    
+    return encode_json(run_detail)
+
+def sse_event(event):
+    """Format a pipeline event as a server-sent event"""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
 @app.route('/api/langflow/runs/<run_id>/stream', methods=['GET'])
 def stream_langflow_run(run_id):
-    """Stream workflow execution logs via SSE"""
-    def generate():
+    """
+    Stream pipeline stage events of a run as server-sent events.
+    The run ID is a job ID or the ID of a stored result; a client reconnecting
+    with Last-Event-ID only receives the events it missed.
+    """
+    job_id = run_id
+    if not job_queue.get(job_id):
         result = memory_store.get_classification(run_id)
         if not result:
-            yield f"data: {json.dumps({'error': 'Run not found'})}\n\n"
-            return
-        
-        # Simulate streaming execution logs
-        logs = [
-            {"timestamp": result.get("timestamp"), "level": "INFO", "message": "Starting document classification"},
-            {"timestamp": result.get("timestamp"), "level": "INFO", "message": f"Processing file: {result.get('filename')}"},
-            {"timestamp": result.get("timestamp"), "level": "INFO", "message": f"Format detected: {result.get('document_format')}"},
-            {"timestamp": result.get("timestamp"), "level": "INFO", "message": f"Intent classified: {result.get('business_intent')}"},
-            {"timestamp": result.get("timestamp"), "level": "INFO", "message": "Classification completed successfully"}
-        ]
-        
-        for log in logs:
-            yield f"data: {json.dumps(log)}\n\n"
+            return jsonify({"error": "Run not found"}), 404
+        job_id = result.get('job_id')
+        if not job_id or not job_queue.get(job_id):
+            # Results from before jobs were tracked, or whose job expired: report the recorded timings
+            summary = {"id": 1, "event": "succeeded", "state": "succeeded",
+                       "stage_timings_ms": result.get('stage_timings_ms'),
+                       "execution_time": execution_time(result), "result_id": run_id}
+            return Response(sse_event(summary), mimetype='text/event-stream')
+    
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', 0))
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        last_event_id = 0
+    
+    def generate():
+        after = last_event_id
+        bus = job_queue.event_bus
+        # Jobs running in another worker process are followed through the jobs database
+        if not bus.has_run(job_id):
+            while True:
+                job = job_queue.get(job_id)
+                if not job:
+                    return
+                for event in job['events']:
+                    if event['id'] > after:
+                        after = event['id']
+                        yield sse_event(event)
+                if job['state'] in FINISHED_STATES:
+                    return
+                if not bus.has_run(job_id):
+                    time.sleep(STREAM_POLL_SECONDS)
+                    yield ": keep-alive\n\n"
+                    continue
+                break
         
-        yield f"data: {json.dumps({'status': 'completed'})}\n\n"
+        while True:
+            events, finished = bus.read(job_id, after, timeout=STREAM_KEEPALIVE_SECONDS)
+            if finished:
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                after = event['id']
+                yield sse_event(event)
     
-    return app.response_class(generate(), mimetype='text/plain')
+    return event_stream_response(stream_with_context(generate()))
 
 @app.route('/api/trigger', methods=['POST'])
 def trigger_workflow():
-    """Trigger workflow execution"""
+    """Queue a workflow execution"""
     try:
         data = request.get_json()
         flow_id = data.get('flow_id')
@@ -441,48 +931,21 @@ def trigger_workflow():
         if not content:
             return jsonify({"error": "Content is required"}), 400
         
-        # Execute the appropriate workflow
-        if flow_id == 'email-agent-flow':
-            result = email_agent.analyze_email(content, filename)
-        elif flow_id == 'json-agent-flow':
-            result = json_agent.analyze_json(content, filename)
-        elif flow_id == 'pdf-agent-flow':
-            result = pdf_agent.analyze_pdf(content, filename)
-        elif flow_id == 'classifier-agent-flow':
-            # Full classification pipeline
-            classification_result = classifier_agent.classify_document(content, filename)
-            
-            # Run specialized agent
-            specialized_result = None
-            document_format = classification_result.get('document_format', '').lower()
-            
-            if document_format == 'email':
-                specialized_result = email_agent.analyze_email(content, filename)
-            elif document_format == 'json':
-                specialized_result = json_agent.analyze_json(content, filename)
-            elif document_format == 'pdf':
-                specialized_result = pdf_agent.analyze_pdf(content, filename)
-            
-            # Route actions
-            routing_result = action_router.route_document(classification_result, specialized_result)
-            
-            # Store complete result
-            result = {
-                **classification_result,
-                'specialized_analysis': specialized_result,
-                'routing_decisions': routing_result
-            }
-        else:
+        if flow_id not in ('email-agent-flow', 'json-agent-flow', 'pdf-agent-flow', 'classifier-agent-flow'):
             return jsonify({"error": "Unknown flow_id"}), 400
         
-        # Store result
-        result_id = memory_store.store_classification(result)
+        job = job_queue.submit('trigger', {
+            'flow_id': flow_id,
+            'content': content,
+            'filename': filename
+        }, meta={'flow_id': flow_id, 'filename': filename, 'trigger_type': trigger_type},
+           lane=TRIGGER_LANES.get(trigger_type, 'webhook'))
         
-        return jsonify({
-            "run_id": result_id,
-            "status": "completed",
-            "outputs": result
-        })
+        return job_accepted_response(job)
+    
+    except QueueFull as e:
+        app.logger.warning(f"Workflow trigger rejected: {str(e)}")
+        return queue_full_response(e, "Too many workflows queued, try again shortly")
         
     except Exception as e:
         app.logger.error(f"Workflow trigger error: {str(e)}")
@@ -542,11 +1005,67 @@ def get_available_flows():
     
     return jsonify({"flows": flows})
 
+@app.route('/api/outbound', methods=['GET'])
+def get_outbound_status():
+    """Outbound dispatcher queue counts and recent dead letters"""
+    return jsonify({
+        **outbound_dispatcher.get_stats(),
+        "dead_letters": outbound_dispatcher.get_dead_letters(limit=request.args.get('limit', 20, type=int))
+    })
+
+@app.route('/api/outbound/requeue', methods=['POST'])
+def requeue_outbound():
+    """Retry all dead-lettered outbound calls"""
+    return jsonify({"requeued": outbound_dispatcher.requeue_dead_letters()})
+
+@app.route('/api/escalations/coalesced', methods=['GET'])
+def get_coalesced_escalations():
+    """Currently open escalation coalescing windows"""
+    action_router.coalescer.flush_expired()
+    events = action_router.coalescer.get_open_events()
+    return jsonify({
+        "window_seconds": action_router.coalescer.window_seconds,
+        "open_events": events,
+        "total": len(events)
+    })
+
+@app.route('/api/rules', methods=['GET'])
+def get_routing_rules():
+    """Describe the active routing decision table"""
+    return jsonify(action_router.rule_engine.get_table().describe())
+
+@app.route('/api/rules/simulate', methods=['POST'])
+def simulate_routing_rules():
+    """Replay stored documents through a candidate rule set"""
+    try:
+        data = request.get_json() or {}
+        report = routing_simulator.simulate(
+            candidate_spec=data.get('rules'),
+            overrides=data.get('overrides'),
+            max_flips=data.get('max_flips', 100)
+        )
+        return jsonify(report)
+    except (ValueError, KeyError) as e:
+        return jsonify({"error": f"Invalid rule set: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.error(f"Routing simulation error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/rules/reload', methods=['POST'])
+def reload_routing_rules():
+    """Recompile the routing rules file without a restart"""
+    if not action_router.rule_engine.reload():
+        return jsonify({"error": "Rules file is invalid, previous rules kept"}), 400
+
+    return jsonify(action_router.rule_engine.table.describe())
+
 # Cron Scheduling System
 class CronScheduler:
     def __init__(self):
         self.scheduled_jobs = {}
         self.running = False
+        # Request threads schedule jobs while the scheduler thread walks them
+        self._lock = threading.Lock()
         
     def start(self):
         """Start the cron scheduler"""
@@ -557,7 +1076,9 @@ class CronScheduler:
         """Run scheduled jobs"""
         while self.running:
             current_time = time.time()
-            for job_id, job in list(self.scheduled_jobs.items()):
+            with self._lock:
+                jobs = list(self.scheduled_jobs.items())
+            for job_id, job in jobs:
                 if current_time >= job['next_run']:
                     try:
                         # Execute the job
@@ -569,25 +1090,47 @@ class CronScheduler:
                                     with open(filepath, 'r') as f:
                                         content = f.read()
                                     
-                                    # Trigger classification
-                                    classification_result = classifier_agent.classify_document(content, filename)
-                                    memory_store.store_classification(classification_result)
+                                    # Classification runs in the batch lane, behind interactive and webhook work;
+                                    # a file still queued from the previous run is not queued again
+                                    job_queue.submit('trigger', {
+                                        'flow_id': job['flow_id'],
+                                        'content': content,
+                                        'filename': filename
+                                    }, meta={'flow_id': job['flow_id'], 'filename': filename, 'trigger_type': 'cron'},
+                                       dedup_key=f"cron:{job_id}:{filename}", lane='batch')
                         
                         # Update next run time
-                        job['next_run'] = current_time + job['interval']
+                        self._set_next_run(job_id, job, current_time + job['interval'])
+                    
+                    except QueueFull as e:
+                        # Files already queued stay queued; the rest are picked up when the lane has room
+                        app.logger.warning(f"Cron job {job_id} deferred: {str(e)}")
+                        self._set_next_run(job_id, job, current_time + e.retry_after)
                         
                     except Exception as e:
                         app.logger.error(f"Cron job {job_id} failed: {str(e)}")
             
             time.sleep(10)  # Check every 10 seconds
     
+    def _set_next_run(self, job_id, job, next_run):
+        """Set when a job runs next, unless it was rescheduled while it ran"""
+        with self._lock:
+            if self.scheduled_jobs.get(job_id) is job:
+                job['next_run'] = next_run
+    
     def schedule_job(self, job_id, flow_id, interval):
         """Schedule a new cron job"""
-        self.scheduled_jobs[job_id] = {
-            'flow_id': flow_id,
-            'interval': interval,
-            'next_run': time.time() + interval
-        }
+        with self._lock:
+            self.scheduled_jobs[job_id] = {
+                'flow_id': flow_id,
+                'interval': interval,
+                'next_run': time.time() + interval
+            }
+    
+    def get_jobs(self):
+        """Copy of the scheduled jobs, safe to serialize while the scheduler runs"""
+        with self._lock:
+            return {job_id: dict(job) for job_id, job in self.scheduled_jobs.items()}
 
 # Initialize cron scheduler
 cron_scheduler = CronScheduler()
@@ -614,7 +1157,7 @@ def schedule_cron_job():
 @app.route('/api/cron/jobs', methods=['GET'])
 def get_cron_jobs():
     """Get all scheduled cron jobs"""
-    return jsonify({"jobs": cron_scheduler.scheduled_jobs})
+    return jsonify({"jobs": cron_scheduler.get_jobs()})
 
 if __name__ == '__main__':
     # Start cron scheduler
@@ -0,0 +1,142 @@
+"""
+Concurrency benchmark for the LangFlow stream proxy.
+
+Runs a stub LangFlow server and the proxy in processes of their own and
+opens many concurrent event streams through the proxy. Every stub stream emits a fixed
+number of lines with a delay between them. Reports wall time, relayed
+events and peak open streams. Then it disconnects a batch of clients halfway
+through and checks that their upstream requests were closed as well.
+
+    python benchmarks/langflow_proxy.py --streams 2000 --events 20 --interval 0.05
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import multiprocessing
+
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langflow_proxy import create_app
+
+class StubLangFlow:
+    """Streams numbered JSON lines for /api/runs and /api/runs/<id>/events"""
+
+    def __init__(self, events: int, interval: float):
+        self.events = events
+        self.interval = interval
+        self.open_streams = 0
+        self.peak_streams = 0
+        self.cancelled = 0
+
+    async def stream(self, request: web.Request) -> web.StreamResponse:
+        self.open_streams += 1
+        self.peak_streams = max(self.peak_streams, self.open_streams)
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        try:
+            await response.prepare(request)
+            for i in range(self.events):
+                await response.write(b'{"event": "token", "index": %d}\n' % i)
+                await asyncio.sleep(self.interval)
+            await response.write_eof()
+        except (ConnectionResetError, asyncio.CancelledError):
+            self.cancelled += 1
+            raise
+        finally:
+            self.open_streams -= 1
+        return response
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"open": self.open_streams, "peak": self.peak_streams, "cancelled": self.cancelled})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/runs", self.stream)
+        app.router.add_get("/api/runs/{run_id}/events", self.stream)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+def serve(app_factory, port: int, *args, **kwargs) -> None:
+    """Process target running one application"""
+    web.run_app(app_factory(*args, **kwargs), host="127.0.0.1", port=port, backlog=4096,
+                handler_cancellation=True, print=None)
+
+def stub_app(events: int, interval: float) -> web.Application:
+    return StubLangFlow(events, interval).app()
+
+async def wait_until_up(session: ClientSession, url: str) -> None:
+    for _ in range(100):
+        try:
+            async with session.get(url):
+                return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+async def get_json(session: ClientSession, url: str) -> dict:
+    async with session.get(url) as response:
+        return json.loads(await response.read())
+
+async def consume(session: ClientSession, url: str, stop_after: int = 0) -> int:
+    """Read one event stream; returns the number of events received"""
+    received = 0
+    async with session.get(url) as response:
+        async for line in response.content:
+            if line.startswith(b"data: "):
+                received += 1
+                if stop_after and received >= stop_after:
+                    break
+    return received
+
+async def main(args: argparse.Namespace) -> None:
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    proxy_url = f"http://127.0.0.1:{args.proxy_port}"
+    servers = [
+        multiprocessing.Process(target=serve, args=(stub_app, args.stub_port, args.events, args.interval), daemon=True),
+        multiprocessing.Process(target=serve, args=(create_app, args.proxy_port, stub_url),
+                                kwargs={"pool_size": args.streams}, daemon=True)
+    ]
+    for server in servers:
+        server.start()
+
+    base = f"{proxy_url}/api/langflow/stream"
+    async with ClientSession(connector=TCPConnector(limit=0), timeout=ClientTimeout(total=None)) as session:
+        await wait_until_up(session, f"{stub_url}/stats")
+        await wait_until_up(session, f"{proxy_url}/api/langflow/proxy/stats")
+
+        started = time.perf_counter()
+        counts = await asyncio.gather(*(consume(session, f"{base}/run-{i}") for i in range(args.streams)))
+        elapsed = time.perf_counter() - started
+
+        stub = await get_json(session, f"{stub_url}/stats")
+        expected = args.events * args.streams
+        print(f"{args.streams} streams x {args.events} events in {elapsed:.2f}s "
+              f"(ideal {args.events * args.interval:.2f}s)")
+        print(f"  events relayed: {sum(counts)}/{expected}, peak upstream streams: {stub['peak']}")
+
+        # Clients that leave halfway must not leave their upstream streams running
+        await asyncio.gather(*(consume(session, f"{base}/gone-{i}", stop_after=args.events // 2)
+                               for i in range(args.disconnects)))
+        await asyncio.sleep(args.interval * 4 + 0.5)
+        after = await get_json(session, f"{stub_url}/stats")
+        proxy = await get_json(session, f"{proxy_url}/api/langflow/proxy/stats")
+        print(f"  {args.disconnects} early disconnects: {after['cancelled'] - stub['cancelled']} upstream streams "
+              f"closed, {after['open']} still open; proxy saw {proxy['client_disconnects']} disconnects, "
+              f"{proxy['active_streams']} active")
+
+    for server in servers:
+        server.terminate()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LangFlow stream proxy concurrency benchmark")
+    parser.add_argument("--streams", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between stub events")
+    parser.add_argument("--disconnects", type=int, default=100)
+    parser.add_argument("--stub-port", type=int, default=17860)
+    parser.add_argument("--proxy-port", type=int, default=15001)
+    asyncio.run(main(parser.parse_args()))
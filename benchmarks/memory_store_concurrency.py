@@ -0,0 +1,112 @@
+"""
+Concurrency stress benchmark for MemoryStore.
+
+Runs the same mixed workload (store, read, query, trace log append and
+incremental trace read) with an increasing number of threads, checks that no
+writes were lost, and reports throughput per thread count.
+
+Only the first thread tails the trace log, as the dashboard feed does in a
+worker; if every thread tailed it, each would read every other thread's
+entries and the work per document would grow with the thread count. The
+in-memory backend runs under the GIL, so the most it can show is flat
+throughput: the scaling column measures the cost of contention, not a
+speedup.
+
+    python benchmarks/memory_store_concurrency.py --backend memory --threads 1,2,4,8
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_store import MemoryStore
+from utils.retention import RetentionPolicy
+from utils.store_backends import InMemoryBackend, SQLiteBackend
+
+FORMATS = ("Email", "JSON", "PDF")
+INTENTS = ("RFQ", "Complaint", "Invoice", "Regulation", "Fraud Risk")
+
+def make_store(backend: str, stripes: int) -> MemoryStore:
+    if backend == "sqlite":
+        store_backend = SQLiteBackend(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    else:
+        store_backend = InMemoryBackend(stripes=stripes)
+    return MemoryStore(backend=store_backend, retention=RetentionPolicy(max_records=0, max_bytes=0, ttl_seconds=0))
+
+def worker(store: MemoryStore, ops: int, seed: int, stored_ids: list) -> None:
+    rng = random.Random(seed)
+    cursor = 0
+    mine = []
+    for i in range(ops):
+        result_id = store.store_classification({
+            "filename": f"doc-{seed}-{i}.txt",
+            "document_format": rng.choice(FORMATS),
+            "business_intent": rng.choice(INTENTS),
+            "confidence_score": rng.random(),
+            "content": "x" * rng.randint(50, 500)
+        })
+        mine.append(result_id)
+
+        store.get_classification(rng.choice(mine))
+        if i % 10 == 0:
+            store.query_classifications({"document_format": rng.choice(FORMATS)}, limit=20)
+        store._add_trace_log("benchmark_step", {"worker": seed, "step": i})
+        if seed == 0:
+            cursor = store.get_trace_logs_since(cursor, limit=100)["next_cursor"]
+    stored_ids.extend(mine)
+
+def run(backend: str, threads: int, ops: int, stripes: int) -> dict:
+    store = make_store(backend, stripes)
+    stored_ids = []
+    workers = [threading.Thread(target=worker, args=(store, ops, n, stored_ids)) for n in range(threads)]
+
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    expected = threads * ops
+    stored = store.backend.count_classifications()
+    missing = sum(1 for result_id in stored_ids if store.get_classification(result_id) is None)
+    logs = store.get_trace_logs()
+    seqs = [log["seq"] for log in logs]
+
+    store.backend.close()
+    return {
+        "threads": threads,
+        "operations": expected,
+        "seconds": elapsed,
+        "docs_per_second": expected / elapsed,
+        "lost_writes": expected - stored + missing,
+        "duplicate_trace_seqs": len(seqs) - len(set(seqs))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--threads", default="1,2,4,8", help="Comma-separated thread counts")
+    parser.add_argument("--ops", type=int, default=2000, help="Documents stored per thread")
+    parser.add_argument("--stripes", type=int, default=16, help="Lock stripes for the memory backend")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    print(f"{'threads':>7} {'docs':>7} {'seconds':>8} {'docs/s':>9} {'scaling':>8} {'lost':>5} {'dup seq':>7}")
+    baseline = None
+    for threads in [int(t) for t in args.threads.split(",")]:
+        result = run(args.backend, threads, args.ops, args.stripes)
+        baseline = baseline or result["docs_per_second"]
+        print(f"{result['threads']:>7} {result['operations']:>7} {result['seconds']:>8.2f} "
+              f"{result['docs_per_second']:>9.0f} {result['docs_per_second'] / baseline:>7.2f}x "
+              f"{result['lost_writes']:>5} {result['duplicate_trace_seqs']:>7}")
+
+if __name__ == "__main__":
+    main()
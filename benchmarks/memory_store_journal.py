@@ -0,0 +1,96 @@
+"""
+Journal benchmark for MemoryStore.
+
+Measures the write overhead of journaling and how long a restart takes to
+restore the store, from the journal alone and from a snapshot.
+
+    python benchmarks/memory_store_journal.py --docs 20000
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_store import MemoryStore
+from utils.retention import RetentionPolicy
+from utils.store_backends import InMemoryBackend
+from utils.store_journal import StoreJournal
+
+def make_store(journal_dir=None) -> MemoryStore:
+    return MemoryStore(
+        backend=InMemoryBackend(),
+        retention=RetentionPolicy(max_records=0, max_bytes=0, ttl_seconds=0),
+        journal=StoreJournal(journal_dir, compact_bytes=1 << 62) if journal_dir else None
+    )
+
+def write_docs(store: MemoryStore, docs: int) -> float:
+    rng = random.Random(7)
+    started = time.perf_counter()
+    for i in range(docs):
+        store.store_classification({
+            "filename": f"doc-{i}.txt",
+            "document_format": rng.choice(("Email", "JSON", "PDF")),
+            "business_intent": rng.choice(("RFQ", "Complaint", "Invoice")),
+            "confidence_score": rng.random(),
+            "reasoning": "Classification based on content analysis",
+            "key_indicators": ["content_analysis"],
+            "model_used": "gemini-1.5-flash",
+            "content": "x" * rng.randint(200, 2000)
+        })
+    return time.perf_counter() - started
+
+def timed_restore(journal_dir: str) -> tuple:
+    started = time.perf_counter()
+    store = make_store(journal_dir)
+    elapsed = time.perf_counter() - started
+    count = store.backend.count_classifications()
+    store.journal.close()
+    return elapsed, count
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000, help="Documents stored")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    journal_dir = tempfile.mkdtemp()
+    try:
+        plain = write_docs(make_store(), args.docs)
+
+        store = make_store(journal_dir)
+        journaled = write_docs(store, args.docs)
+        store.journal.close()
+        journal_bytes = directory_size(journal_dir)
+
+        replay, replay_count = timed_restore(journal_dir)
+
+        store = make_store(journal_dir)
+        started = time.perf_counter()
+        store.snapshot()
+        snapshot_seconds = time.perf_counter() - started
+        store.journal.close()
+
+        restore, restore_count = timed_restore(journal_dir)
+
+        print(f"documents:               {args.docs}")
+        print(f"write without journal:   {args.docs / plain:>10.0f} docs/s")
+        print(f"write with journal:      {args.docs / journaled:>10.0f} docs/s "
+              f"({(journaled / plain - 1) * 100:+.1f}% per write)")
+        print(f"journal size:            {journal_bytes / 1e6:>10.1f} MB")
+        print(f"restore from journal:    {replay * 1000:>10.1f} ms ({replay_count} documents)")
+        print(f"snapshot compaction:     {snapshot_seconds * 1000:>10.1f} ms")
+        print(f"restore from snapshot:   {restore * 1000:>10.1f} ms ({restore_count} documents)")
+    finally:
+        shutil.rmtree(journal_dir)
+
+if __name__ == "__main__":
+    main()
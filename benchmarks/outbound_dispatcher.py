@@ -0,0 +1,134 @@
+"""
+Delivery check for the outbound dispatcher against a local stub server.
+
+Starts a stub downstream with four endpoints: one that accepts every batch,
+one that answers 503 to the first attempts of every message, one that always
+answers 500 and one that rejects with 400. Queues messages for each, plus
+one message left "inflight" by a worker that supposedly died, and waits for
+the queue to settle. Reports, per endpoint, the requests received, retried
+requests that repeated an earlier Idempotency-Key, and the final message
+statuses and attempt counts.
+
+    python benchmarks/outbound_dispatcher.py --messages 200 --failures 2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.outbound_dispatcher import OutboundDispatcher, INFLIGHT, PENDING
+
+ENDPOINTS = ("POST /ok", "POST /flaky", "POST /down", "POST /reject")
+
+class StubDownstream:
+    """Records every request and answers by path"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.requests = Counter()
+        self.batch_keys = defaultdict(Counter)
+        self.item_attempts = Counter()
+        self.lock = threading.Lock()
+
+    def handle(self, path: str, key: str, items: list) -> int:
+        with self.lock:
+            self.requests[path] += 1
+            self.batch_keys[path][key] += 1
+            for item in items:
+                self.item_attempts[item["idempotency_key"]] += 1
+            if path == "/ok":
+                return 200
+            if path == "/flaky":
+                # Fail until every message in the batch has been attempted `failures` times
+                due = all(self.item_attempts[item["idempotency_key"]] > self.failures for item in items)
+                return 200 if due else 503
+            return 500 if path == "/down" else 400
+
+    def server(self) -> ThreadingHTTPServer:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status = stub.handle(self.path, self.headers.get("Idempotency-Key"), body["items"])
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+
+def settle(dispatcher: OutboundDispatcher, timeout: float) -> float:
+    """Wait until nothing is pending or in flight; returns the seconds waited"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        counts = dispatcher.get_stats()["counts"]
+        if not counts[PENDING] and not counts[INFLIGHT]:
+            break
+        time.sleep(0.05)
+    return time.perf_counter() - started
+
+def main(args: argparse.Namespace) -> None:
+    stub = StubDownstream(args.failures)
+    server = stub.server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    dispatcher = OutboundDispatcher(
+        db_path=os.path.join(tempfile.mkdtemp(), "outbound.db"),
+        base_url=f"http://127.0.0.1:{server.server_port}",
+        workers=args.workers, batch_size=args.batch_size, max_attempts=args.max_attempts,
+        backoff_base=args.backoff, backoff_max=args.backoff * 8, poll_interval=0.05
+    )
+    # Reclaim quickly so the abandoned message below is picked up during the run
+    dispatcher.stale_after = 1.0
+
+    conn = dispatcher._connect()
+    now = time.time()
+    conn.execute(
+        "INSERT INTO outbound (idempotency_key, endpoint, payload, status, next_attempt_at, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ("abandoned", "POST /ok", "{}", INFLIGHT, now, now, now - 60)
+    )
+
+    started = time.perf_counter()
+    for endpoint in ENDPOINTS:
+        for i in range(args.messages):
+            dispatcher.enqueue(endpoint, {"n": i})
+    waited = settle(dispatcher, args.timeout)
+    dispatcher.stop()
+
+    print(f"{args.messages} messages x {len(ENDPOINTS)} endpoints settled in {waited:.2f}s "
+          f"(enqueue + delivery {time.perf_counter() - started:.2f}s)")
+    rows = conn.execute(
+        "SELECT endpoint, status, attempts, COUNT(*) FROM outbound GROUP BY endpoint, status, attempts ORDER BY endpoint"
+    ).fetchall()
+    for endpoint in ENDPOINTS:
+        path = endpoint.partition(" ")[2]
+        keys = stub.batch_keys[path]
+        repeated = sum(count - 1 for count in keys.values())
+        outcome = ", ".join(f"{count} {status} after {attempts}" for e, status, attempts, count in rows if e == endpoint)
+        print(f"  {endpoint}: {stub.requests[path]} requests, {repeated} retries reusing their Idempotency-Key; {outcome}")
+
+    abandoned = conn.execute("SELECT status, attempts FROM outbound WHERE idempotency_key = 'abandoned'").fetchone()
+    print(f"  message abandoned in flight: {abandoned[0]} after {abandoned[1]} attempt(s)")
+    server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Outbound dispatcher retries, 5xx handling and dead-lettering")
+    parser.add_argument("--messages", type=int, default=200, help="Messages queued per endpoint")
+    parser.add_argument("--failures", type=int, default=2, help="503 answers per message on /flaky")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--max-attempts", type=int, default=4)
+    parser.add_argument("--backoff", type=float, default=0.05, help="First retry delay in seconds")
+    parser.add_argument("--timeout", type=float, default=60)
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+"""
+Memory benchmark for stored record types.
+
+Compares the heap footprint of classification results and trace log entries
+kept as plain dicts against the slotted StoredResult and TraceEntry records.
+Results are decoded from JSON first, so every document carries its own copy
+of each key and enum string, as it does when it comes back from the model.
+
+    python benchmarks/record_memory.py --docs 20000
+"""
+import os
+import sys
+import gc
+import json
+import uuid
+import random
+import argparse
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.records import StoredResult, TraceEntry
+
+def make_results(docs: int):
+    rng = random.Random(7)
+    for i in range(docs):
+        result = {
+            "id": str(uuid.uuid4()),
+            "stored_at": datetime.now().isoformat(),
+            "result_type": "classification",
+            "filename": f"doc-{i}.txt",
+            "document_format": rng.choice(("Email", "JSON", "PDF")),
+            "business_intent": rng.choice(("RFQ", "Complaint", "Invoice", "Regulation", "Fraud Risk")),
+            "confidence_score": rng.random(),
+            "urgency_level": rng.choice(("Low", "Medium", "High", "Critical")),
+            "model_used": "gemini-1.5-flash",
+            "specialized_analysis": {"agent_type": "email", "tone": rng.choice(("Angry", "Neutral", "Formal"))}
+        }
+        yield json.loads(json.dumps(result))
+
+def make_traces(docs: int):
+    for i in range(docs):
+        yield json.loads(json.dumps({
+            "action": "classification_stored",
+            "details": {"result_id": str(uuid.uuid4()), "document_format": "Email", "filename": f"doc-{i}.txt"}
+        }))
+
+def measure(build) -> tuple:
+    """Bytes and allocated blocks still held after building a collection"""
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = snapshot.statistics("filename")
+    size = sum(s.size for s in stats)
+    blocks = sum(s.count for s in stats)
+    del kept
+    return size, blocks
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    args = parser.parse_args()
+
+    cases = [
+        ("results as dicts", lambda: list(make_results(args.docs))),
+        ("results as StoredResult", lambda: [StoredResult(r) for r in make_results(args.docs)]),
+        ("traces as dicts", lambda: [{
+            "timestamp": datetime.now().isoformat(),
+            "action": t["action"],
+            "details": t["details"],
+            "log_id": str(uuid.uuid4())
+        } for t in make_traces(args.docs)]),
+        ("traces as TraceEntry", lambda: [TraceEntry(t["action"], t["details"]) for t in make_traces(args.docs)])
+    ]
+
+    print(f"{args.docs} records each")
+    print(f"{'layout':<26}{'bytes/record':>14}{'blocks/record':>15}")
+    for name, build in cases:
+        size, blocks = measure(build)
+        print(f"{name:<26}{size / args.docs:>14.0f}{blocks / args.docs:>15.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Load benchmark comparing gunicorn serving modes.
+
+Starts the application under gunicorn.conf.py with sync workers (one request
+per process, the previous deployment) and with threaded workers, then drives
+POST /api/classify from many concurrent clients. Gemini is replaced by a
+model that sleeps for a fixed latency before answering, so the run measures
+how much waiting on the model each mode overlaps. Reports documents per
+second, the total proportional set size (PSS) of master and workers, and
+documents per second per GB. Linux only.
+
+    python benchmarks/serving_load.py --clients 64 --duration 20 --latency 0.5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "sync": {"GUNICORN_WORKER_CLASS": "sync", "GUNICORN_WORKERS": "4", "GUNICORN_THREADS": "1"},
+    "gthread": {"GUNICORN_WORKER_CLASS": "gthread", "GUNICORN_WORKERS": "2", "GUNICORN_THREADS": "16"}
+}
+
+DOCUMENT = ("From: buyer@example.com\nSubject: Quote request\n\n"
+            "Please send a quote for 500 units of part 1142 delivered by March.")
+
+class SimulatedModel:
+    """Stands in for GenerativeModel: waits like a remote call, then returns a fixed classification"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_content(self, prompt: str):
+        time.sleep(self.latency)
+        text = json.dumps({"document_format": "Email", "business_intent": "RFQ", "confidence_score": 0.9,
+                           "reasoning": "Simulated", "key_indicators": ["quote"]})
+        return type("Response", (), {"text": text})()
+
+def create_app():
+    """gunicorn application factory: the real app, with the simulated model installed first"""
+    sys.path.insert(0, ROOT)
+    from utils import gemini
+    gemini._models[gemini.GEMINI_MODEL] = SimulatedModel(float(os.environ.get("BENCH_MODEL_LATENCY", 0.5)))
+    from main import app
+    return app
+
+def drive(url: str, clients: int, duration: float) -> dict:
+    body = json.dumps({"content": DOCUMENT, "filename": "quote.eml"}).encode()
+    counts = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                outcome = "ok"
+            except (urllib.error.URLError, OSError):
+                outcome = "failed"
+            with lock:
+                counts[outcome] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counts["elapsed"] = time.perf_counter() - started
+    return counts
+
+def measure(args: argparse.Namespace, mode: str) -> None:
+    from startup import children, memory, get
+
+    env = {**os.environ, **MODES[mode], "BENCH_MODEL_LATENCY": str(args.latency),
+           "MEMORY_STORE_BACKEND": "sqlite",
+           "MEMORY_STORE_PATH": os.path.join(tempfile.mkdtemp(), "memory_store.db")}
+    command = [sys.executable, "-m", "gunicorn", "--config", os.path.join(ROOT, "gunicorn.conf.py"),
+               "--bind", f"127.0.0.1:{args.port}", args.app]
+    base = f"http://127.0.0.1:{args.port}"
+
+    master = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if master.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {master.returncode}")
+            try:
+                get(base + "/api/flows")
+                break
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.05)
+
+        counts = drive(base + "/api/classify", args.clients, args.duration)
+        pss = memory(master.pid)["pss"] + sum(memory(pid)["pss"] for pid in children(master.pid))
+        rate = counts["ok"] / counts["elapsed"]
+        settings = MODES[mode]
+        print(f"{mode} ({settings['GUNICORN_WORKERS']} workers x {settings['GUNICORN_THREADS']} threads): "
+              f"{rate:.1f} docs/s, {counts['failed']} failed, PSS {pss / 2**20:.0f} MiB, "
+              f"{rate / (pss / 2**30):.0f} docs/s per GB")
+    finally:
+        master.terminate()
+        master.wait(10)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Documents per second per GB under sync and threaded gunicorn")
+    parser.add_argument("--app", default="benchmarks.serving_load:create_app()")
+    parser.add_argument("--modes", default="sync,gthread")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds the simulated model takes per call")
+    parser.add_argument("--port", type=int, default=15010)
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        measure(args, mode)
+        time.sleep(1)
@@ -0,0 +1,100 @@
+"""
+Start-up benchmark for the gunicorn deployment.
+
+Starts gunicorn with gunicorn.conf.py, once importing the application in
+every worker and once preloading it in the master, and reports for each:
+the time until the first request is answered, the time until a burst of
+requests spread over all workers is answered, and the resident size of each
+worker. RSS counts shared pages in full, so the proportional set size (PSS)
+and private bytes (USS) show the pages shared copy-on-write with the master.
+Linux only.
+
+    python benchmarks/startup.py --workers 4 --path /api/flows
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def children(pid: int) -> List[int]:
+    pids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            pids.extend(int(p) for p in f.read().split())
+    return pids
+
+def memory(pid: int) -> Dict[str, int]:
+    """RSS, PSS and USS of a process in bytes"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+def get(url: str, timeout: float = 5.0) -> None:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        response.read()
+
+def measure(args: argparse.Namespace, preload: bool) -> None:
+    env = {**os.environ, "GUNICORN_PRELOAD": "1" if preload else "0"}
+    command = [sys.executable, "-m", "gunicorn", "--config", os.path.join(ROOT, "gunicorn.conf.py"),
+               "--workers", str(args.workers), "--bind", f"127.0.0.1:{args.port}", args.app]
+    url = f"http://127.0.0.1:{args.port}{args.path}"
+
+    started = time.perf_counter()
+    master = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first = None
+        while first is None:
+            if master.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {master.returncode}")
+            try:
+                get(url)
+                first = time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.01)
+
+        # A burst of concurrent requests reaches every worker once they have all started
+        while len(children(master.pid)) < args.workers:
+            time.sleep(0.01)
+        with ThreadPoolExecutor(args.workers * 4) as pool:
+            list(pool.map(lambda _: get(url), range(args.workers * 16)))
+        all_ready = time.perf_counter() - started
+
+        mode = "preloaded in master" if preload else "imported per worker"
+        print(f"{mode}: first request {first * 1000:.0f} ms, {args.workers} workers warm {all_ready * 1000:.0f} ms")
+        totals = {"rss": 0, "pss": 0, "uss": 0}
+        for pid in sorted(children(master.pid)):
+            usage = memory(pid)
+            for key in totals:
+                totals[key] += usage[key]
+            print(f"  worker {pid}: RSS {usage['rss'] / 2**20:.1f} MiB, PSS {usage['pss'] / 2**20:.1f} MiB, "
+                  f"USS {usage['uss'] / 2**20:.1f} MiB")
+        master_usage = memory(master.pid)
+        print(f"  master: RSS {master_usage['rss'] / 2**20:.1f} MiB; workers total PSS "
+              f"{totals['pss'] / 2**20:.1f} MiB, USS {totals['uss'] / 2**20:.1f} MiB")
+    finally:
+        master.terminate()
+        master.wait(10)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="gunicorn start-up time and worker memory")
+    parser.add_argument("--app", default="main:app")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--path", default="/api/flows", help="Cheap route used to detect readiness")
+    parser.add_argument("--port", type=int, default=15000)
+    args = parser.parse_args()
+
+    measure(args, preload=False)
+    time.sleep(1)
+    measure(args, preload=True)
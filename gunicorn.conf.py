@@ -0,0 +1,69 @@
+import os
+import gc
+
+# Read by gunicorn from the working directory; command-line flags override these
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# Requests spend almost all their time waiting on Gemini and LangFlow, so each
+# worker process serves many of them on threads; GUNICORN_WORKER_CLASS=sync
+# restores one request per process. Agents, the router and the stores are
+# shared by a worker's threads and keep no per-request state. Under gthread
+# the timeout only catches a stuck worker, not a slow request.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("GUNICORN_WORKERS", 2 if worker_class == "gthread" else 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 16 if worker_class == "gthread" else 1))
+keepalive = 5
+
+# A server-sent event stream (dashboard, pipeline and LangFlow run streams)
+# holds one of these threads for as long as its client stays connected, so
+# each worker serves at most half its threads as streams and answers 503 with
+# Retry-After beyond that; the dashboard polls until a slot frees up. With the
+# defaults that is 2 x 8 streams; sync workers serve none. Set SSE_MAX_STREAMS
+# directly when passing --threads, which this file does not see. LangFlow
+# streams scale further through langflow_proxy, which is event-driven.
+os.environ.setdefault("SSE_MAX_STREAMS", str(threads // 2))
+
+# Only one process may own the journal of an in-memory store
+journaled_memory_store = (
+    os.environ.get("MEMORY_STORE_BACKEND", "memory") == "memory" and bool(os.environ.get("MEMORY_STORE_JOURNAL_DIR"))
+)
+
+# Import the application once in the master and fork workers from it, so they
+# start without importing anything and share its memory pages copy-on-write.
+# A journaled in-memory store is started in its worker instead.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1" and not journaled_memory_store
+
+if preload_app:
+    # Collections in the master would only dirty pages the workers are about to share
+    gc.disable()
+
+def on_starting(server):
+    """Runs in the master before the application is loaded, with command-line flags applied"""
+    if journaled_memory_store and server.cfg.workers > 1:
+        # Every other worker would keep an unjournaled store and lose its data on restart
+        raise RuntimeError(
+            "MEMORY_STORE_JOURNAL_DIR needs a single worker (GUNICORN_WORKERS=1); "
+            "use MEMORY_STORE_BACKEND=sqlite to share one store between workers"
+        )
+
+def when_ready(server):
+    """Runs in the master once the application is loaded, before the first worker is forked"""
+    if not server.cfg.preload_app:
+        return
+
+    # The Gemini client is the heaviest import; load it here rather than in every worker on first use
+    from utils import gemini
+    try:
+        gemini.preload()
+    except ImportError as e:
+        server.log.warning(f"Gemini client not preloaded: {str(e)}")
+
+    # Leave everything loaded so far out of collections, which would otherwise
+    # touch, and so copy, every inherited page in each worker
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        gc.enable()
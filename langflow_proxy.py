@@ -0,0 +1,173 @@
+import os
+import asyncio
+import logging
+import argparse
+from typing import Optional
+
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector, ClientError
+
+from utils.langflow_client import (
+    LANGFLOW_URL, LANGFLOW_CONNECT_TIMEOUT, LANGFLOW_READ_TIMEOUT, LANGFLOW_POOL_SIZE,
+    LANGFLOW_MAX_LINE_BYTES, SSE_KEEPALIVE, sse_data, sse_error
+)
+
+# Streams relayed at once per process before new ones get a 503
+LANGFLOW_PROXY_MAX_STREAMS = int(os.environ.get("LANGFLOW_PROXY_MAX_STREAMS", 5000))
+
+# Bytes read from upstream at a time, and the interval of keep-alive comments on a silent stream
+LANGFLOW_PROXY_READ_BYTES = int(os.environ.get("LANGFLOW_PROXY_READ_BYTES", 64 * 1024))
+LANGFLOW_PROXY_KEEPALIVE_SECONDS = float(os.environ.get("LANGFLOW_PROXY_KEEPALIVE_SECONDS", 15))
+
+logger = logging.getLogger(__name__)
+
+class LangFlowProxy:
+    """
+    Event-driven relay of LangFlow's line-delimited streams as server-sent events.
+    Long-lived streams would each pin a Flask worker for their whole duration,
+    so they are served by this aiohttp application instead: one process relays
+    many concurrent streams over a shared keep-alive connection pool. Each
+    stream buffers at most one read from upstream, writes wait for the client
+    to drain, and a client that goes away closes its upstream request.
+    """
+
+    def __init__(self, langflow_url: str = LANGFLOW_URL, max_streams: int = LANGFLOW_PROXY_MAX_STREAMS,
+                 pool_size: int = LANGFLOW_POOL_SIZE, keepalive_seconds: float = LANGFLOW_PROXY_KEEPALIVE_SECONDS):
+        """
+        Initialize the proxy
+
+        Args:
+            langflow_url: LangFlow server
+            max_streams: Concurrent streams accepted
+            pool_size: Connections kept open to LangFlow
+            keepalive_seconds: Interval of keep-alive comments while upstream is silent
+        """
+        self.langflow_url = langflow_url.rstrip("/")
+        self.max_streams = max_streams
+        self.pool_size = pool_size
+        self.keepalive_seconds = keepalive_seconds
+
+        self.session: Optional[ClientSession] = None
+        self.active_streams = 0
+        self.streams_total = 0
+        self.streams_rejected = 0
+        self.client_disconnects = 0
+
+    async def session_context(self, app: web.Application):
+        """aiohttp cleanup context owning the pooled client session"""
+        self.session = ClientSession(
+            connector=TCPConnector(limit=self.pool_size, keepalive_timeout=30),
+            # No total timeout: streams last as long as LangFlow keeps sending
+            timeout=ClientTimeout(total=None, sock_connect=LANGFLOW_CONNECT_TIMEOUT, sock_read=LANGFLOW_READ_TIMEOUT),
+            read_bufsize=LANGFLOW_PROXY_READ_BYTES
+        )
+        yield
+        await self.session.close()
+
+    async def relay(self, request: web.Request, method: str, path: str, **kwargs) -> web.StreamResponse:
+        """Open an upstream stream and relay it line by line until either side finishes"""
+        if self.active_streams >= self.max_streams:
+            self.streams_rejected += 1
+            return web.json_response({"error": "Too many concurrent streams"}, status=503,
+                                     headers={"Retry-After": "5"})
+
+        self.active_streams += 1
+        self.streams_total += 1
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        })
+        try:
+            await response.prepare(request)
+            try:
+                async with self.session.request(method, self.langflow_url + path, **kwargs) as upstream:
+                    upstream.raise_for_status()
+                    await self._pump(upstream, response)
+            except ConnectionResetError:
+                # aiohttp's error for writing to a closed client is also a ClientError
+                raise
+            except (ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"LangFlow stream {method} {path} failed: {str(e) or type(e).__name__}")
+                await response.write(sse_error(str(e) or type(e).__name__))
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client went away; leaving the upstream context above closed LangFlow's connection
+            self.client_disconnects += 1
+        except asyncio.CancelledError:
+            self.client_disconnects += 1
+            raise
+        finally:
+            self.active_streams -= 1
+        return response
+
+    async def _pump(self, upstream, response: web.StreamResponse) -> None:
+        pending = b""
+        while True:
+            try:
+                # readany only consumes data once it has some, so timing it out loses nothing
+                async with asyncio.timeout(self.keepalive_seconds):
+                    chunk = await upstream.content.readany()
+            except asyncio.TimeoutError:
+                if upstream.content.at_eof():
+                    break
+                await response.write(SSE_KEEPALIVE)
+                continue
+            if not chunk:
+                break
+
+            *lines, pending = (pending + chunk).split(b"\n")
+            if len(pending) > LANGFLOW_MAX_LINE_BYTES:
+                raise ValueError(f"LangFlow sent a line longer than {LANGFLOW_MAX_LINE_BYTES} bytes")
+            for line in lines:
+                line = line.rstrip(b"\r")
+                if line:
+                    # Each write waits while the client's socket buffer is full
+                    await response.write(sse_data(line))
+
+        if pending.strip():
+            await response.write(sse_data(pending.rstrip(b"\r")))
+
+    async def start_run(self, request: web.Request) -> web.StreamResponse:
+        """POST /api/langflow/runs: start a LangFlow run and stream its output"""
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.json_response({"error": "Request body must be JSON"}, status=400)
+        return await self.relay(request, "POST", "/api/runs", json=payload)
+
+    async def run_events(self, request: web.Request) -> web.StreamResponse:
+        """GET /api/langflow/stream/<run_id>: stream the events of a LangFlow run"""
+        return await self.relay(request, "GET", f"/api/runs/{request.match_info['run_id']}/events")
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "langflow_url": self.langflow_url,
+            "active_streams": self.active_streams,
+            "max_streams": self.max_streams,
+            "streams_total": self.streams_total,
+            "streams_rejected": self.streams_rejected,
+            "client_disconnects": self.client_disconnects
+        })
+
+def create_app(langflow_url: str = LANGFLOW_URL, **kwargs) -> web.Application:
+    """Build the proxy application; keyword arguments go to LangFlowProxy"""
+    proxy = LangFlowProxy(langflow_url, **kwargs)
+    app = web.Application()
+    app.cleanup_ctx.append(proxy.session_context)
+    app.router.add_post("/api/langflow/runs", proxy.start_run)
+    app.router.add_get("/api/langflow/stream/{run_id}", proxy.run_events)
+    app.router.add_get("/api/langflow/proxy/stats", proxy.stats)
+    return app
+
+# gunicorn langflow_proxy:app --worker-class aiohttp.GunicornWebWorker --bind 0.0.0.0:5001
+app = create_app()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relay LangFlow streams as server-sent events")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--langflow-url", default=LANGFLOW_URL)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(create_app(args.langflow_url), host=args.host, port=args.port)
@@ -1,24 +1,74 @@
+import gc
+import os
+import time
 import uuid
+import json
+import atexit
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Iterator, Tuple
 from datetime import datetime
 
+from utils.blob_store import BlobStore, BlobCollector, summarize_json
+from utils.store_backends import StoreBackend, InMemoryBackend, create_backend
+from utils.store_journal import (
+    StoreJournal, OP_PUT_CLASSIFICATION, OP_TRACE_LOG, OP_AGENT_STATE,
+    OP_COUNTERS, OP_PRUNE_COUNTERS, OP_CLEAR
+)
+from utils.record_index import MAX_PAGE_SIZE, clean_filters
+from utils.store_metrics import metric_increments, rollup_cutoffs, summarize
+from utils.retention import RetentionPolicy, RetentionSweeper
+from utils.records import TraceEntry
+from utils.json_codec import EncodedJSON
+
+# Fields whose values can be arbitrarily large and are moved out to the blob store
+OFFLOADED_FIELDS = ("parsed_content",)
+INLINE_PAYLOAD_LIMIT = int(os.environ.get("INLINE_PAYLOAD_LIMIT", 4096))
+
+# Journal directory for the in-memory backend; unset disables journaling
+JOURNAL_DIR = os.environ.get("MEMORY_STORE_JOURNAL_DIR")
+
 class MemoryStore:
     """
-    In-memory storage for classification results and system state.
-    Acts as a simple key-value store for the multi-agent system.
+    Storage for classification results and system state.
+    Acts as a simple key-value store for the multi-agent system; the data
+    itself lives in a pluggable StoreBackend (in-process or shared SQLite).
+    Safe to use from request threads and background threads at the same time;
+    stored records are treated as immutable once written.
     """
     
-    def __init__(self):
+    def __init__(self, blob_store: Optional[BlobStore] = None, inline_limit: int = INLINE_PAYLOAD_LIMIT,
+                 backend: Optional[StoreBackend] = None, retention: Optional[RetentionPolicy] = None,
+                 journal: Optional[StoreJournal] = None):
         """Initialize the memory store"""
         self.logger = logging.getLogger(__name__)
+        self.blob_store = blob_store or BlobStore()
+        self.inline_limit = inline_limit
+        
+        # Classification results, trace logs and agent states
+        self.retention = retention or RetentionPolicy()
+        self.backend = backend or create_backend(policy=self.retention)
+        self.sweeper = RetentionSweeper(self.backend, self.retention)
+        
+        # Blobs are content-addressed and may be shared, so they are collected by lease rather than on eviction
+        self.blob_collector = BlobCollector(self.blob_store, self.backend.referenced_blobs)
+        self._pruned_minute = None
+        
+        # Called after every trace log write, e.g. to wake the dashboard feed
+        self.trace_listeners: List[Callable[[], None]] = []
         
-        # Main storage dictionaries
-        self.classifications = {}  # Classification results
-        self.trace_logs = []       # System trace logs
-        self.agent_states = {}     # Agent state information
+        # The SQLite backend is durable on its own; the journal makes the in-memory one survive restarts
+        self.journal = journal
+        if self.journal is None and JOURNAL_DIR and isinstance(self.backend, InMemoryBackend):
+            try:
+                self.journal = StoreJournal(JOURNAL_DIR)
+            except RuntimeError as e:
+                # Another worker owns the journal; this process keeps an unjournaled store
+                self.logger.warning(str(e))
+        if self.journal:
+            self._restore_from_journal()
+            atexit.register(self.journal.close)
         
-        self.logger.info("Memory store initialized")
+        self.logger.info(f"Memory store initialized with {type(self.backend).__name__}")
     
     def store_classification(self, classification_result: Dict[str, Any]) -> str:
         """
@@ -40,7 +90,19 @@ class MemoryStore:
             **classification_result
         }
         
-        self.classifications[result_id] = storage_entry
+        # Keep only handles and summaries for large payloads
+        self._offload_payloads(storage_entry)
+        if isinstance(storage_entry.get("specialized_analysis"), dict):
+            storage_entry["specialized_analysis"] = dict(storage_entry["specialized_analysis"])
+            self._offload_payloads(storage_entry["specialized_analysis"])
+        
+        self._apply(OP_PUT_CLASSIFICATION, (result_id, storage_entry))
+        self._update_statistics(storage_entry)
+        
+        self.sweeper.start()
+        self.blob_collector.start()
+        if self.backend.is_over_limit(self.retention):
+            self.sweeper.wake()
         
         # Log the storage action
         self._add_trace_log("classification_stored", {
@@ -63,7 +125,7 @@ class MemoryStore:
         Returns:
             Classification result or None if not found
         """
-        result = self.classifications.get(result_id)
+        result = self.backend.get_classification(result_id)
         
         if result:
             self.logger.debug(f"Retrieved classification: {result_id}")
@@ -72,23 +134,123 @@ class MemoryStore:
         
         return result
     
+    def get_encoded_classification(self, result_id: str) -> Optional[EncodedJSON]:
+        """
+        Retrieve a classification result as the JSON bytes encoded when it was stored
+        
+        Args:
+            result_id: The ID of the classification result
+            
+        Returns:
+            Encoded result with its entity tag, or None if not found
+        """
+        return self.backend.get_encoded_classification(result_id)
+    
+    def get_payload_ref(self, result_id: str, field: str = "parsed_content") -> Optional[Dict[str, Any]]:
+        """
+        Find the blob handle for an offloaded payload of a stored result
+        
+        Args:
+            result_id: The ID of the classification result
+            field: Name of the offloaded field
+            
+        Returns:
+            Blob handle or None if the field was not offloaded
+        """
+        result = self.backend.get_classification(result_id)
+        if not result:
+            return None
+        
+        for container in (result, result.get("specialized_analysis") or {}):
+            ref = container.get(f"{field}_ref")
+            if ref:
+                return ref
+        
+        return None
+    
+    def _offload_payloads(self, entry: Dict[str, Any]) -> None:
+        """Move large payload fields of an entry into the blob store"""
+        for field in OFFLOADED_FIELDS:
+            if field not in entry:
+                continue
+            
+            value = entry[field]
+            encoded = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+            if len(encoded) <= self.inline_limit:
+                continue
+            
+            handle = self.blob_store.put(encoded, content_type="application/json")
+            entry[f"{field}_ref"] = {
+                **handle,
+                "summary": summarize_json(value)
+            }
+            del entry[field]
+            
+            self.logger.debug(f"Offloaded {field} to blob {handle['blob_id']}")
+    
     def get_all_classifications(self) -> Dict[str, Any]:
         """Get all stored classification results"""
         return {
-            "total_count": len(self.classifications),
-            "classifications": list(self.classifications.values())
+            "total_count": self.backend.count_classifications(),
+            "classifications": self.backend.list_classifications()
+        }
+
+    def query_classifications(self, filters: Optional[Dict[str, Any]] = None, fields: Optional[List[str]] = None,
+                              cursor: Optional[int] = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        Query stored classification results through the secondary indexes
+
+        Args:
+            filters: document_format, business_intent, filename, min_confidence,
+                max_confidence, since and until (ISO timestamps); unknown keys are ignored
+            fields: Top-level fields to return; all fields if empty
+            cursor: next_cursor from the previous page
+            limit: Page size, capped at MAX_PAGE_SIZE
+
+        Returns:
+            One page of results, newest first, and the cursor for the next page
+
+        Raises:
+            ValueError: If since or until is not an ISO timestamp
+        """
+        filters = clean_filters(filters)
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        records, next_cursor = self.backend.query_classifications(filters, fields, cursor, limit)
+        return {
+            "classifications": records,
+            "count": len(records),
+            "next_cursor": next_cursor
+        }
+    
+    def query_encoded_classifications(self, filters: Optional[Dict[str, Any]] = None, cursor: Optional[int] = None,
+                                      limit: int = 50) -> Dict[str, Any]:
+        """
+        Query stored classification results as their encoded JSON bytes
+        
+        Args:
+            filters: Same filters as query_classifications
+            cursor: next_cursor from the previous page
+            limit: Page size, capped at MAX_PAGE_SIZE
+            
+        Returns:
+            Encoded results and the next cursor (None on the last page)
+        """
+        filters = clean_filters(filters)
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        
+        records, next_cursor = self.backend.query_encoded_classifications(filters, cursor, limit)
+        return {
+            "classifications": records,
+            "count": len(records),
+            "next_cursor": next_cursor
         }
     
     def _add_trace_log(self, action: str, details: Dict[str, Any]):
         """Add an entry to the trace log"""
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "action": action,
-            "details": details,
-            "log_id": str(uuid.uuid4())
-        }
-        
-        self.trace_logs.append(log_entry)
+        self._apply(OP_TRACE_LOG, TraceEntry(action, details))
+        for listener in self.trace_listeners:
+            listener()
         self.logger.debug(f"Trace log added: {action}")
     
     def get_trace_logs(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -101,12 +263,26 @@ class MemoryStore:
         Returns:
             List of trace log entries
         """
-        logs = sorted(self.trace_logs, key=lambda x: x["timestamp"], reverse=True)
+        return self.backend.list_trace_logs(limit)
+    
+    def get_trace_logs_since(self, cursor: int, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get trace logs newer than a cursor, for incremental polling
         
-        if limit:
-            logs = logs[:limit]
+        Args:
+            cursor: Last sequence number the caller has seen (0 for everything)
+            limit: Maximum number of logs to return
+            
+        Returns:
+            Logs oldest first, the cursor to pass next time, and whether older entries were dropped
+        """
+        logs, next_cursor, truncated = self.backend.trace_logs_since(cursor, limit)
         
-        return logs
+        return {
+            "logs": logs,
+            "next_cursor": next_cursor,
+            "truncated": truncated
+        }
     
     def store_agent_state(self, agent_name: str, state: Dict[str, Any]) -> None:
         """
@@ -116,11 +292,11 @@ class MemoryStore:
             agent_name: Name of the agent
             state: State information to store
         """
-        self.agent_states[agent_name] = {
+        self._apply(OP_AGENT_STATE, (agent_name, {
             "agent_name": agent_name,
             "state": state,
             "updated_at": datetime.now().isoformat()
-        }
+        }))
         
         self._add_trace_log("agent_state_updated", {
             "agent_name": agent_name,
@@ -139,21 +315,151 @@ class MemoryStore:
         Returns:
             Agent state or None if not found
         """
-        return self.agent_states.get(agent_name)
+        return self.backend.get_agent_state(agent_name)
     
     def clear_memory(self) -> None:
         """Clear all stored data"""
-        self.classifications.clear()
-        self.trace_logs.clear()
-        self.agent_states.clear()
+        self._apply(OP_CLEAR, None)
         
         self.logger.info("Memory store cleared")
     
+    def _update_statistics(self, entry: Dict[str, Any]) -> None:
+        """Update counters and per-minute/hour rollups for a newly stored result"""
+        now = datetime.now()
+        self._apply(OP_COUNTERS, metric_increments(entry, now))
+        
+        # Expired rollup buckets are dropped at most once a minute
+        minute = now.replace(second=0, microsecond=0)
+        if minute != self._pruned_minute:
+            self._pruned_minute = minute
+            self._apply(OP_PRUNE_COUNTERS, rollup_cutoffs(now))
+    
+    def _apply(self, op: int, payload: Any) -> None:
+        """Apply a mutation to the backend and record it in the journal, if any"""
+        if self.journal is None:
+            self._apply_to_backend(op, payload)
+            return
+        
+        gate = self.journal.gate
+        gate.acquire_shared()
+        try:
+            self._apply_to_backend(op, payload)
+            self.journal.append(op, payload.to_tuple() if op == OP_TRACE_LOG else payload)
+        finally:
+            gate.release_shared()
+    
+    def _apply_to_backend(self, op: int, payload: Any) -> None:
+        if op == OP_PUT_CLASSIFICATION:
+            self.backend.put_classification(*payload)
+        elif op == OP_TRACE_LOG:
+            if isinstance(payload, tuple):
+                payload = TraceEntry.from_tuple(payload)
+            elif isinstance(payload, dict):
+                # Journals written before trace entries were compacted hold the JSON shape
+                payload = TraceEntry.from_dict(payload)
+            self.backend.append_trace_log(payload)
+        elif op == OP_AGENT_STATE:
+            self.backend.put_agent_state(*payload)
+        elif op == OP_COUNTERS:
+            self.backend.increment_counters(payload)
+        elif op == OP_PRUNE_COUNTERS:
+            self.backend.prune_counters(payload)
+        elif op == OP_CLEAR:
+            self.backend.clear()
+    
+    def _restore_from_journal(self) -> None:
+        """Rebuild the backend from the last snapshot and the journal tail"""
+        started = time.perf_counter()
+        count = 0
+        
+        # Restore allocates only long-lived objects, so cyclic GC passes would be wasted work
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for op, payload in self.journal.restore():
+                self._apply_to_backend(op, payload)
+                count += 1
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        
+        self.journal.snapshot_source = self._snapshot_records
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.logger.info(f"Memory store restored {count} journal records in {elapsed_ms:.1f} ms")
+        
+        # Anything restored beyond the retention limits goes right away
+        if self.retention.enabled:
+            self.sweeper.sweep()
+        
+        # Restored records renew the leases of their blobs, which may have run out while the store was down
+        self.blob_store.touch(self.backend.referenced_blobs())
+        self.blob_collector.start()
+    
+    def _snapshot_records(self) -> Iterator[Tuple[int, Any]]:
+        """
+        Current state as journal records. References to the stored objects are
+        taken now, while writes are paused; records are decoded as they are iterated.
+        """
+        classifications, trace_entries, agent_states, counters = self.backend.snapshot_state()
+        
+        def records():
+            for record in classifications:
+                entry = record if isinstance(record, dict) else record.to_dict()
+                yield OP_PUT_CLASSIFICATION, (entry["id"], entry)
+            for entry in trace_entries:
+                yield OP_TRACE_LOG, entry.to_tuple()
+            for item in agent_states:
+                yield OP_AGENT_STATE, item
+            yield OP_COUNTERS, counters
+        
+        return records()
+    
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """Compact the journal into a fresh snapshot now; None when journaling is off"""
+        if self.journal is None:
+            return None
+        return self.journal.snapshot(self._snapshot_records)
+    
+    def get_analytics(self, minutes: int = 60, hours: int = 24, window_minutes: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Precomputed document analytics for the dashboard
+        
+        Args:
+            minutes: Number of per-minute buckets to include
+            hours: Number of per-hour buckets to include
+            window_minutes: If set, also summarize the last this many minutes under "window"
+            
+        Returns:
+            Totals by format and intent, escalations by type, fallback rate,
+            confidence histogram, stage latency percentiles and rollup series
+        """
+        return summarize(self.backend.get_counters(), minutes=minutes, hours=hours, window_minutes=window_minutes)
+    
+    def version(self, collection: str = "classifications") -> int:
+        """
+        Current version of a collection ("classifications" or "trace_logs")
+        
+        Returns:
+            A number that changes on every write to the collection and is never reused
+        """
+        return self.backend.version(collection)
+    
+    def get_memory_usage(self) -> Dict[str, Any]:
+        """Record counts and approximate resident bytes per collection, with retention status"""
+        usage = self.backend.memory_usage()
+        return {
+            "backend": type(self.backend).__name__,
+            "collections": usage,
+            "total_bytes": sum(c["bytes"] or 0 for name, c in usage.items() if name != "database_file"),
+            "retention": self.sweeper.get_stats(),
+            "blobs": self.blob_collector.get_stats()
+        }
+    
     def get_statistics(self) -> Dict[str, Any]:
         """Get memory store statistics"""
         return {
-            "total_classifications": len(self.classifications),
-            "total_trace_logs": len(self.trace_logs),
-            "total_agent_states": len(self.agent_states),
+            "total_classifications": self.backend.count_classifications(),
+            "total_trace_logs": self.backend.count_trace_logs(),
+            "total_agent_states": self.backend.count_agent_states(),
             "memory_store_status": "active"
         }
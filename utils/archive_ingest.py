@@ -0,0 +1,128 @@
+import os
+import tarfile
+import zipfile
+import logging
+from typing import Callable, Iterator, List, Dict, Any, IO
+
+from werkzeug.utils import secure_filename
+
+from utils.document_ingest import DocumentTooLarge, IngestedDocument, ingest_stream
+
+# Limits for one bulk upload, guarding against archive bombs
+BULK_MAX_FILES = int(os.environ.get("BULK_MAX_FILES", 5000))
+BULK_MAX_TOTAL_BYTES = int(os.environ.get("BULK_MAX_TOTAL_BYTES", 256 * 1024 * 1024))
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+logger = logging.getLogger(__name__)
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+class BulkExtractor:
+    """
+    Pulls documents out of uploaded files and archives one entry at a time.
+    Archive members are read straight from the upload stream, never unpacked
+    to disk; entries with disallowed extensions are skipped, and the file
+    count and total size are capped for the whole upload.
+    """
+
+    def __init__(self, allowed: Callable[[str], bool], max_files: int = BULK_MAX_FILES,
+                 max_total_bytes: int = BULK_MAX_TOTAL_BYTES, max_file_bytes: int = 16 * 1024 * 1024):
+        """
+        Initialize the extractor
+
+        Args:
+            allowed: Predicate on a filename deciding whether it is ingested
+            max_files: Documents accepted per upload
+            max_total_bytes: Total document bytes accepted per upload
+            max_file_bytes: Largest single document accepted
+        """
+        self.allowed = allowed
+        self.max_files = max_files
+        self.max_total_bytes = max_total_bytes
+        self.max_file_bytes = max_file_bytes
+
+        self.accepted = 0
+        self.total_bytes = 0
+        self.skipped: List[Dict[str, Any]] = []
+        self._seen: Dict[str, str] = {}
+
+    def _skip(self, name: str, reason: str) -> None:
+        self.skipped.append({"filename": name, "reason": reason})
+
+    def _budget_left(self, name: str) -> bool:
+        if self.accepted >= self.max_files:
+            self._skip(name, f"more than {self.max_files} files")
+            return False
+        if self.total_bytes >= self.max_total_bytes:
+            self._skip(name, f"more than {self.max_total_bytes} bytes in total")
+            return False
+        return True
+
+    def _take(self, name: str, stream: IO[bytes], declared_size: int = -1) -> Iterator[IngestedDocument]:
+        """Read one entry within the limits; declared sizes from archive headers are not trusted alone"""
+        filename = secure_filename(os.path.basename(name))
+        if not filename or not self.allowed(filename):
+            self._skip(name, "file type not allowed")
+            return
+        if not self._budget_left(name):
+            return
+        if declared_size > self.max_file_bytes:
+            self._skip(name, f"larger than {self.max_file_bytes} bytes")
+            return
+
+        try:
+            document = ingest_stream(stream, filename, self.max_file_bytes)
+        except DocumentTooLarge:
+            self._skip(name, f"larger than {self.max_file_bytes} bytes")
+            return
+        if document.sha256 in self._seen:
+            self._skip(name, f"duplicate of {self._seen[document.sha256]}")
+            return
+
+        self._seen[document.sha256] = name
+        self.accepted += 1
+        self.total_bytes += document.size
+        yield document
+
+    def extract(self, filename: str, stream: IO[bytes]) -> Iterator[IngestedDocument]:
+        """
+        Documents contained in one uploaded file
+
+        Args:
+            filename: Name the file was uploaded under
+            stream: Upload stream; zip archives need it to be seekable
+
+        Yields:
+            Every accepted document, under its sanitized filename; repeats of a document are skipped
+        """
+        lower = filename.lower()
+        try:
+            if lower.endswith('.zip'):
+                yield from self._extract_zip(stream)
+            elif is_archive(lower):
+                yield from self._extract_tar(stream)
+            else:
+                yield from self._take(filename, stream)
+        except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+            logger.warning(f"Unreadable archive {filename}: {str(e)}")
+            self._skip(filename, f"unreadable archive: {str(e)}")
+
+    def _extract_zip(self, stream: IO[bytes]) -> Iterator[IngestedDocument]:
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as member:
+                    yield from self._take(info.filename, member, info.file_size)
+
+    def _extract_tar(self, stream: IO[bytes]) -> Iterator[IngestedDocument]:
+        # Stream mode reads members in order without seeking
+        with tarfile.open(fileobj=stream, mode='r|*') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                fileobj = archive.extractfile(member)
+                if fileobj is not None:
+                    yield from self._take(member.name, fileobj, member.size)
@@ -0,0 +1,198 @@
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Dict, Any, Optional, Iterator, Iterable, Callable
+
+BLOB_DIR = 'data/blobs'
+
+# Seconds between blob collection passes; 0 never deletes blobs
+BLOB_GC_INTERVAL = float(os.environ.get("BLOB_GC_INTERVAL", 600))
+
+class BlobStore:
+    """
+    Content-addressed blob storage on local disk.
+    Large payloads are written once under their SHA-256 digest and read back lazily.
+    A blob's modification time is its lease: storing the same content again or
+    touching it renews the lease, and sweep() deletes blobs whose lease ran out.
+    """
+
+    def __init__(self, root: str = BLOB_DIR):
+        """Initialize the blob store"""
+        self.logger = logging.getLogger(__name__)
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, data: bytes, content_type: str = "application/octet-stream") -> Dict[str, Any]:
+        """
+        Store raw bytes and return a handle describing them
+
+        Args:
+            data: The bytes to store
+            content_type: MIME type recorded in the handle
+
+        Returns:
+            Handle with blob_id, size_bytes and content_type
+        """
+        blob_id = hashlib.sha256(data).hexdigest()
+        path = self._path(blob_id)
+
+        # Identical content is already on disk, nothing to write but a renewed lease
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.logger.debug(f"Blob stored: {blob_id} ({len(data)} bytes)")
+
+        return {
+            "blob_id": blob_id,
+            "size_bytes": len(data),
+            "content_type": content_type
+        }
+
+    def exists(self, blob_id: str) -> bool:
+        """Check whether a blob is present"""
+        return os.path.exists(self._path(blob_id))
+
+    def get_bytes(self, blob_id: str) -> Optional[bytes]:
+        """Read a blob fully into memory, or None if missing"""
+        try:
+            with open(self._path(blob_id), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            self.logger.warning(f"Blob not found: {blob_id}")
+            return None
+
+    def iter_chunks(self, blob_id: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Stream a blob from disk in fixed-size chunks"""
+        with open(self._path(blob_id), 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def touch(self, blob_ids: Iterable[str]) -> int:
+        """Renew the lease of blobs that are still referenced; returns how many were present"""
+        touched = 0
+        for blob_id in blob_ids:
+            try:
+                os.utime(self._path(blob_id))
+                touched += 1
+            except FileNotFoundError:
+                pass
+        return touched
+
+    def sweep(self, cutoff: float) -> int:
+        """Delete blobs (and abandoned temporary files) last renewed before a time; returns how many"""
+        removed = 0
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    # Checked right before the unlink, so a lease renewed during the scan is kept
+                    if os.stat(entry.path).st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def _path(self, blob_id: str) -> str:
+        """Shard blobs into subdirectories by digest prefix"""
+        if len(blob_id) != 64 or any(c not in '0123456789abcdef' for c in blob_id):
+            raise ValueError(f"Invalid blob id: {blob_id}")
+        return os.path.join(self.root, blob_id[:2], blob_id[2:])
+
+class BlobCollector:
+    """
+    Background mark-and-sweep over a blob store shared by several processes.
+    Each pass renews the lease of every blob the local store still references
+    and deletes blobs nobody has renewed for three intervals, so a blob goes
+    once the last record referencing it, in any process, has been evicted or
+    cleared. Every process sharing the blob directory must run a collector
+    with the same interval, or none of them may.
+    """
+
+    def __init__(self, blob_store: BlobStore, live_blobs: Callable[[], Iterable[str]],
+                 interval: float = BLOB_GC_INTERVAL):
+        """
+        Initialize the collector
+
+        Args:
+            blob_store: Blob store to collect
+            live_blobs: Returns the IDs of blobs the local store references
+            interval: Seconds between passes; 0 disables collection
+        """
+        self.logger = logging.getLogger(__name__)
+        self.blob_store = blob_store
+        self.live_blobs = live_blobs
+        self.interval = interval
+
+        self.runs = 0
+        self.removed_total = 0
+        self.last_run: Optional[float] = None
+
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the collector in this process (threads do not survive fork)"""
+        if self._pid == os.getpid() or not self.interval:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name="blob-collector", daemon=True).start()
+            self._pid = os.getpid()
+
+    def collect(self) -> int:
+        """Renew live blobs and delete expired ones once; returns the number deleted"""
+        now = time.time()
+        self.blob_store.touch(set(self.live_blobs()))
+        removed = self.blob_store.sweep(now - 3 * self.interval)
+        self.runs += 1
+        self.removed_total += removed
+        self.last_run = now
+        if removed:
+            self.logger.info(f"Deleted {removed} unreferenced blobs")
+        return removed
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.collect()
+            except Exception as e:
+                self.logger.error(f"Blob collection failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "passes": self.runs,
+            "deleted_total": self.removed_total,
+            "last_pass": self.last_run
+        }
+
+def summarize_json(obj: Any, max_keys: int = 20) -> Dict[str, Any]:
+    """Build a compact, bounded summary of a parsed JSON value"""
+    summary = {"json_type": type(obj).__name__}
+
+    if isinstance(obj, dict):
+        summary["key_count"] = len(obj)
+        summary["keys"] = list(obj.keys())[:max_keys]
+    elif isinstance(obj, list):
+        summary["item_count"] = len(obj)
+        if obj and isinstance(obj[0], dict):
+            summary["item_keys"] = list(obj[0].keys())[:max_keys]
+    else:
+        summary["value_preview"] = str(obj)[:200]
+
+    return summary
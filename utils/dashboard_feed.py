@@ -0,0 +1,195 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from itertools import islice
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from utils.json_codec import encode_json
+
+# How often the store is checked for changes made by other processes, and frames kept for reconnecting clients
+DASHBOARD_POLL_SECONDS = float(os.environ.get("DASHBOARD_POLL_SECONDS", 1.0))
+DASHBOARD_FEED_HISTORY = int(os.environ.get("DASHBOARD_FEED_HISTORY", 512))
+
+# Trace logs carried by the snapshot a new subscriber starts from, and read from the store per poll
+DASHBOARD_SNAPSHOT_LOGS = 10
+DASHBOARD_POLL_BATCH = 500
+
+SSE_KEEPALIVE = b": keep-alive\n\n"
+
+# Analytics fields the dashboard shows
+DASHBOARD_ANALYTICS = ("by_format", "by_intent", "escalations_by_type", "fallback_rate", "stage_latency_ms")
+
+class DashboardFeed:
+    """
+    Fan-out of trace log entries and statistics to dashboard subscribers.
+    One publisher thread per process notices store changes, reads the new
+    trace log entries once and recomputes the statistics once, then encodes
+    every event as a server-sent event a single time. Subscribers share those
+    bytes: serving a client is a slice of the frame history and a write.
+    Statistics events carry only the fields that changed since the last one.
+    """
+
+    def __init__(self, memory_store, poll_seconds: float = DASHBOARD_POLL_SECONDS,
+                 history: int = DASHBOARD_FEED_HISTORY):
+        """
+        Initialize the feed
+
+        Args:
+            memory_store: MemoryStore to follow
+            poll_seconds: Seconds between change checks when not woken by a local write
+            history: Frames kept for clients reconnecting with Last-Event-ID
+        """
+        self.logger = logging.getLogger(__name__)
+        self.memory_store = memory_store
+        self.poll_seconds = poll_seconds
+
+        # Event IDs are "<epoch>-<n>", so an ID issued by another process or an earlier run is never resumed from
+        self._epoch = str(time.time_ns())
+        self._frames: "deque[bytes]" = deque(maxlen=history)
+        self._last_id = 0
+        self._snapshot = b""
+        self._cond = threading.Condition()
+
+        self._versions: Optional[Tuple[int, int]] = None
+        self._log_cursor = 0
+        self._recent_logs: "deque[Dict[str, Any]]" = deque(maxlen=DASHBOARD_SNAPSHOT_LOGS)
+        self._stats: Dict[str, Any] = {}
+
+        self.subscribers = 0
+        self.events_published = 0
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start publishing in this process (threads do not survive fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            # The first subscriber needs a snapshot before the thread gets to run
+            self.poll()
+            threading.Thread(target=self._run, name="dashboard-feed", daemon=True).start()
+            self._pid = os.getpid()
+
+    def wake(self) -> None:
+        """Ask for a poll without waiting for the interval; called on every local trace log write"""
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+            if not self.subscribers:
+                continue
+            try:
+                self.poll()
+            except Exception as e:
+                self.logger.error(f"Dashboard feed poll failed: {str(e)}")
+
+    def _frame(self, event: str, data: Any) -> bytes:
+        """Encode one event under the next ID; caller holds the condition"""
+        self._last_id += 1
+        return b"id: %s-%d\nevent: %s\ndata: %s\n\n" % (
+            self._epoch.encode(), self._last_id, event.encode(), encode_json(data))
+
+    def poll(self) -> None:
+        """Publish the trace log entries and statistics changes since the last poll"""
+        with self._poll_lock:
+            self._poll()
+
+    def _poll(self) -> None:
+        store = self.memory_store
+        versions = (store.version("trace_logs"), store.version("classifications"))
+        if versions == self._versions:
+            return
+
+        first = self._versions is None
+        if first:
+            logs = list(reversed(store.get_trace_logs(limit=DASHBOARD_SNAPSHOT_LOGS)))
+            self._log_cursor = logs[-1]["seq"] if logs else 0
+            self._recent_logs.extend(logs)
+            logs = []
+        else:
+            page = store.get_trace_logs_since(self._log_cursor, limit=DASHBOARD_POLL_BATCH)
+            logs = page["logs"]
+            self._log_cursor = page["next_cursor"]
+            self._recent_logs.extend(logs)
+            if len(logs) == DASHBOARD_POLL_BATCH:
+                # More to read; leave the versions unset so the next poll carries on
+                self._wakeup.set()
+                versions = (None, None)
+        self._versions = versions
+
+        analytics = store.get_analytics(minutes=1, hours=1)
+        stats = {**store.get_statistics(), **{key: analytics[key] for key in DASHBOARD_ANALYTICS}}
+        changed = {key: value for key, value in stats.items() if self._stats.get(key) != value}
+        self._stats = stats
+
+        with self._cond:
+            for log in logs:
+                self._frames.append(self._frame("log", log))
+            if changed and not first:
+                self._frames.append(self._frame("stats", changed))
+            self.events_published += len(logs) + bool(changed and not first)
+            # Snapshots are not part of the history: they go out under the ID of the frame they follow
+            self._snapshot = b"id: %s-%d\nevent: snapshot\ndata: %s\n\n" % (
+                self._epoch.encode(), self._last_id,
+                encode_json({"stats": stats, "logs": list(self._recent_logs), "cursor": self._log_cursor}))
+            self._cond.notify_all()
+
+    def _parse_id(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Frame number of an event ID issued by this feed, or None"""
+        epoch, _, number = (last_event_id or "").partition("-")
+        if epoch != self._epoch or not number.isdigit():
+            return None
+        return int(number)
+
+    def _read(self, after: Optional[int]) -> Tuple[bytes, int]:
+        """Frames after a frame number, or the snapshot if they are no longer all kept; caller holds the condition"""
+        first = self._last_id - len(self._frames) + 1
+        if after is None or after < first - 1 or after > self._last_id:
+            return self._snapshot, self._last_id
+        return b"".join(islice(self._frames, after - first + 1, None)), self._last_id
+
+    def subscribe(self, last_event_id: Optional[str] = None, keepalive: float = 15) -> Iterator[bytes]:
+        """
+        Server-sent events for one dashboard client
+
+        Args:
+            last_event_id: Last-Event-ID of a reconnecting client
+            keepalive: Seconds of silence before a keep-alive comment is sent
+
+        Yields:
+            A snapshot of the statistics and recent logs (unless resuming), then new events as they are published
+        """
+        self.start()
+        if not self.subscribers:
+            # The publisher skips polls while nobody is listening, so the snapshot may be behind
+            self.poll()
+        with self._cond:
+            self.subscribers += 1
+            chunk, after = self._read(self._parse_id(last_event_id))
+        try:
+            if chunk:
+                yield chunk
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._last_id > after, keepalive)
+                    chunk, after = self._read(after)
+                yield chunk or SSE_KEEPALIVE
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": self.subscribers,
+            "events_published": self.events_published,
+            "log_cursor": self._log_cursor
+        }
@@ -0,0 +1,158 @@
+import codecs
+import hashlib
+from typing import IO, NamedTuple, Optional
+
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
+# Bytes read from the upload stream per step, and bytes inspected to sniff the format
+INGEST_CHUNK_BYTES = 64 * 1024
+SNIFF_BYTES = 4096
+CHARSET_DETECT_MIN_BYTES = 256
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+_EMAIL_HEADERS = (b"from:", b"to:", b"subject:", b"received:", b"return-path:", b"mime-version:",
+                  b"message-id:", b"date:", b"delivered-to:")
+
+class DocumentTooLarge(ValueError):
+    """Raised when a document exceeds the size it is allowed to have"""
+
+class IngestedDocument(NamedTuple):
+    """An uploaded document read into memory once, with what was learned while reading it"""
+    filename: str
+    data: memoryview
+    sha256: str
+    sniffed_format: str
+    charset: Optional[str]
+    decoded: Optional[str]
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def text(self) -> str:
+        """Content as the agents take it: decoded text, or the bytes' repr for binary files such as PDFs"""
+        if self.decoded is not None:
+            return self.decoded
+        if self.charset:
+            return str(self.data, self.charset, "replace")
+        return str(self.data.tobytes())
+
+    def describe(self) -> dict:
+        return {"filename": self.filename, "size": self.size, "sha256": self.sha256,
+                "sniffed_format": self.sniffed_format, "charset": self.charset}
+
+def ingest_stream(stream: IO[bytes], filename: str, max_bytes: Optional[int] = None) -> IngestedDocument:
+    """
+    Read a document stream once, hashing it and decoding it as UTF-8 on the way
+
+    Args:
+        stream: Binary stream positioned at the start of the document
+        filename: Name the document was uploaded under
+        max_bytes: Largest size accepted
+
+    Returns:
+        The ingested document
+
+    Raises:
+        DocumentTooLarge: If the stream holds more than max_bytes
+    """
+    buffer = bytearray()
+    hasher = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parts = []
+
+    while True:
+        chunk = stream.read(INGEST_CHUNK_BYTES)
+        if not chunk:
+            break
+        buffer += chunk
+        if max_bytes is not None and len(buffer) > max_bytes:
+            raise DocumentTooLarge(f"{filename} is larger than {max_bytes} bytes")
+        hasher.update(chunk)
+        if parts is not None:
+            try:
+                parts.append(decoder.decode(chunk))
+            except UnicodeDecodeError:
+                parts = None
+
+    return _finish(filename, buffer, hasher.hexdigest(), parts, decoder)
+
+def _finish(filename: str, data, sha256: str, parts, decoder) -> IngestedDocument:
+    view = memoryview(data)
+    head = bytes(view[:SNIFF_BYTES])
+
+    decoded = None
+    if parts is not None:
+        try:
+            parts.append(decoder.decode(b"", final=True))
+            decoded = "".join(parts)
+        except UnicodeDecodeError:
+            pass
+
+    sniffed = sniff_format(head)
+    if decoded is not None:
+        charset = "utf-8"
+        if decoded.startswith("\ufeff"):
+            decoded = decoded[1:]
+            charset = "utf-8-sig"
+    else:
+        charset = detect_charset(head, sniffed)
+
+    return IngestedDocument(filename, view, sha256, sniffed, charset, decoded)
+
+def sniff_format(head: bytes) -> str:
+    """
+    Guess a document's format from its first bytes
+
+    Returns:
+        One of "pdf", "msg", "json", "email", "text" or "binary"
+    """
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        # OLE compound file, the container Outlook .msg files use
+        return "msg"
+
+    if head.startswith(codecs.BOM_UTF8):
+        head = head[len(codecs.BOM_UTF8):]
+    elif head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "text"
+    if b"\x00" in head:
+        return "binary"
+
+    stripped = head.lstrip()
+    if stripped[:1] in (b"{", b"["):
+        return "json"
+    first_line = stripped.split(b"\n", 1)[0].lower()
+    if first_line.startswith(_EMAIL_HEADERS):
+        return "email"
+    return "text"
+
+def detect_charset(head: bytes, sniffed_format: str) -> Optional[str]:
+    """Charset of a document that is not valid UTF-8, or None if it is binary"""
+    for bom, charset in _BOMS:
+        if head.startswith(bom):
+            return charset
+    if sniffed_format in ("pdf", "msg", "binary"):
+        return None
+    # Detection needs some text to go on; short documents are most likely Windows-1252
+    if charset_normalizer is not None and len(head) >= CHARSET_DETECT_MIN_BYTES:
+        match = charset_normalizer.from_bytes(head).best()
+        if match is not None:
+            return match.encoding
+    try:
+        head.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        # Every byte sequence decodes as Latin-1
+        return "latin-1"
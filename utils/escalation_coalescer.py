@@ -0,0 +1,192 @@
+import os
+import math
+import atexit
+import time
+import uuid
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+CoalesceKey = Tuple[str, str, str]
+
+class EscalationCoalescer:
+    """
+    Merges repeated escalations about the same subject inside a time window.
+    Open windows live in a hashed time wheel, so expiry is O(1) per tick and the
+    number of open windows is capped. A background thread turns the wheel while
+    windows are open, so a window closes on time even if no escalation follows,
+    and windows still open when the process exits are closed then.
+    """
+
+    def __init__(self, window_seconds: float = float(os.environ.get("ESCALATION_COALESCE_WINDOW", 300)),
+                 max_open: int = 10000, max_document_ids: int = 100, slots: int = 60,
+                 on_close: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 clock: Callable[[], float] = time.time):
+        """
+        Initialize the coalescer
+
+        Args:
+            window_seconds: How long duplicates are merged after the first escalation
+            max_open: Maximum number of open windows kept in memory
+            max_document_ids: Maximum document IDs recorded per merged event
+            slots: Number of time wheel slots the window is divided into
+            on_close: Called with each event when its window closes
+            clock: Time source, in seconds
+        """
+        self.logger = logging.getLogger(__name__)
+        self.window_seconds = window_seconds
+        self.max_open = max_open
+        self.max_document_ids = max_document_ids
+        self.on_close = on_close
+        self.clock = clock
+
+        self.tick = max(window_seconds / slots, 0.001)
+        self.window_ticks = math.ceil(window_seconds / self.tick)
+        self.wheel: List[List[CoalesceKey]] = [[] for _ in range(self.window_ticks + 1)]
+        self.open_events: Dict[CoalesceKey, Dict[str, Any]] = {}
+        self.current_tick = int(self.clock() / self.tick)
+
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    def start(self) -> None:
+        """Start closing expired windows in the background in this process (threads do not survive fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            threading.Thread(target=self._run, name="escalation-coalescer", daemon=True).start()
+            self._pid = os.getpid()
+
+            # Report the merged counts of windows still open rather than losing them
+            atexit.register(self.flush_all)
+
+    def _run(self) -> None:
+        while True:
+            # Sleep until a window opens, then wake once per wheel slot until all have closed
+            self._wakeup.wait(self.tick if self.open_events else None)
+            self._wakeup.clear()
+            try:
+                self.flush_expired()
+            except Exception as e:
+                self.logger.error(f"Closing expired escalation windows failed: {str(e)}")
+
+    def offer(self, escalation_type: str, target: str, subject: str, document_id: Optional[str]) -> Tuple[Dict[str, Any], bool]:
+        """
+        Record an escalation and merge it into an open window if one exists
+
+        Args:
+            escalation_type: Escalation, action or endpoint name
+            target: Team or system the escalation goes to
+            subject: Sender or keyword the escalation is about
+            document_id: ID of the document raising it
+
+        Returns:
+            The coalesced event and True if this escalation opened it
+        """
+        self.start()
+        closed = []
+        key = (escalation_type, target, subject)
+
+        with self._lock:
+            now = self.clock()
+            closed.extend(self._advance(now))
+
+            event = self.open_events.get(key)
+            if event:
+                event["count"] += 1
+                event["last_seen"] = now
+                if len(event["document_ids"]) < self.max_document_ids:
+                    event["document_ids"].append(document_id)
+                else:
+                    event["document_ids_truncated"] = True
+                opened = False
+            else:
+                # Make room by closing the windows that expire soonest
+                while len(self.open_events) >= self.max_open:
+                    evicted = self._close_next_slot()
+                    if not evicted:
+                        break
+                    closed.extend(evicted)
+
+                event = {
+                    "event_id": uuid.uuid4().hex,
+                    "escalation_type": escalation_type,
+                    "target": target,
+                    "subject": subject,
+                    "count": 1,
+                    "document_ids": [document_id],
+                    "first_seen": now,
+                    "last_seen": now,
+                    "window_seconds": self.window_seconds
+                }
+                self.open_events[key] = event
+                expiry_tick = self.current_tick + self.window_ticks
+                self.wheel[expiry_tick % len(self.wheel)].append(key)
+                opened = True
+                if len(self.open_events) == 1:
+                    self._wakeup.set()
+
+        self._emit(closed)
+        return event, opened
+
+    def flush_expired(self) -> List[Dict[str, Any]]:
+        """Close windows that have run out; returns the closed events"""
+        with self._lock:
+            closed = self._advance(self.clock())
+        self._emit(closed)
+        return closed
+
+    def flush_all(self) -> List[Dict[str, Any]]:
+        """Close every open window immediately"""
+        with self._lock:
+            closed = list(self.open_events.values())
+            self.open_events.clear()
+            for slot in self.wheel:
+                slot.clear()
+        self._emit(closed)
+        return closed
+
+    def get_open_events(self) -> List[Dict[str, Any]]:
+        """Snapshot of the currently open windows"""
+        with self._lock:
+            return [dict(e, document_ids=list(e["document_ids"])) for e in self.open_events.values()]
+
+    def _advance(self, now: float) -> List[Dict[str, Any]]:
+        """Move the wheel forward to now, closing every slot passed over"""
+        target_tick = int(now / self.tick)
+        closed = []
+
+        # Never walk more than one full turn of the wheel
+        start = max(self.current_tick + 1, target_tick - len(self.wheel) + 1)
+        for tick in range(start, target_tick + 1):
+            closed.extend(self._close_slot(tick % len(self.wheel)))
+
+        self.current_tick = max(self.current_tick, target_tick)
+        return closed
+
+    def _close_slot(self, index: int) -> List[Dict[str, Any]]:
+        keys = self.wheel[index]
+        self.wheel[index] = []
+        return [self.open_events.pop(k) for k in keys if k in self.open_events]
+
+    def _close_next_slot(self) -> List[Dict[str, Any]]:
+        """Close the slot that would expire next"""
+        for offset in range(1, len(self.wheel) + 1):
+            index = (self.current_tick + offset) % len(self.wheel)
+            if self.wheel[index]:
+                return self._close_slot(index)
+        return []
+
+    def _emit(self, closed: List[Dict[str, Any]]) -> None:
+        if not self.on_close:
+            return
+        for event in closed:
+            try:
+                self.on_close(event)
+            except Exception as e:
+                self.logger.error(f"Coalesced event callback failed: {str(e)}")
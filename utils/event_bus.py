@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Tuple
+
+# Events kept per run, and runs kept in total
+RUN_EVENT_HISTORY = int(os.environ.get("RUN_EVENT_HISTORY", 256))
+RUN_EVENT_MAX_RUNS = int(os.environ.get("RUN_EVENT_MAX_RUNS", 1000))
+
+class _RunChannel:
+    __slots__ = ("events", "cond", "closed")
+
+    def __init__(self, history: int):
+        self.events: "deque[Dict[str, Any]]" = deque(maxlen=history)
+        self.cond = threading.Condition()
+        self.closed = False
+
+class RunEventBus:
+    """
+    In-process bus of pipeline events, one channel per run.
+    Each channel keeps a bounded history, so a subscriber that connects late
+    or reconnects with Last-Event-ID replays what it missed. Subscribers of a
+    run wait on that run's own condition and are woken only by its events.
+    """
+
+    def __init__(self, history: int = RUN_EVENT_HISTORY, max_runs: int = RUN_EVENT_MAX_RUNS):
+        """
+        Initialize the bus
+
+        Args:
+            history: Events kept per run
+            max_runs: Channels kept; the oldest finished runs are dropped first
+        """
+        self.history = history
+        self.max_runs = max_runs
+        self._channels: "OrderedDict[str, _RunChannel]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _channel(self, run_id: str, create: bool = False) -> Optional[_RunChannel]:
+        with self._lock:
+            channel = self._channels.get(run_id)
+            if channel is None and create:
+                channel = self._channels[run_id] = _RunChannel(self.history)
+                self._evict()
+            return channel
+
+    def _evict(self) -> None:
+        """Drop the oldest finished channels over the limit; caller holds the lock"""
+        excess = len(self._channels) - self.max_runs
+        if excess <= 0:
+            return
+        for run_id in [r for r, c in self._channels.items() if c.closed][:excess]:
+            del self._channels[run_id]
+
+    def has_run(self, run_id: str) -> bool:
+        return run_id in self._channels
+
+    def publish(self, run_id: str, event: Dict[str, Any]) -> None:
+        """Append an event carrying an increasing integer "id" and wake the run's subscribers"""
+        channel = self._channel(run_id, create=True)
+        with channel.cond:
+            channel.events.append(event)
+            channel.cond.notify_all()
+
+    def close(self, run_id: str) -> None:
+        """Mark a run finished; subscribers return once they have read everything"""
+        channel = self._channel(run_id)
+        if channel is None:
+            return
+        with channel.cond:
+            channel.closed = True
+            channel.cond.notify_all()
+
+    def read(self, run_id: str, after: int = 0, timeout: Optional[float] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Events of a run newer than an event ID, waiting for one if there are none yet
+
+        Args:
+            run_id: Run to read
+            after: Last event ID the subscriber has seen
+            timeout: Seconds to wait for a new event
+
+        Returns:
+            (events, whether the run is finished and fully read)
+        """
+        channel = self._channel(run_id)
+        if channel is None:
+            return [], True
+
+        with channel.cond:
+            channel.cond.wait_for(lambda: channel.closed or (channel.events and channel.events[-1]["id"] > after),
+                                  timeout)
+            events = [e for e in channel.events if e["id"] > after]
+            return events, channel.closed and not events
@@ -0,0 +1,42 @@
+import os
+import threading
+from typing import Any, Dict, Iterable
+
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-1.5-flash")
+
+_genai = None
+_models: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+def _client_module():
+    """google.generativeai, imported and configured on first use; caller holds the lock"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY", "your-api-key-here"))
+        _genai = genai
+    return _genai
+
+def get_model(name: str = GEMINI_MODEL):
+    """
+    The process-wide GenerativeModel for a model name, shared by all agents
+
+    Importing the Gemini client takes most of the application's start-up time,
+    so it happens on the first call rather than when the agents are imported.
+    """
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            model = _models.get(name)
+            if model is None:
+                model = _models[name] = _client_module().GenerativeModel(name)
+    return model
+
+def preload(names: Iterable[str] = (GEMINI_MODEL,)) -> None:
+    """
+    Import the client and build the models now, e.g. in a gunicorn master before
+    it forks workers. Models open their connections on the first request, so no
+    socket is created here and none is shared across the fork.
+    """
+    for name in names:
+        get_model(name)
@@ -0,0 +1,427 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Callable
+
+from utils.event_bus import RunEventBus
+from utils.lane_scheduler import LaneScheduler, QueueFull, lane_config
+
+JOBS_DB = 'data/jobs.db'
+
+# States a job moves through
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+class Job:
+    """Handle passed to a job handler for reporting progress"""
+
+    def __init__(self, job_queue: "JobQueue", job_id: str, kind: str):
+        self.queue = job_queue
+        self.id = job_id
+        self.kind = kind
+
+    def stage(self, name: str) -> None:
+        """Record that the job has started a pipeline stage"""
+        self.queue._transition(self.id, RUNNING, stage=name, event="stage_started")
+
+    def stage_finished(self, name: str, duration_ms: float, **details: Any) -> None:
+        """Record that a pipeline stage has finished and how long it took"""
+        self.event("stage_finished", stage=name, duration_ms=round(duration_ms, 3), **details)
+
+    def event(self, name: str, **details: Any) -> None:
+        """Record a progress event that does not change the job state"""
+        self.queue._transition(self.id, RUNNING, event=name, details=details)
+
+    def progress(self, **counts: int) -> None:
+        """Record aggregate progress of a job made of many items, such as a bulk upload"""
+        self.queue._transition(self.id, RUNNING, event="progress", details=counts, progress=counts)
+
+class JobQueue:
+    """
+    Background job queue for document processing.
+    Jobs run on a bounded pool of worker threads in the process that accepted
+    them, taken from priority lanes by a LaneScheduler that also turns jobs
+    away when a lane is backed up. Their state and event history live in
+    SQLite, so any worker process can report on them, and each event is also
+    published to the in-process event bus for live subscribers. Payloads are
+    only held in memory; jobs left unfinished by a process that has gone away
+    are marked failed.
+    """
+
+    def __init__(self, db_path: str = JOBS_DB,
+                 workers: int = int(os.environ.get("JOB_WORKERS", 4)),
+                 max_pending: int = int(os.environ.get("JOB_QUEUE_MAX", 1000)),
+                 retention_seconds: float = float(os.environ.get("JOB_RETENTION_SECONDS", 24 * 3600)),
+                 event_bus: Optional[RunEventBus] = None, lanes: Optional[Dict[str, Dict[str, float]]] = None):
+        """
+        Initialize the job queue
+
+        Args:
+            db_path: SQLite file holding job states
+            workers: Number of jobs processed concurrently
+            max_pending: Queued jobs accepted before submit raises QueueFull
+            retention_seconds: How long finished jobs stay queryable
+            event_bus: Bus that job events are published to, keyed by job ID
+            lanes: Lane settings for the scheduler; lane_config() if omitted
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.worker_count = workers
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self.event_bus = event_bus or RunEventBus()
+
+        self.lanes = lanes or lane_config()
+        self.handlers: Dict[str, Callable[[Dict[str, Any], Job], Dict[str, Any]]] = {}
+        self.default_lanes: Dict[str, str] = {}
+        self.scheduler = LaneScheduler(workers, self.lanes)
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection to the jobs database"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _write_transaction(self):
+        """This thread's connection inside a transaction that holds the database write lock from the start"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _init_db(self) -> None:
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                state TEXT NOT NULL,
+                stage TEXT,
+                owner_pid INTEGER NOT NULL,
+                meta TEXT,
+                result TEXT,
+                error TEXT,
+                transitions TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # Databases created before progress reporting and deduplication lack the columns
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "progress" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN progress TEXT")
+        if "dedup_key" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN dedup_key TEXT")
+        if "lane" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN lane TEXT")
+        if "owner" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs (dedup_key) WHERE dedup_key IS NOT NULL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at)")
+
+    def register(self, kind: str, handler: Callable[[Dict[str, Any], Job], Dict[str, Any]],
+                 lane: str = "interactive") -> None:
+        """
+        Register the handler for a kind of job
+
+        Args:
+            kind: Job kind
+            handler: Called with (payload, job) on a worker thread; returns the job result
+            lane: Lane jobs of this kind are queued in unless submitted to another
+        """
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown lane: {lane}")
+        self.handlers[kind] = handler
+        self.default_lanes[kind] = lane
+
+    def start(self) -> None:
+        """Start the workers in this process (threads do not survive fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.scheduler = LaneScheduler(self.worker_count, self.lanes)
+            self._fail_orphans()
+            for i in range(self.worker_count):
+                threading.Thread(target=self._run_worker, name=f"job-worker-{i}", daemon=True).start()
+            self._pid = os.getpid()
+            self.logger.info(f"Job queue started with {self.worker_count} workers")
+
+    def submit(self, kind: str, payload: Dict[str, Any], meta: Optional[Dict[str, Any]] = None,
+               dedup_key: Optional[str] = None, lane: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Queue a job
+
+        Args:
+            kind: Registered job kind
+            payload: Handler input, kept in memory only
+            meta: Small JSON-serializable description reported with the job status
+            dedup_key: Identity of the work, such as a content hash; while a job of the same
+                kind and key is unfinished, that job is returned instead of queueing another
+            lane: Lane to queue the job in; defaults to the lane the kind was registered with
+
+        Returns:
+            The job status record
+
+        Raises:
+            QueueFull: If the queue or the lane is backed up; retry_after says when to try again
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        lane = lane or self.default_lanes[kind]
+        self.start()
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        # The duplicate check and the insert share one write transaction, so two
+        # processes submitting the same work cannot both miss each other's job
+        with self._write_transaction() as conn:
+            existing_id = self._find_active(conn, kind, dedup_key) if dedup_key else None
+            if not existing_id:
+                if self.scheduler.qsize() >= self.max_pending:
+                    raise QueueFull(f"Job queue is full ({self.max_pending} pending)")
+                self.scheduler.admit(lane)
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, state, owner_pid, owner, meta, transitions, dedup_key, lane, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, QUEUED, os.getpid(), _own_token(), json.dumps(meta or {}, default=str), "[]", dedup_key, lane, now, now)
+                )
+        if existing_id:
+            return self.get(existing_id)
+
+        self._transition(job_id, QUEUED, details={"lane": lane})
+        self.scheduler.put(lane, (job_id, kind, payload))
+        self._purge_expired(now)
+        return self.get(job_id)
+
+    def _find_active(self, conn: sqlite3.Connection, kind: str, dedup_key: str) -> Optional[str]:
+        """ID of the unfinished job of a kind with a deduplication key, if its owning process is still alive"""
+        row = conn.execute(
+            "SELECT id, owner_pid, owner FROM jobs WHERE dedup_key = ? AND kind = ? AND state IN (?, ?) "
+            "ORDER BY created_at DESC LIMIT 1", (dedup_key, kind, QUEUED, RUNNING)
+        ).fetchone()
+        if row and _owner_alive(row[1], row[2]):
+            return row[0]
+        return None
+
+    def _run_worker(self) -> None:
+        scheduler = self.scheduler
+        while True:
+            lane, (job_id, kind, payload) = scheduler.get()
+            started = time.perf_counter()
+            try:
+                self._execute(job_id, kind, payload)
+            except Exception as e:
+                self.logger.error(f"Job {job_id} bookkeeping failed: {str(e)}")
+            finally:
+                scheduler.done(lane, time.perf_counter() - started)
+
+    def _execute(self, job_id: str, kind: str, payload: Dict[str, Any]) -> None:
+        self._transition(job_id, RUNNING)
+        started = time.perf_counter()
+        try:
+            result = self.handlers[kind](payload, Job(self, job_id, kind))
+        except Exception as e:
+            self.logger.error(f"Job {job_id} ({kind}) failed: {str(e)}")
+            self.logger.debug(traceback.format_exc())
+            self._transition(job_id, FAILED, error=str(e))
+            return
+        self._transition(job_id, SUCCEEDED, result=result)
+        self.logger.info(f"Job {job_id} ({kind}) finished in {time.perf_counter() - started:.2f}s")
+
+    def _transition(self, job_id: str, state: str, stage: Optional[str] = None, event: Optional[str] = None,
+                    details: Optional[Dict[str, Any]] = None, result: Optional[Dict[str, Any]] = None,
+                    error: Optional[str] = None, progress: Optional[Dict[str, int]] = None) -> None:
+        """
+        Move a job to a state (or stage within RUNNING), append the event to its history and publish it
+
+        Args:
+            job_id: Job to update
+            state: New state
+            stage: Pipeline stage the job has reached
+            event: Event name; defaults to the state
+            details: Extra event fields
+            result: Handler result, on success
+            error: Failure message
+            progress: Latest aggregate progress counts
+        """
+        now = time.time()
+        # Read and rewrite the history in one write transaction, so events from the
+        # worker, the reaper and other processes never overwrite each other
+        with self._write_transaction() as conn:
+            row = conn.execute("SELECT state, stage, transitions FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not row:
+                return
+
+            # Event IDs keep counting when old events are trimmed from the bounded history
+            transitions = json.loads(row[2])
+            record = {"id": transitions[-1]["id"] + 1 if transitions else 1, "event": event or state,
+                      "state": state, "at": now}
+            if stage:
+                record["stage"] = stage
+            if details:
+                record.update(details)
+            if error:
+                record["error"] = error
+            transitions.append(record)
+            del transitions[:-self.event_bus.history]
+
+            conn.execute(
+                "UPDATE jobs SET state = ?, stage = ?, transitions = ?, updated_at = ?, "
+                "started_at = COALESCE(started_at, CASE WHEN ? = ? THEN ? END), "
+                "finished_at = CASE WHEN ? IN (?, ?) THEN ? ELSE finished_at END, "
+                "result = COALESCE(?, result), error = COALESCE(?, error), progress = COALESCE(?, progress) "
+                "WHERE id = ?",
+                (state, stage if stage else row[1], json.dumps(transitions), now,
+                 state, RUNNING, now,
+                 state, SUCCEEDED, FAILED, now,
+                 json.dumps(result, default=str) if result is not None else None, error,
+                 json.dumps(progress) if progress is not None else None, job_id)
+            )
+
+        self.event_bus.publish(job_id, record)
+        if state in FINISHED_STATES:
+            self.event_bus.close(job_id)
+
+    def _fail_orphans(self) -> None:
+        """Fail unfinished jobs whose owning process no longer exists; their payloads are gone"""
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT id, owner_pid, owner FROM jobs WHERE state IN (?, ?)", (QUEUED, RUNNING)
+        ).fetchall()
+        for job_id, pid, owner in rows:
+            # Rows from before owner tokens that carry this process's PID are left over from a recycled PID
+            if (owner is None and pid == os.getpid()) or not _owner_alive(pid, owner):
+                self._transition(job_id, FAILED, error="Interrupted by a worker restart")
+
+    def _purge_expired(self, now: float) -> None:
+        # Purging at most once a minute keeps it off the submit path
+        if not self.retention_seconds or now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        self._connect().execute(
+            "DELETE FROM jobs WHERE state IN (?, ?) AND finished_at < ?",
+            (SUCCEEDED, FAILED, now - self.retention_seconds)
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status record of a job, or None if unknown or expired"""
+        row = self._connect().execute(
+            "SELECT id, kind, state, stage, meta, result, error, transitions, created_at, started_at, finished_at, progress, "
+            "lane FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return _job_record(row) if row else None
+
+    def list_jobs(self, state: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recently submitted jobs, optionally only those in one state"""
+        sql = ("SELECT id, kind, state, stage, meta, result, error, transitions, created_at, started_at, finished_at, "
+               "progress, lane FROM jobs {where} ORDER BY created_at DESC LIMIT ?")
+        if state:
+            rows = self._connect().execute(sql.format(where="WHERE state = ?"), (state, limit)).fetchall()
+        else:
+            rows = self._connect().execute(sql.format(where=""), (limit,)).fetchall()
+        return [_job_record(row) for row in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Count jobs by state"""
+        rows = self._connect().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        counts.update({state: count for state, count in rows})
+        return {
+            "workers": self.worker_count,
+            "pending_in_process": self.scheduler.qsize(),
+            "max_pending": self.max_pending,
+            "lanes": self.scheduler.get_stats(),
+            "counts": counts
+        }
+
+def _job_record(row: tuple) -> Dict[str, Any]:
+    return {
+        "job_id": row[0],
+        "kind": row[1],
+        "state": row[2],
+        "stage": row[3],
+        "meta": json.loads(row[4]) if row[4] else {},
+        "result": json.loads(row[5]) if row[5] else None,
+        "error": row[6],
+        "events": json.loads(row[7]),
+        "created_at": row[8],
+        "started_at": row[9],
+        "finished_at": row[10],
+        "progress": json.loads(row[11]) if row[11] else None,
+        "lane": row[12]
+    }
+
+# Whether processes can be identified by PID and start time
+_PROC_STAT = os.path.exists("/proc/self/stat")
+_own = (None, None)
+
+def _process_token(pid: int) -> Optional[str]:
+    """
+    Identity of a running process that a recycled PID does not share: the PID
+    and the process start time where /proc is available, otherwise the bare PID
+
+    Returns:
+        The token, or None if no process has the PID
+    """
+    if not _PROC_STAT:
+        return str(pid) if _pid_alive(pid) else None
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name in parentheses may contain spaces; start time is the 22nd field
+    return f"{pid}:{stat.rpartition(b')')[2].split()[19].decode()}"
+
+def _own_token() -> str:
+    global _own
+    pid = os.getpid()
+    if _own[0] != pid:
+        _own = (pid, _process_token(pid))
+    return _own[1]
+
+def _owner_alive(pid: int, owner: Optional[str]) -> bool:
+    """Whether the process that queued a job still runs; rows from before owner tokens only have the PID"""
+    if owner is None:
+        return pid == os.getpid() or _pid_alive(pid)
+    return owner == _own_token() or _process_token(pid) == owner
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
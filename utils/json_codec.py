@@ -0,0 +1,104 @@
+import os
+import gzip
+import json
+import zlib
+import hashlib
+from typing import Any, Iterable, Iterator, NamedTuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Encoded records at least this large are kept gzip-compressed; 0 disables compression
+COMPRESS_MIN_BYTES = int(os.environ.get("MEMORY_STORE_COMPRESS_MIN_BYTES", 4096))
+
+def encode_json(obj: Any) -> bytes:
+    """
+    Compact UTF-8 JSON; uses orjson when it is installed and falls back to
+    the standard library for what orjson rejects (integers wider than 64
+    bits, for instance)
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson.JSONEncodeError subclasses TypeError
+            pass
+    return _encode_stdlib(obj)
+
+def _encode_stdlib(obj: Any) -> bytes:
+    return json.dumps(obj, default=str, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def decode_json(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Content codings offered to clients, in order of preference, and their levels for responses built per request
+RESPONSE_CODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def compress(body: bytes, coding: str) -> bytes:
+    """Compress a whole response body with a content coding from RESPONSE_CODINGS"""
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def compress_chunks(chunks: Iterable[bytes], coding: str) -> Iterator[bytes]:
+    """Compress a streamed response body chunk by chunk"""
+    if coding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        out = process(chunk)
+        if out:
+            yield out
+    yield finish()
+
+def content_etag(body: bytes) -> str:
+    """Strong entity tag (without quotes) derived from the uncompressed JSON bytes"""
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+class EncodedJSON(NamedTuple):
+    """JSON bytes encoded once, optionally gzip-compressed, with their entity tag"""
+    body: bytes
+    etag: str
+    compressed: bool = False
+
+    @classmethod
+    def encode(cls, obj: Any, compress_min_bytes: int = COMPRESS_MIN_BYTES) -> "EncodedJSON":
+        if orjson is not None:
+            try:
+                # orjson hands back its over-allocated output buffer; long-lived records keep an exact-size copy
+                body = memoryview(orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)).tobytes()
+            except TypeError:
+                body = _encode_stdlib(obj)
+        else:
+            body = _encode_stdlib(obj)
+        return cls.from_bytes(body, compress_min_bytes)
+
+    @classmethod
+    def from_bytes(cls, body: bytes, compress_min_bytes: int = 0) -> "EncodedJSON":
+        etag = content_etag(body)
+        if compress_min_bytes and len(body) >= compress_min_bytes:
+            compressed = gzip.compress(body, compresslevel=6, mtime=0)
+            if len(compressed) < len(body):
+                return cls(compressed, etag, True)
+        return cls(body, etag, False)
+
+    def json_bytes(self) -> bytes:
+        """The uncompressed JSON bytes"""
+        return gzip.decompress(self.body) if self.compressed else self.body
+
+    def decode(self) -> Any:
+        return decode_json(self.json_bytes())
@@ -0,0 +1,178 @@
+import os
+import json
+import math
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+# Share of the workers each lane gets while all have work (weight), workers it may
+# occupy at once (0 for no cap), jobs it may hold queued, and the longest predicted
+# wait in seconds before new jobs are turned away. JOB_LANES overrides parts as JSON,
+# e.g. {"batch": {"max_running": 1}}.
+DEFAULT_LANES = {
+    "interactive": {"weight": 8, "max_running": 0, "max_queued": 200, "max_wait": 30},
+    "webhook": {"weight": 4, "max_running": 0, "max_queued": 500, "max_wait": 120},
+    "batch": {"weight": 1, "max_running": 2, "max_queued": 1000, "max_wait": 1800}
+}
+
+# Weight of the latest run time in a lane's moving average
+SERVICE_TIME_SMOOTHING = 0.2
+MAX_RETRY_AFTER = 300
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while its lane is at capacity"""
+
+    def __init__(self, message: str, retry_after: int = 30):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def lane_config(overrides: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """DEFAULT_LANES with the overrides from JOB_LANES applied"""
+    lanes = {name: dict(settings) for name, settings in DEFAULT_LANES.items()}
+    for name, settings in json.loads(overrides or os.environ.get("JOB_LANES") or "{}").items():
+        lanes.setdefault(name, {"weight": 1, "max_running": 0, "max_queued": 1000, "max_wait": 600}).update(settings)
+    return lanes
+
+class _Lane:
+    __slots__ = ("name", "weight", "max_running", "max_queued", "max_wait", "items", "running", "pass_",
+                 "service_seconds", "admitted", "shed", "completed")
+
+    def __init__(self, name: str, weight: float, max_running: int, max_queued: int, max_wait: float):
+        self.name = name
+        self.weight = weight
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self.items: deque = deque()
+        self.running = 0
+        self.pass_ = 0.0
+        self.service_seconds: Optional[float] = None
+        self.admitted = 0
+        self.shed = 0
+        self.completed = 0
+
+    def eligible(self) -> bool:
+        return bool(self.items) and (not self.max_running or self.running < self.max_running)
+
+class LaneScheduler:
+    """
+    Priority lanes in front of a pool of workers.
+    Workers take the next job by stride scheduling: every lane advances its
+    pass by 1/weight per job it starts and the eligible lane with the lowest
+    pass goes next, so busy lanes share the workers in proportion to their
+    weights and a lane coming back from idle cannot claim a backlog of turns.
+    Lanes at their concurrency cap are skipped. Admission is checked per lane
+    against its queue depth and the wait predicted from its recent run times.
+    """
+
+    def __init__(self, workers: int, lanes: Optional[Dict[str, Dict[str, float]]] = None):
+        """
+        Initialize the scheduler
+
+        Args:
+            workers: Workers taking jobs, used to predict waits
+            lanes: Lane name to weight, max_running, max_queued and max_wait; lane_config() if omitted
+        """
+        self.workers = workers
+        self.lanes = {name: _Lane(name, **settings) for name, settings in (lanes or lane_config()).items()}
+        self._vtime = 0.0
+        self._cond = threading.Condition()
+
+    def _lane(self, name: str) -> _Lane:
+        lane = self.lanes.get(name)
+        if lane is None:
+            raise ValueError(f"Unknown lane: {name}")
+        return lane
+
+    def _predicted_wait(self, lane: _Lane) -> Optional[float]:
+        """Seconds until a job joining the lane now would be done; caller holds the condition"""
+        if lane.service_seconds is None:
+            return None
+        active = [l for l in self.lanes.values() if l.items or l.running or l is lane]
+        slots = self.workers * lane.weight / sum(l.weight for l in active)
+        if lane.max_running:
+            slots = min(slots, lane.max_running)
+        return (len(lane.items) + 1) * lane.service_seconds / slots
+
+    def admit(self, name: str) -> None:
+        """
+        Check that a lane can take one more job
+
+        Raises:
+            ValueError: If the lane does not exist
+            QueueFull: If the lane's queue is full or its predicted wait is too long
+        """
+        with self._cond:
+            lane = self._lane(name)
+            wait = self._predicted_wait(lane)
+            # Retry after roughly the time it takes the backlog to drain below the limit
+            if len(lane.items) >= lane.max_queued:
+                reason = f"{len(lane.items)} jobs queued"
+                retry_after = wait / (len(lane.items) + 1) if wait is not None else 30
+            elif wait is not None and wait > lane.max_wait:
+                reason = f"predicted wait {wait:.0f}s"
+                retry_after = wait - lane.max_wait
+            else:
+                lane.admitted += 1
+                return
+            lane.shed += 1
+            raise QueueFull(f"Lane {name} is full ({reason})", min(max(math.ceil(retry_after), 1), MAX_RETRY_AFTER))
+
+    def put(self, name: str, item: Any) -> None:
+        """Queue an admitted item in a lane"""
+        with self._cond:
+            lane = self._lane(name)
+            if not lane.items and not lane.running:
+                lane.pass_ = max(lane.pass_, self._vtime)
+            lane.items.append(item)
+            self._cond.notify()
+
+    def get(self) -> Tuple[str, Any]:
+        """Wait for the next item by lane weights and caps; returns (lane, item)"""
+        with self._cond:
+            while True:
+                eligible = [lane for lane in self.lanes.values() if lane.eligible()]
+                if eligible:
+                    break
+                self._cond.wait()
+            lane = min(eligible, key=lambda l: l.pass_)
+            self._vtime = lane.pass_
+            lane.pass_ += 1 / lane.weight
+            lane.running += 1
+            return lane.name, lane.items.popleft()
+
+    def done(self, name: str, seconds: float) -> None:
+        """Release a worker taken by get() and record how long the item ran"""
+        with self._cond:
+            lane = self._lane(name)
+            lane.running -= 1
+            lane.completed += 1
+            if lane.service_seconds is None:
+                lane.service_seconds = seconds
+            else:
+                lane.service_seconds += SERVICE_TIME_SMOOTHING * (seconds - lane.service_seconds)
+            # A lane at its cap may have become eligible again
+            self._cond.notify_all()
+
+    def qsize(self) -> int:
+        with self._cond:
+            return sum(len(lane.items) for lane in self.lanes.values())
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            stats = []
+            for lane in self.lanes.values():
+                wait = self._predicted_wait(lane)
+                stats.append({
+                    "lane": lane.name,
+                    "weight": lane.weight,
+                    "max_running": lane.max_running,
+                    "queued": len(lane.items),
+                    "running": lane.running,
+                    "admitted": lane.admitted,
+                    "shed": lane.shed,
+                    "completed": lane.completed,
+                    "avg_run_seconds": round(lane.service_seconds, 3) if lane.service_seconds is not None else None,
+                    "predicted_wait_seconds": round(wait, 3) if wait is not None else None
+                })
+            return stats
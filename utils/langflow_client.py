@@ -0,0 +1,85 @@
+import os
+import json
+import logging
+import threading
+from typing import Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+LANGFLOW_URL = os.environ.get("LANGFLOW_URL", "http://langflow:7860")
+
+# Connect timeout, and how long a stream may stay silent before it is given up on
+LANGFLOW_CONNECT_TIMEOUT = float(os.environ.get("LANGFLOW_CONNECT_TIMEOUT", 3.05))
+LANGFLOW_READ_TIMEOUT = float(os.environ.get("LANGFLOW_READ_TIMEOUT", 60))
+
+# Keep-alive connections kept to LangFlow per process
+LANGFLOW_POOL_SIZE = int(os.environ.get("LANGFLOW_POOL_SIZE", 32))
+
+# Longest line accepted from a LangFlow stream
+LANGFLOW_MAX_LINE_BYTES = int(os.environ.get("LANGFLOW_MAX_LINE_BYTES", 1024 * 1024))
+
+# Bytes read from a LangFlow stream at a time
+LANGFLOW_STREAM_READ_BYTES = 8192
+
+SSE_KEEPALIVE = b": keep-alive\n\n"
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+def sse_data(line: bytes) -> bytes:
+    """Frame one line of a LangFlow stream as a server-sent event"""
+    return b"data: " + line + b"\n\n"
+
+def sse_error(message: str) -> bytes:
+    return b"event: error\ndata: " + json.dumps({"error": message}).encode("utf-8") + b"\n\n"
+
+def get_session() -> requests.Session:
+    """This process's pooled session to LangFlow (pooled sockets must not be shared across fork)"""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=LANGFLOW_POOL_SIZE, pool_block=False)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+def stream_events(method: str, path: str, base_url: str = LANGFLOW_URL, **kwargs) -> Iterator[bytes]:
+    """
+    Relay a LangFlow streaming endpoint as server-sent events over the pooled session
+
+    Args:
+        method: HTTP method
+        path: Path on the LangFlow server, such as /api/runs
+        base_url: LangFlow server
+        **kwargs: Passed on to requests, e.g. json=
+
+    Yields:
+        One event per non-empty line of the upstream response, then an error event if it failed
+    """
+    url = base_url.rstrip("/") + path
+    try:
+        with get_session().request(method, url, stream=True,
+                                   timeout=(LANGFLOW_CONNECT_TIMEOUT, LANGFLOW_READ_TIMEOUT), **kwargs) as r:
+            r.raise_for_status()
+            # Split lines from raw chunks so a line is never buffered past the limit, as iter_lines would
+            pending = b""
+            for chunk in r.iter_content(chunk_size=LANGFLOW_STREAM_READ_BYTES):
+                *lines, pending = (pending + chunk).split(b"\n")
+                if len(pending) > LANGFLOW_MAX_LINE_BYTES:
+                    raise ValueError(f"LangFlow sent a line longer than {LANGFLOW_MAX_LINE_BYTES} bytes")
+                for line in lines:
+                    line = line.rstrip(b"\r")
+                    if line:
+                        yield sse_data(line)
+            if pending.strip():
+                yield sse_data(pending.rstrip(b"\r"))
+    except (requests.RequestException, ValueError) as e:
+        logger.warning(f"LangFlow stream {method} {path} failed: {str(e)}")
+        yield sse_error(str(e))
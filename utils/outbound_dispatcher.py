@@ -0,0 +1,383 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import random
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OUTBOUND_DB = 'data/outbound.db'
+
+# Delivered messages are deleted this long after delivery; 0 keeps them
+OUTBOUND_RETENTION_SECONDS = int(os.environ.get("OUTBOUND_RETENTION_SECONDS", 24 * 3600))
+# Rows deleted per statement, so pruning never holds the write lock for long
+PRUNE_BATCH = 5000
+
+# Statuses a queued message moves through
+PENDING = "pending"
+INFLIGHT = "inflight"
+DELIVERED = "delivered"
+DEAD = "dead"
+
+# Client errors that are worth retrying
+RETRYABLE_STATUS = {408, 409, 425, 429}
+
+class OutboundDispatcher:
+    """
+    Persistent outbound queue for API calls triggered by routing.
+    Messages are stored in SQLite and delivered by background workers in
+    per-endpoint batches, with exponential backoff and dead-lettering.
+    Messages left in flight by a worker that died are put back periodically,
+    in the same pass that deletes messages delivered longer ago than the
+    retention window.
+    """
+
+    def __init__(self, db_path: str = OUTBOUND_DB, base_url: Optional[str] = None,
+                 workers: int = 2, batch_size: int = 20, max_attempts: int = 6,
+                 backoff_base: float = 0.5, backoff_max: float = 60.0,
+                 timeout: tuple = (3.05, 10), poll_interval: float = 1.0,
+                 retention_seconds: float = OUTBOUND_RETENTION_SECONDS):
+        """
+        Initialize the dispatcher
+
+        Args:
+            db_path: SQLite file holding the queue
+            base_url: Downstream base URL; when unset, deliveries are only logged
+            workers: Number of background delivery threads
+            batch_size: Maximum messages per request to one endpoint
+            max_attempts: Attempts before a message is dead-lettered
+            backoff_base: First retry delay in seconds, doubled per attempt
+            backoff_max: Upper bound for the retry delay
+            timeout: (connect, read) timeout for outbound requests
+            poll_interval: Idle wait between queue scans
+            retention_seconds: How long delivered messages are kept; 0 keeps them
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.base_url = (base_url if base_url is not None else os.environ.get("OUTBOUND_BASE_URL", "")).rstrip('/')
+        self.worker_count = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+
+        self.running = False
+        self._pid = None
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._local = threading.local()
+
+        # Claims older than this belong to a worker that died mid-delivery
+        self.stale_after = 10 * sum(timeout)
+        self._last_reclaim = 0.0
+
+        # One pooled session shared by all workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(workers, 4))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection to the queue database (connections do not survive fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self) -> None:
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbound (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                endpoint TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(outbound)")}
+        if "priority" not in columns:
+            conn.execute("ALTER TABLE outbound ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+        conn.execute("DROP INDEX IF EXISTS idx_outbound_due")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_outbound_next ON outbound (status, priority, next_attempt_at)")
+
+    def start(self) -> None:
+        """Start background workers in this process; safe to call repeatedly"""
+        with self._start_lock:
+            if self.running and self._pid == os.getpid():
+                return
+
+            self._reclaim_stale()
+
+            self.running = True
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._run_worker, name=f"outbound-{i}", daemon=True)
+                for i in range(self.worker_count)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+            self.logger.info(f"Outbound dispatcher started with {self.worker_count} workers")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop background workers"""
+        self.running = False
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, endpoint: str, payload: Dict[str, Any], priority: int = 0) -> Dict[str, Any]:
+        """
+        Queue an outbound API call
+
+        Args:
+            endpoint: Request line such as "POST /crm/escalate"
+            payload: JSON body for the call
+            priority: Due calls with a higher priority are delivered first
+
+        Returns:
+            Record describing the queued call
+        """
+        if not self.running or self._pid != os.getpid():
+            self.start()
+
+        idempotency_key = uuid.uuid4().hex
+        now = time.time()
+
+        self._connect().execute(
+            "INSERT INTO outbound (idempotency_key, endpoint, payload, status, next_attempt_at, priority, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (idempotency_key, endpoint, json.dumps(payload), PENDING, now, priority, now, now)
+        )
+        self._wakeup.set()
+
+        return {
+            "endpoint": endpoint,
+            "idempotency_key": idempotency_key,
+            "status": "queued",
+            "queued_at": now
+        }
+
+    def _reclaim_stale(self) -> None:
+        """
+        Put messages claimed by a worker that died mid-delivery back in the queue.
+        Recent claims may belong to another live process sharing the database.
+        """
+        now = time.time()
+        self._last_reclaim = now
+        cursor = self._connect().execute(
+            "UPDATE outbound SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+            (PENDING, now, INFLIGHT, now - self.stale_after)
+        )
+        if cursor.rowcount:
+            self.logger.warning(f"Requeued {cursor.rowcount} outbound messages left in flight")
+        self._prune_delivered(now)
+
+    def _prune_delivered(self, now: float) -> None:
+        """Delete messages delivered before the retention window; dead letters are kept for requeueing"""
+        if not self.retention_seconds:
+            return
+        conn = self._connect()
+        pruned = 0
+        while True:
+            cursor = conn.execute(
+                "DELETE FROM outbound WHERE id IN "
+                "(SELECT id FROM outbound WHERE status = ? AND updated_at < ? LIMIT ?)",
+                (DELIVERED, now - self.retention_seconds, PRUNE_BATCH)
+            )
+            pruned += cursor.rowcount
+            if cursor.rowcount < PRUNE_BATCH:
+                break
+        if pruned:
+            self.logger.info(f"Pruned {pruned} delivered outbound messages")
+
+    def _run_worker(self) -> None:
+        """Deliver batches until stopped"""
+        while self.running:
+            try:
+                if time.time() - self._last_reclaim >= self.stale_after:
+                    self._reclaim_stale()
+                batch = self._claim_batch()
+            except Exception as e:
+                self.logger.error(f"Outbound queue claim failed: {str(e)}")
+                batch = []
+
+            if not batch:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            self._deliver(batch)
+
+    def _claim_batch(self) -> List[tuple]:
+        """Atomically mark the next due batch for one endpoint as in flight, most urgent first"""
+        conn = self._connect()
+        now = time.time()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            head = conn.execute(
+                "SELECT endpoint FROM outbound WHERE status = ? AND next_attempt_at <= ? "
+                "ORDER BY priority DESC, next_attempt_at LIMIT 1",
+                (PENDING, now)
+            ).fetchone()
+            if not head:
+                conn.execute("COMMIT")
+                return []
+
+            rows = conn.execute(
+                "SELECT id, idempotency_key, endpoint, payload, attempts FROM outbound "
+                "WHERE status = ? AND endpoint = ? AND next_attempt_at <= ? ORDER BY priority DESC, id LIMIT ?",
+                (PENDING, head[0], now, self.batch_size)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbound SET status = ?, updated_at = ? WHERE id = ?",
+                [(INFLIGHT, now, row[0]) for row in rows]
+            )
+            conn.execute("COMMIT")
+            return rows
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _deliver(self, batch: List[tuple]) -> None:
+        """Send one batch and record the outcome"""
+        endpoint = batch[0][2]
+        method, _, path = endpoint.partition(' ')
+        items = [{"idempotency_key": row[1], "payload": json.loads(row[3])} for row in batch]
+
+        try:
+            if not self.base_url:
+                # No downstream configured: record the call and consider it delivered
+                for item in items:
+                    self.logger.info(f"{endpoint} - {item['idempotency_key']} {item['payload']}")
+                self._mark(batch, DELIVERED)
+                return
+
+            response = self.session.request(
+                method or 'POST',
+                f"{self.base_url}{path}",
+                json={"items": items},
+                headers={"Idempotency-Key": self._batch_key(items)},
+                timeout=self.timeout
+            )
+
+            if response.status_code < 300:
+                self._mark(batch, DELIVERED)
+            elif response.status_code < 500 and response.status_code not in RETRYABLE_STATUS:
+                self._mark(batch, DEAD, f"HTTP {response.status_code}")
+            else:
+                self._retry(batch, f"HTTP {response.status_code}")
+
+        except requests.RequestException as e:
+            self._retry(batch, str(e))
+        except Exception as e:
+            self.logger.error(f"Outbound delivery error for {endpoint}: {str(e)}")
+            self._retry(batch, str(e))
+
+    @staticmethod
+    def _batch_key(items: List[Dict[str, Any]]) -> str:
+        """Idempotency key of a request; the same messages always get the same key, so a retry is recognisable"""
+        if len(items) == 1:
+            return items[0]["idempotency_key"]
+        keys = "\n".join(sorted(item["idempotency_key"] for item in items))
+        return hashlib.sha256(keys.encode("ascii")).hexdigest()[:32]
+
+    def _mark(self, batch: List[tuple], status: str, error: Optional[str] = None) -> None:
+        now = time.time()
+        self._connect().executemany(
+            "UPDATE outbound SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = ? WHERE id = ?",
+            [(status, error, now, row[0]) for row in batch]
+        )
+        if status == DEAD:
+            self.logger.error(f"Dead-lettered {len(batch)} messages for {batch[0][2]}: {error}")
+
+    def _retry(self, batch: List[tuple], error: str) -> None:
+        """Schedule another attempt with exponential backoff, or dead-letter"""
+        now = time.time()
+        updates = []
+        dead = 0
+
+        # One jitter per batch keeps a retried batch together, so its Idempotency-Key repeats
+        jitter = random.uniform(0.5, 1.0)
+        for row in batch:
+            attempts = row[4] + 1
+            if attempts >= self.max_attempts:
+                updates.append((DEAD, attempts, now, error, now, row[0]))
+                dead += 1
+            else:
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1))) * jitter
+                updates.append((PENDING, attempts, now + delay, error, now, row[0]))
+
+        self._connect().executemany(
+            "UPDATE outbound SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            updates
+        )
+
+        self.logger.warning(f"Delivery to {batch[0][2]} failed ({error}); {len(batch) - dead} retrying, {dead} dead-lettered")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Count queued messages by status"""
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM outbound GROUP BY status").fetchall()
+        counts = {PENDING: 0, INFLIGHT: 0, DELIVERED: 0, DEAD: 0}
+        counts.update({status: count for status, count in rows})
+        return {
+            "running": self.running,
+            "workers": self.worker_count,
+            "base_url": self.base_url or None,
+            "counts": counts
+        }
+
+    def get_dead_letters(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """List dead-lettered messages, newest first"""
+        rows = self._connect().execute(
+            "SELECT idempotency_key, endpoint, payload, attempts, last_error, updated_at FROM outbound "
+            "WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+            (DEAD, limit)
+        ).fetchall()
+        return [
+            {
+                "idempotency_key": row[0],
+                "endpoint": row[1],
+                "payload": json.loads(row[2]),
+                "attempts": row[3],
+                "last_error": row[4],
+                "dead_at": row[5]
+            }
+            for row in rows
+        ]
+
+    def requeue_dead_letters(self) -> int:
+        """Move all dead-lettered messages back to the queue"""
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE outbound SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = ?",
+            (PENDING, now, now, DEAD)
+        )
+        self._wakeup.set()
+        return cursor.rowcount
@@ -0,0 +1,181 @@
+from bisect import bisect_left
+from typing import Dict, Any, List, Optional, Tuple, Iterator
+
+from utils.records import StoredResult, normalize_iso
+
+# Fields with an equality index
+INDEXED_FIELDS = ("document_format", "business_intent", "filename")
+
+# Query parameters understood by every backend
+QUERY_FILTERS = INDEXED_FIELDS + ("min_confidence", "max_confidence", "since", "until")
+
+MAX_PAGE_SIZE = 500
+
+class ClassificationIndex:
+    """
+    Secondary indexes over stored classifications.
+    Each record gets an insertion sequence number; the time index and every
+    equality index are lists of sequence numbers in ascending order, so
+    keyset pagination is a bisect plus a bounded backwards walk.
+    Time bounds in filters are integer nanoseconds.
+
+    Storage times are not in sequence order: concurrent stores take their
+    timestamps before they are indexed, and the wall clock can go back. Time
+    bounds are therefore found by bisecting the running maximum of storage
+    times (nothing before it is late enough) and their running minimum from
+    the end (nothing after it is early enough); records in between are checked
+    one by one by matches_filters.
+    """
+
+    def __init__(self):
+        """Initialize empty indexes"""
+        self.next_seq = 1
+        self.seq_to_id: Dict[int, str] = {}
+        self.id_to_seq: Dict[str, int] = {}
+        self.time_index: List[int] = []
+        self.stored_at: List[int] = []
+        self.stored_at_max: List[int] = []  # Latest storage time up to each position
+        self.stored_at_min: List[int] = []  # Earliest storage time from each position on
+        self.field_indexes: Dict[str, Dict[Any, List[int]]] = {f: {} for f in INDEXED_FIELDS}
+        self.removed = 0
+
+    def add(self, result_id: str, record: StoredResult) -> int:
+        """Index a newly stored record; returns its sequence number"""
+        seq = self.next_seq
+        self.next_seq += 1
+
+        self.seq_to_id[seq] = result_id
+        self.id_to_seq[result_id] = seq
+        self.time_index.append(seq)
+        self._append_time(record.stored_at_ns)
+
+        for field, index in self.field_indexes.items():
+            index.setdefault(getattr(record, field), []).append(seq)
+
+        return seq
+
+    def remove(self, result_id: str) -> None:
+        """Forget a record; index lists are cleaned up lazily by compact()"""
+        seq = self.id_to_seq.pop(result_id, None)
+        if seq is not None:
+            del self.seq_to_id[seq]
+            self.removed += 1
+
+    def compact(self) -> None:
+        """Drop sequence numbers of removed records from every index list"""
+        live = self.seq_to_id
+        keep = [i for i, seq in enumerate(self.time_index) if seq in live]
+        self.time_index = [self.time_index[i] for i in keep]
+        stored_at = [self.stored_at[i] for i in keep]
+        self.stored_at, self.stored_at_max, self.stored_at_min = [], [], []
+        for ns in stored_at:
+            self._append_time(ns)
+
+        for field, index in self.field_indexes.items():
+            self.field_indexes[field] = {
+                value: kept for value, seqs in index.items()
+                if (kept := [s for s in seqs if s in live])
+            }
+
+        self.removed = 0
+
+    def _append_time(self, ns: int) -> None:
+        self.stored_at.append(ns)
+        self.stored_at_max.append(max(ns, self.stored_at_max[-1]) if self.stored_at_max else ns)
+
+        # Only the entries later than this one change, normally the few stored concurrently with it
+        mins = self.stored_at_min
+        i = len(mins) - 1
+        while i >= 0 and mins[i] > ns:
+            mins[i] = ns
+            i -= 1
+        mins.append(ns)
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def scan(self, filters: Dict[str, Any], cursor: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Walk candidate records newest first, starting below the cursor.
+        Index lists are resolved when this is called, so the caller only needs
+        to hold a lock for the call itself, not while iterating.
+
+        Args:
+            filters: Equality filters on indexed fields and since/until bounds (integer nanoseconds)
+            cursor: Sequence number of the last record on the previous page
+
+        Returns:
+            Iterator of (sequence number, result id) for records matching the indexed filters
+        """
+        # Narrow the time window with the time index
+        low_seq = 0
+        high_seq = cursor - 1 if cursor else self.next_seq
+
+        if filters.get("since"):
+            pos = bisect_left(self.stored_at_max, filters["since"])
+            low_seq = self.time_index[pos] if pos < len(self.time_index) else self.next_seq
+        if filters.get("until"):
+            pos = bisect_left(self.stored_at_min, filters["until"])
+            high_seq = min(high_seq, self.time_index[pos] - 1 if pos < len(self.time_index) else high_seq)
+
+        # Pick the smallest candidate list among the equality filters
+        candidates = self.time_index
+        for field in INDEXED_FIELDS:
+            if filters.get(field) is not None:
+                seqs = self.field_indexes[field].get(filters[field], [])
+                if len(seqs) < len(candidates):
+                    candidates = seqs
+
+        start = bisect_left(candidates, high_seq + 1) - 1
+        return _walk(candidates, start, low_seq, self.seq_to_id)
+
+def _walk(candidates: List[int], start: int, low_seq: int, live: Dict[int, str]) -> Iterator[Tuple[int, str]]:
+    for pos in range(start, -1, -1):
+        seq = candidates[pos]
+        if seq < low_seq:
+            break
+        result_id = live.get(seq)
+        if result_id is not None:
+            yield seq, result_id
+
+def clean_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Drop unknown and empty filters and rewrite since/until in the stored
+    timestamp shape, so every backend compares them the same way
+
+    Raises:
+        ValueError: If since or until is not an ISO timestamp
+    """
+    filters = {k: v for k, v in (filters or {}).items() if k in QUERY_FILTERS and v not in (None, "")}
+    for bound in ("since", "until"):
+        if bound in filters:
+            try:
+                filters[bound] = normalize_iso(filters[bound])
+            except (TypeError, ValueError):
+                raise ValueError(f"{bound} must be an ISO timestamp, got {filters[bound]!r}")
+    return filters
+
+def matches_filters(record: StoredResult, filters: Dict[str, Any]) -> bool:
+    """Check a record against every query filter (time bounds in nanoseconds)"""
+    for field in INDEXED_FIELDS:
+        if filters.get(field) is not None and getattr(record, field) != filters[field]:
+            return False
+
+    confidence = record.confidence_score
+    if filters.get("min_confidence") is not None and (confidence is None or confidence < filters["min_confidence"]):
+        return False
+    if filters.get("max_confidence") is not None and (confidence is None or confidence > filters["max_confidence"]):
+        return False
+
+    if filters.get("since") and record.stored_at_ns < filters["since"]:
+        return False
+    if filters.get("until") and record.stored_at_ns >= filters["until"]:
+        return False
+
+    return True
+
+def project(entry: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Keep only the requested top-level fields that are present (the id is always included)"""
+    if not fields:
+        return entry
+    return {"id": entry.get("id"), **{f: entry[f] for f in fields if f in entry}}
@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import itertools
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.json_codec import EncodedJSON
+
+class Vocabulary:
+    """
+    Closed set of string values for a field.
+    Members are interned, so every record holding a value shares one string object.
+    """
+
+    def __init__(self, *values: str):
+        self.members = {v: sys.intern(v) for v in values}
+
+    def __contains__(self, value: Any) -> bool:
+        return value in self.members
+
+    def canonical(self, value: Any) -> Any:
+        """The shared instance of a member, or the value unchanged if it is not one"""
+        if type(value) is str:
+            return self.members.get(value, value)
+        return value
+
+DOCUMENT_FORMATS = Vocabulary("Email", "JSON", "PDF")
+BUSINESS_INTENTS = Vocabulary("RFQ", "Complaint", "Invoice", "Regulation", "Fraud Risk")
+RESULT_TYPES = Vocabulary("classification")
+
+# Trace detail fields that hold vocabulary values
+DETAIL_VOCABULARIES = {"document_format": DOCUMENT_FORMATS, "business_intent": BUSINESS_INTENTS}
+
+def now_ns() -> int:
+    return time.time_ns()
+
+def ns_to_iso(ns: int) -> str:
+    """Local ISO timestamp with microseconds, the shape datetime.now().isoformat() produces"""
+    seconds, rest = divmod(ns, 1_000_000_000)
+    micros = rest // 1000
+    return f"{_second_iso(seconds)}.{micros:06d}" if micros else _second_iso(seconds)
+
+@lru_cache(maxsize=4096)
+def _second_iso(seconds: int) -> str:
+    # Entries read together mostly share their second, so the datetime work is done once per second
+    return datetime.fromtimestamp(seconds).isoformat()
+
+def iso_to_ns(value: str) -> int:
+    """Parse a local ISO timestamp into integer nanoseconds"""
+    parsed = datetime.fromisoformat(value)
+    return int(parsed.replace(microsecond=0).timestamp()) * 1_000_000_000 + parsed.microsecond * 1000
+
+def normalize_iso(value: str) -> str:
+    """
+    Rewrite an ISO timestamp in the local, offset-free shape records are stored
+    with; a UTC offset or trailing Z is converted to local time
+
+    Raises:
+        ValueError: If the value is not an ISO timestamp
+    """
+    return ns_to_iso(iso_to_ns(value))
+
+# Trace log IDs: a per-process sequence behind a prefix of start time and pid, so IDs stay unique
+# across restarts and across the worker processes sharing a store. They are strings, as the uuid4
+# IDs they replace were, so JavaScript clients do not round them.
+def _reset_log_ids() -> None:
+    global _log_prefix, _log_ids
+    _log_prefix = f"{time.time_ns() // 1000:x}-{os.getpid():x}-"
+    _log_ids = itertools.count(1)
+
+_reset_log_ids()
+os.register_at_fork(after_in_child=_reset_log_ids)
+
+def next_log_id() -> str:
+    return f"{_log_prefix}{next(_log_ids):x}"
+
+class TraceEntry:
+    """
+    One trace log entry; converted to its JSON shape only when read.
+    The action and the vocabulary values in details are interned, which
+    matters for entries replayed from the journal, where every string would
+    otherwise be a fresh copy.
+    """
+
+    __slots__ = ("seq", "log_id", "timestamp_ns", "action", "details")
+
+    def __init__(self, action: str, details: Dict[str, Any], timestamp_ns: Optional[int] = None,
+                 log_id: Optional[Any] = None, seq: int = 0):
+        self.action = sys.intern(action)
+        for field, vocabulary in DETAIL_VOCABULARIES.items():
+            if field in details:
+                details[field] = vocabulary.canonical(details[field])
+        self.details = details
+        self.timestamp_ns = timestamp_ns if timestamp_ns is not None else time.time_ns()
+        self.log_id = log_id if log_id is not None else next_log_id()
+        self.seq = seq
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": ns_to_iso(self.timestamp_ns),
+            "action": self.action,
+            "details": self.details,
+            "log_id": self.log_id,
+            "seq": self.seq
+        }
+
+    def to_tuple(self) -> Tuple[Any, int, str, Dict[str, Any]]:
+        """Compact form written to the journal"""
+        return (self.log_id, self.timestamp_ns, self.action, self.details)
+
+    @classmethod
+    def from_tuple(cls, values: Tuple[Any, int, str, Dict[str, Any]]) -> "TraceEntry":
+        log_id, timestamp_ns, action, details = values
+        return cls(action, details, timestamp_ns=timestamp_ns, log_id=log_id)
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, Any]) -> "TraceEntry":
+        return cls(entry["action"], entry.get("details", {}), timestamp_ns=iso_to_ns(entry["timestamp"]),
+                   log_id=entry.get("log_id"))
+
+def blob_ids(entry: Dict[str, Any]) -> Tuple[str, ...]:
+    """IDs of the blobs a stored result's offloaded payloads (<field>_ref handles) point to"""
+    ids = ()
+    for container in (entry, entry.get("specialized_analysis")):
+        if not isinstance(container, dict):
+            continue
+        for key, value in container.items():
+            if key.endswith("_ref") and isinstance(value, dict) and value.get("blob_id"):
+                ids += (value["blob_id"],)
+    return ids
+
+class StoredResult:
+    """
+    A stored classification result.
+    The indexed fields are slots; the full result is encoded to JSON once when
+    it is stored and kept as bytes, so it can be written straight into responses.
+    to_dict() decodes it back.
+
+    Only the slot values are interned (result type, format and intent). Other
+    vocabulary fields such as urgency, severity and tone live inside the
+    encoded bytes, so there are no string objects left to share. The id stays
+    the uuid4 string it is published under.
+    """
+
+    __slots__ = ("id", "stored_at_ns", "result_type", "document_format", "business_intent",
+                 "filename", "confidence_score", "blob_ids", "encoded")
+
+    def __init__(self, entry: Dict[str, Any]):
+        self.id = entry["id"]
+        self.stored_at_ns = iso_to_ns(entry["stored_at"])
+        self.result_type = RESULT_TYPES.canonical(entry.get("result_type", "classification"))
+        self.document_format = DOCUMENT_FORMATS.canonical(entry.get("document_format"))
+        self.business_intent = BUSINESS_INTENTS.canonical(entry.get("business_intent"))
+        self.filename = entry.get("filename")
+        self.confidence_score = entry.get("confidence_score")
+        self.blob_ids = blob_ids(entry)
+        self.encoded = EncodedJSON.encode(entry)
+
+    @property
+    def stored_at(self) -> str:
+        return ns_to_iso(self.stored_at_ns)
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.encoded.body)
+
+    def to_dict(self, only: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        The result in its API shape
+
+        Args:
+            only: Top-level fields to include (the id is always included); all if empty
+        """
+        entry = self.encoded.decode()
+        if only:
+            projected = {"id": self.id}
+            for name in only:
+                if name in entry:
+                    projected[name] = entry[name]
+            return projected
+        return entry
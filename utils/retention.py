@@ -0,0 +1,138 @@
+import os
+import json
+import marshal
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional, Iterable
+
+class RetentionPolicy:
+    """
+    Limits on how many classification results the memory store keeps.
+    A limit of 0 disables it, and every limit is 0 unless set through the
+    environment, so by default nothing is evicted. In "lru" mode the least recently read result is
+    evicted first and the TTL counts from the last access; in "age" mode the
+    oldest result goes first and the TTL counts from when it was stored.
+    """
+
+    def __init__(self, max_records: int = int(os.environ.get("MEMORY_STORE_MAX_RECORDS", 0)),
+                 max_bytes: int = int(os.environ.get("MEMORY_STORE_MAX_BYTES", 0)),
+                 ttl_seconds: float = float(os.environ.get("MEMORY_STORE_TTL_SECONDS", 0)),
+                 eviction: str = os.environ.get("MEMORY_STORE_EVICTION", "lru")):
+        """
+        Initialize the retention policy
+
+        Args:
+            max_records: Maximum number of stored classification results
+            max_bytes: Maximum approximate size of stored classification results
+            ttl_seconds: How long a result is kept after it was stored or last read
+            eviction: "lru" or "age"
+        """
+        if eviction not in ("lru", "age"):
+            raise ValueError(f"Unknown eviction mode: {eviction}")
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.eviction = eviction
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_records or self.max_bytes or self.ttl_seconds)
+
+    def over_limit(self, records: int, size_bytes: int) -> bool:
+        """Whether the count or size caps are exceeded"""
+        return bool((self.max_records and records > self.max_records) or
+                    (self.max_bytes and size_bytes > self.max_bytes))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_records": self.max_records,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "eviction": self.eviction
+        }
+
+def estimate_size(obj: Any) -> int:
+    """Approximate size of a record in bytes, taken as its marshal encoding (JSON if marshal cannot encode it)"""
+    try:
+        return len(marshal.dumps(obj))
+    except ValueError:
+        return len(json.dumps(obj, default=str, separators=(",", ":")))
+
+def estimate_total_size(entries: Iterable[Any], count: int, sample_size: int = 32) -> int:
+    """Extrapolate the size of a collection from a sample of its entries"""
+    sample = [estimate_size(e) for _, e in zip(range(sample_size), entries)]
+    if not sample:
+        return 0
+    return int(sum(sample) / len(sample) * count)
+
+class RetentionSweeper:
+    """
+    Background thread that applies a retention policy to a store backend.
+    It runs every interval, or immediately when woken by a write that pushed
+    the store over its limits.
+    """
+
+    def __init__(self, backend, policy: RetentionPolicy, interval: float = float(os.environ.get("MEMORY_STORE_SWEEP_INTERVAL", 5.0))):
+        """
+        Initialize the sweeper
+
+        Args:
+            backend: StoreBackend exposing enforce_retention()
+            policy: Limits to enforce
+            interval: Seconds between sweeps
+        """
+        self.logger = logging.getLogger(__name__)
+        self.backend = backend
+        self.policy = policy
+        self.interval = interval
+
+        self.runs = 0
+        self.evicted_total = 0
+        self.last_run: Optional[float] = None
+
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the sweeper in this process (threads do not survive fork)"""
+        if self._pid == os.getpid() or not self.policy.enabled:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            threading.Thread(target=self._run, name="memory-store-retention", daemon=True).start()
+            self._pid = os.getpid()
+
+    def wake(self) -> None:
+        """Ask for a sweep without waiting for the next interval"""
+        self._wakeup.set()
+
+    def sweep(self) -> int:
+        """Apply the policy once; returns the number of evicted results"""
+        evicted = self.backend.enforce_retention(self.policy)
+        self.runs += 1
+        self.evicted_total += evicted
+        self.last_run = time.time()
+        if evicted:
+            self.logger.info(f"Retention evicted {evicted} classification results")
+        return evicted
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.sweep()
+            except Exception as e:
+                self.logger.error(f"Retention sweep failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy.to_dict(),
+            "sweeps": self.runs,
+            "evicted_total": self.evicted_total,
+            "last_sweep": self.last_run
+        }
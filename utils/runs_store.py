@@ -1,24 +1,315 @@
-import json
 import os
+import json
+import fcntl
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Iterator
+
+from utils.json_codec import encode_json
 
 RUNS_FILE = 'data/runs.json'
+RUNS_JOURNAL = os.environ.get("RUNS_JOURNAL_PATH", "data/runs.jsonl")
 
-def load_runs():
-    if os.path.exists(RUNS_FILE):
-        with open(RUNS_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+# Compact once the journal is this large and at least half of it is superseded records
+RUNS_JOURNAL_COMPACT_BYTES = int(os.environ.get("RUNS_JOURNAL_COMPACT_BYTES", 8 * 1024 * 1024))
 
-def save_run(run_id, input_data, summary=None):
-    runs = load_runs()
+MAX_RUNS_PAGE_SIZE = 500
+
+class RunJournal:
+    """
+    Append-only JSONL journal of workflow runs.
+    Every save appends one line {"seq", "run_id", ...}; a later line for the
+    same run_id supersedes the earlier ones. Appends are atomic across
+    processes under an exclusive lock on a side file, and each process keeps
+    an offset index it catches up from the file tail before every read.
+    Superseded lines are dropped by background compaction.
+    """
+
+    def __init__(self, path: str = RUNS_JOURNAL, compact_bytes: int = RUNS_JOURNAL_COMPACT_BYTES,
+                 legacy_path: Optional[str] = RUNS_FILE):
+        """
+        Initialize the run journal
+
+        Args:
+            path: JSONL journal file
+            compact_bytes: Journal size from which compaction is considered
+            legacy_path: runs.json to import once when the journal does not exist yet
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.compact_bytes = compact_bytes
+
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._fd = None
+        self._inode = None
+        self._compacting = False
+        self._reset_index()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if legacy_path and not os.path.exists(path):
+            self._import_legacy(legacy_path)
+
+    def _reset_index(self) -> None:
+        # Line positions in file order; a position is live while latest[run_id] still points at its seq
+        self._seqs: List[int] = []
+        self._ids: List[str] = []
+        self._offsets: List[int] = []
+        self._lengths: List[int] = []
+        self._latest: Dict[str, int] = {}
+        self._live_bytes = 0
+        self._end = 0
+
+    @contextmanager
+    def _locked(self, exclusive: bool = False):
+        """flock on a side file; the journal itself is replaced by compaction"""
+        if self._lock_file is None:
+            self._lock_file = open(self.path + ".lock", "a")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _open(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._inode = os.fstat(self._fd).st_ino
+        self._reset_index()
+
+    def _sync(self) -> None:
+        """Index lines appended (or a compaction done) by any process since the last sync; caller holds the locks"""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if self._fd is None or inode != self._inode:
+            self._open()
+
+        size = os.fstat(self._fd).st_size
+        if size <= self._end:
+            return
+
+        data = os.pread(self._fd, size - self._end, self._end)
+        offset = self._end
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # Torn tail from a crashed writer; the next append truncates it
+            try:
+                record = json.loads(line)
+                self._index(record["seq"], record["run_id"], offset, len(line) - 1)
+            except (ValueError, KeyError, TypeError):
+                self.logger.warning(f"Skipping unreadable run journal line at byte {offset}")
+            offset += len(line)
+        self._end = offset
+
+    def _index(self, seq: int, run_id: str, offset: int, length: int) -> None:
+        previous = self._latest.get(run_id)
+        if previous is not None:
+            self._live_bytes -= self._lengths[bisect_left(self._seqs, previous)]
+        self._seqs.append(seq)
+        self._ids.append(run_id)
+        self._offsets.append(offset)
+        self._lengths.append(length)
+        self._latest[run_id] = seq
+        self._live_bytes += length
+
+    def put(self, run_id: str, record: Dict[str, Any]) -> int:
+        """
+        Append a version of a run
+
+        Args:
+            run_id: Run identifier
+            record: Run metadata; replaces any earlier version
+
+        Returns:
+            Sequence number of the written line
+        """
+        with self._lock, self._locked(exclusive=True):
+            self._sync()
+            size = os.fstat(self._fd).st_size
+            if size > self._end:
+                os.truncate(self.path, self._end)
+
+            seq = (self._seqs[-1] if self._seqs else 0) + 1
+            data = encode_json({"seq": seq, "run_id": run_id, **record}) + b"\n"
+            os.write(self._fd, data)
+            self._index(seq, run_id, self._end, len(data) - 1)
+            self._end += len(data)
+
+            due = (self._end >= self.compact_bytes and self._live_bytes * 2 < self._end
+                   and not self._compacting)
+            if due:
+                self._compacting = True
+
+        if due:
+            threading.Thread(target=self._compact_in_background, name="runs-journal-compact", daemon=True).start()
+        return seq
 
-    runs[run_id] = {
-        "run_id": run_id,
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Latest version of a run, or None"""
+        with self._lock, self._locked():
+            self._sync()
+            seq = self._latest.get(run_id)
+            if seq is None:
+                return None
+            pos = bisect_left(self._seqs, seq)
+            return json.loads(os.pread(self._fd, self._lengths[pos], self._offsets[pos]))
+
+    def __len__(self) -> int:
+        with self._lock, self._locked():
+            self._sync()
+            return len(self._latest)
+
+    def version(self) -> int:
+        """Sequence number of the latest save; it changes on every put and survives compaction"""
+        with self._lock, self._locked():
+            self._sync()
+            return self._seqs[-1] if self._seqs else 0
+
+    def page(self, cursor: Optional[int] = None, limit: int = 50) -> Tuple[Iterator[bytes], Optional[int]]:
+        """
+        One page of runs, most recently saved first
+
+        Args:
+            cursor: next_cursor from the previous page
+            limit: Page size, capped at MAX_RUNS_PAGE_SIZE
+
+        Returns:
+            Iterator over the runs as raw JSON lines, and the cursor for the next page (None on the last page)
+        """
+        limit = max(1, min(int(limit), MAX_RUNS_PAGE_SIZE))
+        with self._lock, self._locked():
+            self._sync()
+            pos = bisect_left(self._seqs, cursor) - 1 if cursor else len(self._seqs) - 1
+            spans = []
+            while pos >= 0 and len(spans) < limit:
+                if self._latest.get(self._ids[pos]) == self._seqs[pos]:
+                    spans.append((self._offsets[pos], self._lengths[pos], self._seqs[pos]))
+                pos -= 1
+            # A duplicate descriptor keeps the current file readable even if it is compacted mid-stream
+            fd = os.dup(self._fd)
+
+        next_cursor = spans[-1][2] if len(spans) >= limit else None
+        return _read_spans(fd, spans), next_cursor
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
+        except Exception as e:
+            self.logger.error(f"Run journal compaction failed: {str(e)}")
+        finally:
+            self._compacting = False
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Rewrite the journal with only the latest version of each run.
+        Live lines are copied without holding the lock; the lock is only held
+        to copy whatever was appended meanwhile and swap the files.
+
+        Returns:
+            Journal size before and after
+        """
+        with self._lock, self._locked():
+            self._sync()
+            end = self._end
+            inode = self._inode
+            live = [(self._offsets[i], self._lengths[i]) for i in range(len(self._seqs))
+                    if self._latest.get(self._ids[i]) == self._seqs[i]]
+            fd = os.dup(self._fd)
+
+        tmp_path = f"{self.path}.compact.{os.getpid()}"
+        moved = {}
+        try:
+            with open(tmp_path, "wb") as out:
+                for offset, length in live:
+                    moved[offset] = out.tell()
+                    out.write(os.pread(fd, length + 1, offset))
+                base = out.tell()
+
+                with self._lock, self._locked(exclusive=True):
+                    self._sync()
+                    if self._inode != inode:
+                        # Another process compacted first
+                        os.remove(tmp_path)
+                        return {"before": end, "after": self._end}
+
+                    # Lines appended since the copy started go over as they are
+                    tail_end = self._end
+                    if tail_end > end:
+                        out.write(os.pread(fd, tail_end - end, end))
+                    out.flush()
+                    os.fsync(out.fileno())
+                    os.replace(tmp_path, self.path)
+
+                    # Reindex from the moved offsets instead of parsing the new file
+                    entries = [(self._seqs[i], self._ids[i], self._offsets[i], self._lengths[i])
+                               for i in range(len(self._seqs))
+                               if self._latest.get(self._ids[i]) == self._seqs[i]]
+                    self._open()
+                    for seq, run_id, offset, length in entries:
+                        new_offset = offset - end + base if offset >= end else moved[offset]
+                        self._index(seq, run_id, new_offset, length)
+                    self._end = base + tail_end - end
+        finally:
+            os.close(fd)
+
+        self.logger.info(f"Run journal compacted from {tail_end} to {self._end} bytes")
+        return {"before": tail_end, "after": self._end}
+
+    def _import_legacy(self, legacy_path: str) -> None:
+        """One-time import of a whole-file runs.json"""
+        if not os.path.exists(legacy_path) or not os.path.getsize(legacy_path):
+            return
+        try:
+            with open(legacy_path, "r") as f:
+                runs = json.load(f)
+        except ValueError as e:
+            self.logger.warning(f"Not importing unreadable {legacy_path}: {str(e)}")
+            return
+        for run_id, record in runs.items():
+            self.put(run_id, record if isinstance(record, dict) else {"value": record})
+        self.logger.info(f"Imported {len(runs)} runs from {legacy_path} into {self.path}")
+
+def _read_spans(fd: int, spans: List[Tuple[int, int, int]]) -> Iterator[bytes]:
+    try:
+        for offset, length, _ in spans:
+            yield os.pread(fd, length, offset)
+    finally:
+        os.close(fd)
+
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_run_journal() -> RunJournal:
+    """The process-wide run journal, opened on first use"""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = RunJournal()
+    return _journal
+
+def load_runs() -> Dict[str, Any]:
+    """Latest version of every run, keyed by run ID (reads the whole journal)"""
+    runs = {}
+    journal = get_run_journal()
+    cursor = None
+    while True:
+        lines, cursor = journal.page(cursor, MAX_RUNS_PAGE_SIZE)
+        for line in lines:
+            record = json.loads(line)
+            runs[record["run_id"]] = record
+        if cursor is None:
+            return runs
+
+def save_run(run_id, input_data, summary=None):
+    get_run_journal().put(run_id, {
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "input": input_data,
         "summary": summary
-    }
-
-    with open(RUNS_FILE, 'w') as f:
-        json.dump(runs, f, indent=2)
+    })
@@ -0,0 +1,860 @@
+import os
+import json
+import queue
+import atexit
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Set, Tuple
+
+from utils.trace_buffer import TraceRingBuffer
+from utils.record_index import ClassificationIndex, INDEXED_FIELDS, matches_filters, project
+from utils.retention import RetentionPolicy, estimate_size, estimate_total_size
+from utils.records import StoredResult, TraceEntry, iso_to_ns, blob_ids
+from utils.json_codec import EncodedJSON, encode_json
+
+MEMORY_STORE_DB = 'data/memory_store.db'
+TRACE_LOG_CAPACITY = int(os.environ.get("TRACE_LOG_CAPACITY", 10000))
+
+class StoreBackend:
+    """
+    Storage interface behind MemoryStore.
+    Holds classification results, trace logs and agent states.
+    """
+
+    def put_classification(self, result_id: str, entry: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def get_classification(self, result_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def list_classifications(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def count_classifications(self) -> int:
+        raise NotImplementedError
+
+    def referenced_blobs(self) -> Set[str]:
+        """IDs of the blobs stored classification results point to"""
+        return {blob_id for entry in self.list_classifications() for blob_id in blob_ids(entry)}
+
+    def query_classifications(self, filters: Dict[str, Any], fields: Optional[List[str]] = None,
+                              cursor: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Filtered classifications, newest first, with the cursor for the next page (None on the last page)"""
+        raise NotImplementedError
+
+    def get_encoded_classification(self, result_id: str) -> Optional[EncodedJSON]:
+        """A classification as the JSON bytes it was stored as"""
+        raise NotImplementedError
+
+    def query_encoded_classifications(self, filters: Dict[str, Any], cursor: Optional[int] = None,
+                                      limit: int = 50) -> Tuple[List[EncodedJSON], Optional[int]]:
+        """Like query_classifications, returning each record as its stored JSON bytes"""
+        raise NotImplementedError
+
+    def append_trace_log(self, entry: TraceEntry) -> None:
+        raise NotImplementedError
+
+    def list_trace_logs(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Trace logs, most recent first"""
+        raise NotImplementedError
+
+    def trace_logs_since(self, cursor: int, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """Trace logs after a sequence cursor, oldest first, with the next cursor and a truncation flag"""
+        raise NotImplementedError
+
+    def count_trace_logs(self) -> int:
+        raise NotImplementedError
+
+    def put_agent_state(self, agent_name: str, entry: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def get_agent_state(self, agent_name: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def count_agent_states(self) -> int:
+        raise NotImplementedError
+
+    def list_agent_states(self) -> List[Tuple[str, Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def increment_counters(self, increments: Dict[str, int]) -> None:
+        """Add to named statistics counters"""
+        raise NotImplementedError
+
+    def get_counters(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def prune_counters(self, cutoffs: Dict[str, str]) -> None:
+        """Drop rollup counters whose key sorts below the cutoff for its scope prefix"""
+        raise NotImplementedError
+
+    def snapshot_state(self) -> Tuple[List[Any], List[TraceEntry], List[Tuple[str, Dict[str, Any]]], Dict[str, int]]:
+        """
+        The whole contents for a journal snapshot, taken while writes are paused.
+        Backends return their stored objects where they can, so nothing is
+        decoded until the snapshot is written after writes resume.
+
+        Returns:
+            Classifications as dicts or StoredResults and trace entries, both
+            oldest first, then agent states and counters
+        """
+        return (self.list_classifications(), [TraceEntry.from_dict(e) for e in reversed(self.list_trace_logs())],
+                self.list_agent_states(), self.get_counters())
+
+    def enforce_retention(self, policy: RetentionPolicy) -> int:
+        """Evict classification results beyond the policy limits; returns how many were evicted"""
+        raise NotImplementedError
+
+    def is_over_limit(self, policy: RetentionPolicy) -> bool:
+        """Cheap check whether a sweep is needed right away"""
+        return False
+
+    def memory_usage(self) -> Dict[str, Dict[str, int]]:
+        """Record count and approximate bytes per collection"""
+        raise NotImplementedError
+
+    def version(self, collection: str) -> int:
+        """
+        Number that changes whenever the "classifications" or "trace_logs" collection changes.
+        It never repeats for a backend, even after clear, so it can back HTTP validators.
+        """
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release resources; pending writes are flushed first"""
+        pass
+
+class _Shard:
+    """One lock stripe of the in-memory classification store"""
+
+    __slots__ = ("lock", "records", "sizes", "touched", "total_bytes")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records: "OrderedDict[str, StoredResult]" = OrderedDict()  # Eviction order first
+        self.sizes: Dict[str, int] = {}
+        self.touched: Dict[str, float] = {}
+        self.total_bytes = 0
+
+class InMemoryBackend(StoreBackend):
+    """
+    Process-local dictionaries and a bounded trace log ring buffer.
+    Classification results are split over lock stripes by result ID; stored
+    records are never mutated, so reads take no lock. Results are kept as
+    slotted records around their encoded JSON and trace logs as slotted
+    entries; both are turned back into dicts only when read as dicts.
+    """
+
+    def __init__(self, trace_capacity: int = TRACE_LOG_CAPACITY, eviction: str = "lru",
+                 stripes: int = int(os.environ.get("MEMORY_STORE_LOCK_STRIPES", 16))):
+        self.shards = [_Shard() for _ in range(max(1, stripes))]  # Classification results
+        self.index = ClassificationIndex()                         # Secondary indexes over classifications
+        self.trace_logs = TraceRingBuffer(trace_capacity)          # System trace logs
+        self.agent_states = {}                                     # Agent state information
+        self.counters = {}                                         # Statistics counters and rollups
+
+        # Retention reads and refreshes access times only in LRU mode
+        self.track_access = eviction == "lru"
+
+        # Versions start from the clock so tags from another process or an earlier run never match;
+        # the classification version is bumped under the index lock on every insert and removal
+        self._version_epoch = time.time_ns()
+        self._classification_version = self._version_epoch
+
+        # Short critical sections over structures shared by every stripe
+        self._index_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    def _shard(self, result_id: str) -> _Shard:
+        return self.shards[hash(result_id) % len(self.shards)]
+
+    def put_classification(self, result_id, entry):
+        record = StoredResult(entry)
+        size = record.size_bytes
+        shard = self._shard(result_id)
+        with shard.lock:
+            if result_id in shard.records:
+                self._remove(shard, result_id)
+            shard.records[result_id] = record
+            shard.sizes[result_id] = size
+            shard.touched[result_id] = time.monotonic()
+            shard.total_bytes += size
+            with self._index_lock:
+                self.index.add(result_id, record)
+                self._classification_version += 1
+
+    def get_classification(self, result_id):
+        record = self._get_record(result_id)
+        return record.to_dict() if record else None
+
+    def get_encoded_classification(self, result_id):
+        record = self._get_record(result_id)
+        return record.encoded if record else None
+
+    def _get_record(self, result_id: str) -> Optional[StoredResult]:
+        shard = self._shard(result_id)
+        record = shard.records.get(result_id)
+        if record is None:
+            return None
+
+        # Refreshing LRU order is best effort: skip it rather than wait on a busy stripe
+        if self.track_access and shard.lock.acquire(blocking=False):
+            try:
+                if result_id in shard.records:
+                    shard.records.move_to_end(result_id)
+                    shard.touched[result_id] = time.monotonic()
+            finally:
+                shard.lock.release()
+        return record
+
+    def _lookup(self, result_id: str) -> Optional[StoredResult]:
+        """Lock-free read that leaves LRU order alone"""
+        return self._shard(result_id).records.get(result_id)
+
+    def list_classifications(self):
+        with self._index_lock:
+            ids = [result_id for _, result_id in self.index.scan({})]
+        records = [self._lookup(result_id) for result_id in reversed(ids)]
+        return [r.to_dict() for r in records if r is not None]
+
+    def count_classifications(self):
+        return sum(len(shard.records) for shard in self.shards)
+
+    def referenced_blobs(self):
+        live = set()
+        for shard in self.shards:
+            with shard.lock:
+                records = list(shard.records.values())
+            for record in records:
+                live.update(record.blob_ids)
+        return live
+
+    def query_classifications(self, filters, fields=None, cursor=None, limit=50):
+        records, next_cursor = self._query_records(filters, cursor, limit)
+        return [record.to_dict(fields) for record in records], next_cursor
+
+    def query_encoded_classifications(self, filters, cursor=None, limit=50):
+        records, next_cursor = self._query_records(filters, cursor, limit)
+        return [record.encoded for record in records], next_cursor
+
+    def _query_records(self, filters: Dict[str, Any], cursor: Optional[int],
+                       limit: int) -> Tuple[List[StoredResult], Optional[int]]:
+        # Records keep integer timestamps, so the time bounds are converted once per query
+        filters = dict(filters)
+        for bound in ("since", "until"):
+            if filters.get(bound):
+                filters[bound] = iso_to_ns(filters[bound])
+
+        with self._index_lock:
+            candidates = self.index.scan(filters, cursor)
+
+        records = []
+        for seq, result_id in candidates:
+            record = self._lookup(result_id)
+            if record is None or not matches_filters(record, filters):
+                continue
+            records.append(record)
+            if len(records) >= limit:
+                return records, seq
+        return records, None
+
+    def _remove(self, shard: _Shard, result_id: str) -> None:
+        """Drop a result and its bookkeeping; caller holds the shard lock"""
+        del shard.records[result_id]
+        shard.total_bytes -= shard.sizes.pop(result_id, 0)
+        shard.touched.pop(result_id, None)
+        with self._index_lock:
+            self.index.remove(result_id)
+            self._classification_version += 1
+            if self.index.removed > max(1024, len(self.index.seq_to_id)):
+                self.index.compact()
+
+    def _total_bytes(self) -> int:
+        return sum(shard.total_bytes for shard in self.shards)
+
+    def _evict_oldest(self, cutoff: Optional[float] = None) -> bool:
+        """Evict the stripe head touched longest ago, if any (and if older than the cutoff)"""
+        oldest_shard, oldest_id, oldest_time = None, None, None
+        for shard in self.shards:
+            with shard.lock:
+                if not shard.records:
+                    continue
+                result_id = next(iter(shard.records))
+                touched = shard.touched.get(result_id, 0)
+            if oldest_time is None or touched < oldest_time:
+                oldest_shard, oldest_id, oldest_time = shard, result_id, touched
+
+        if oldest_shard is None or (cutoff is not None and oldest_time >= cutoff):
+            return False
+        with oldest_shard.lock:
+            if oldest_id in oldest_shard.records:
+                self._remove(oldest_shard, oldest_id)
+        return True
+
+    def enforce_retention(self, policy):
+        evicted = 0
+        with self._evict_lock:
+            # Each stripe head is the next result to evict from that stripe in both modes
+            if policy.ttl_seconds:
+                cutoff = time.monotonic() - policy.ttl_seconds
+                while self._evict_oldest(cutoff):
+                    evicted += 1
+
+            while policy.over_limit(self.count_classifications(), self._total_bytes()):
+                if not self._evict_oldest():
+                    break
+                evicted += 1
+        return evicted
+
+    def is_over_limit(self, policy):
+        return policy.over_limit(self.count_classifications(), self._total_bytes())
+
+    def version(self, collection):
+        if collection == "trace_logs":
+            # Sequence numbers keep increasing across clears
+            return self._version_epoch + self.trace_logs.last_seq
+        return self._classification_version
+
+    def append_trace_log(self, entry):
+        self.trace_logs.append(entry)
+
+    def list_trace_logs(self, limit=None):
+        return [entry.to_dict() for entry in self.trace_logs.latest(limit)]
+
+    def trace_logs_since(self, cursor, limit=None):
+        entries, next_cursor, truncated = self.trace_logs.since(cursor, limit)
+        return [entry.to_dict() for entry in entries], next_cursor, truncated
+
+    def count_trace_logs(self):
+        return len(self.trace_logs)
+
+    def put_agent_state(self, agent_name, entry):
+        self.agent_states[agent_name] = entry
+
+    def get_agent_state(self, agent_name):
+        return self.agent_states.get(agent_name)
+
+    def count_agent_states(self):
+        return len(self.agent_states)
+
+    def list_agent_states(self):
+        return list(self.agent_states.items())
+
+    def increment_counters(self, increments):
+        with self._counter_lock:
+            counters = self.counters
+            for key, value in increments.items():
+                counters[key] = counters.get(key, 0) + value
+
+    def get_counters(self):
+        with self._counter_lock:
+            return dict(self.counters)
+
+    def snapshot_state(self):
+        # Stored records are never mutated, so references are a consistent copy
+        with self._index_lock:
+            ids = [result_id for _, result_id in self.index.scan({})]
+        records = [record for record in map(self._lookup, reversed(ids)) if record is not None]
+        trace_entries = self.trace_logs.latest()
+        trace_entries.reverse()
+        return records, trace_entries, list(self.agent_states.items()), self.get_counters()
+
+    def prune_counters(self, cutoffs):
+        with self._counter_lock:
+            self.counters = {
+                key: value for key, value in self.counters.items()
+                if not (key[0] in cutoffs and key < cutoffs[key[0]])
+            }
+
+    def memory_usage(self):
+        trace_count = len(self.trace_logs)
+        return {
+            "classifications": {"records": self.count_classifications(), "bytes": self._total_bytes()},
+            "trace_logs": {
+                "records": trace_count,
+                "bytes": estimate_total_size([e.to_dict() for e in self.trace_logs.latest(32)], trace_count)
+            },
+            "agent_states": {
+                "records": len(self.agent_states),
+                "bytes": sum(estimate_size(s) for s in list(self.agent_states.values()))
+            },
+            "counters": {
+                "records": len(self.counters),
+                "bytes": estimate_total_size(list(self.get_counters().items())[:32], len(self.counters))
+            }
+        }
+
+    def clear(self):
+        for shard in self.shards:
+            with shard.lock:
+                shard.records.clear()
+                shard.sizes.clear()
+                shard.touched.clear()
+                shard.total_bytes = 0
+        with self._index_lock:
+            self.index.clear()
+            self._classification_version += 1
+        self.trace_logs.clear()
+        self.agent_states.clear()
+        with self._counter_lock:
+            self.counters.clear()
+
+# Statements are module constants so each connection's statement cache reuses them
+_SQL_INSERT_CLASSIFICATION = (
+    "INSERT OR REPLACE INTO classifications "
+    "(id, stored_at, document_format, business_intent, filename, confidence_score, size_bytes, body) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_SQL_GET_CLASSIFICATION = "SELECT body FROM classifications WHERE id = ?"
+_SQL_LIST_CLASSIFICATIONS = "SELECT body FROM classifications ORDER BY rowid"
+_SQL_COUNT_CLASSIFICATIONS = "SELECT COUNT(*) FROM classifications"
+_SQL_LIST_BLOB_REFERENCES = "SELECT body FROM classifications WHERE body LIKE '%\"blob_id\"%'"
+_SQL_QUERY_CLASSIFICATIONS = "SELECT rowid, body FROM classifications WHERE {where} ORDER BY rowid DESC LIMIT ?"
+_SQL_INSERT_TRACE = "INSERT INTO trace_logs (log_id, timestamp, action, body) VALUES (?, ?, ?, ?)"
+_SQL_LIST_TRACE = "SELECT seq, body FROM trace_logs ORDER BY seq DESC LIMIT ?"
+_SQL_TRACE_SINCE = "SELECT seq, body FROM trace_logs WHERE seq > ? ORDER BY seq LIMIT ?"
+_SQL_TRACE_BOUNDS = "SELECT MIN(seq), MAX(seq) FROM trace_logs"
+_SQL_TRIM_TRACE = "DELETE FROM trace_logs WHERE seq <= (SELECT MAX(seq) FROM trace_logs) - ?"
+_SQL_COUNT_TRACE = "SELECT COUNT(*) FROM trace_logs"
+_SQL_PUT_AGENT_STATE = "INSERT OR REPLACE INTO agent_states (agent_name, body) VALUES (?, ?)"
+_SQL_GET_AGENT_STATE = "SELECT body FROM agent_states WHERE agent_name = ?"
+_SQL_COUNT_AGENT_STATES = "SELECT COUNT(*) FROM agent_states"
+_SQL_LIST_AGENT_STATES = "SELECT agent_name, body FROM agent_states"
+_SQL_INCREMENT_COUNTER = (
+    "INSERT INTO counters (key, value) VALUES (?, ?) "
+    "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value"
+)
+_SQL_GET_COUNTERS = "SELECT key, value FROM counters"
+_SQL_PRUNE_COUNTERS = "DELETE FROM counters WHERE key >= ? AND key < ?"
+_SQL_EXPIRE_CLASSIFICATIONS = "DELETE FROM classifications WHERE stored_at < ?"
+_SQL_CAP_CLASSIFICATION_COUNT = (
+    "DELETE FROM classifications WHERE rowid <= "
+    "(SELECT rowid FROM classifications ORDER BY rowid DESC LIMIT 1 OFFSET ?)"
+)
+_SQL_CAP_CLASSIFICATION_BYTES = (
+    "DELETE FROM classifications WHERE rowid IN (SELECT rowid FROM ("
+    "SELECT rowid, SUM(COALESCE(size_bytes, length(body))) OVER (ORDER BY rowid DESC) AS running "
+    "FROM classifications) WHERE running > ?)"
+)
+_SQL_BUMP_VERSION = (
+    "INSERT INTO versions (collection, value) VALUES (?, 1) "
+    "ON CONFLICT(collection) DO UPDATE SET value = value + 1"
+)
+_SQL_GET_VERSION = "SELECT value FROM versions WHERE collection = ?"
+_SQL_TRACE_VERSION = "SELECT seq FROM sqlite_sequence WHERE name = 'trace_logs'"
+_SQL_CLASSIFICATION_USAGE = "SELECT COUNT(*), COALESCE(SUM(COALESCE(size_bytes, length(body))), 0) FROM classifications"
+_SQL_TRACE_USAGE = "SELECT COUNT(*), COALESCE(SUM(length(body)), 0) FROM trace_logs"
+_SQL_AGENT_STATE_USAGE = "SELECT COUNT(*), COALESCE(SUM(length(body)), 0) FROM agent_states"
+
+class _PendingWrite:
+    """Completion of a write someone is waiting on, with the error that failed it"""
+    __slots__ = ("done", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: Optional[Exception] = None
+
+class SQLiteBackend(StoreBackend):
+    """
+    Embedded SQLite database in WAL mode, shared by every worker process.
+    Writes go through a single writer thread that commits them in batches;
+    classification inserts block until their batch is committed, trace logs
+    and agent states are write-behind. A batch that fails is retried one
+    write at a time, so only the failing write is lost, and a caller waiting
+    on it gets its exception.
+    """
+
+    def __init__(self, db_path: str = MEMORY_STORE_DB, batch_size: int = 256, flush_interval: float = 0.005,
+                 trace_capacity: int = TRACE_LOG_CAPACITY):
+        """
+        Initialize the SQLite backend
+
+        Args:
+            db_path: Database file, shared by all processes using the store
+            batch_size: Maximum writes committed in one transaction
+            flush_interval: How long the writer waits to gather a batch
+            trace_capacity: Number of most recent trace logs kept
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.trace_capacity = trace_capacity
+
+        self._local = threading.local()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Per-thread connection; the sqlite3 statement cache acts as prepared statements"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self) -> None:
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS classifications (
+                id TEXT PRIMARY KEY,
+                stored_at TEXT NOT NULL,
+                document_format TEXT,
+                business_intent TEXT,
+                filename TEXT,
+                confidence_score REAL,
+                size_bytes INTEGER,
+                body TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS trace_logs (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                log_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                action TEXT NOT NULL,
+                body TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS agent_states (
+                agent_name TEXT PRIMARY KEY,
+                body TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS counters (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS versions (
+                collection TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        """)
+
+        # Databases from older versions lack the query and retention columns
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(classifications)")}
+        if "confidence_score" not in columns:
+            conn.execute("ALTER TABLE classifications ADD COLUMN confidence_score REAL")
+        if "size_bytes" not in columns:
+            conn.execute("ALTER TABLE classifications ADD COLUMN size_bytes INTEGER")
+
+        # Each index implicitly ends in rowid, so filtered keyset pages are index range scans
+        conn.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_classifications_format ON classifications (document_format);
+            CREATE INDEX IF NOT EXISTS idx_classifications_intent ON classifications (business_intent);
+            CREATE INDEX IF NOT EXISTS idx_classifications_filename ON classifications (filename);
+            CREATE INDEX IF NOT EXISTS idx_classifications_stored_at ON classifications (stored_at);
+        """)
+
+    def _ensure_writer(self) -> None:
+        """Start the writer thread in this process (threads do not survive fork)"""
+        if self._writer_pid == os.getpid():
+            return
+        with self._writer_lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            threading.Thread(target=self._run_writer, name="memory-store-writer", daemon=True).start()
+            self._writer_pid = os.getpid()
+
+            # Write-behind entries must reach the database before the process exits
+            atexit.register(self.flush)
+
+    def _submit(self, sql: str, params: tuple, wait: bool) -> None:
+        self._ensure_writer()
+        pending = _PendingWrite() if wait else None
+        self._queue.put((sql, params, pending))
+        if pending:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+
+    def _run_writer(self) -> None:
+        """Drain queued writes and commit them in batches"""
+        write_queue = self._queue
+        while True:
+            item = write_queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            try:
+                while len(batch) < self.batch_size:
+                    next_item = write_queue.get(timeout=self.flush_interval)
+                    if next_item is None:
+                        write_queue.put(None)
+                        break
+                    batch.append(next_item)
+            except queue.Empty:
+                pass
+
+            self._commit(batch)
+
+    def _commit(self, batch: List[tuple]) -> None:
+        conn = self._connect()
+        try:
+            self._execute_batch(conn, batch)
+        except Exception as e:
+            failures = [(batch[0], e)] if len(batch) == 1 else []
+            if len(batch) > 1:
+                # One bad write must not take the rest of the batch with it
+                self.logger.warning(f"Memory store batch write failed ({len(batch)} writes), retrying singly: {str(e)}")
+                for item in batch:
+                    try:
+                        self._execute_batch(conn, [item])
+                    except Exception as item_error:
+                        failures.append((item, item_error))
+            for (_, _, pending), error in failures:
+                self.logger.error(f"Memory store write failed: {str(error)}")
+                if pending:
+                    pending.error = error
+        finally:
+            for _, _, pending in batch:
+                if pending:
+                    pending.done.set()
+
+    def _execute_batch(self, conn: sqlite3.Connection, batch: List[tuple]) -> None:
+        """Run writes in one transaction, rolling it back if any of them fails"""
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, params, _ in batch:
+                if sql is None:
+                    continue
+                if isinstance(params, list):
+                    conn.executemany(sql, params)
+                else:
+                    conn.execute(sql, params)
+            # Keep the trace log bounded like a ring buffer
+            if any(sql == _SQL_INSERT_TRACE for sql, _, _ in batch):
+                conn.execute(_SQL_TRIM_TRACE, (self.trace_capacity,))
+            if any(sql == _SQL_INSERT_CLASSIFICATION for sql, _, _ in batch):
+                conn.execute(_SQL_BUMP_VERSION, ("classifications",))
+            conn.execute("COMMIT")
+        except Exception:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            raise
+
+    def flush(self) -> None:
+        """Wait until every write queued so far is committed"""
+        if self._writer_pid == os.getpid():
+            self._submit(None, (), wait=True)
+
+    def put_classification(self, result_id, entry):
+        body = encode_json(entry).decode("utf-8")
+        self._submit(_SQL_INSERT_CLASSIFICATION, (
+            result_id,
+            entry.get("stored_at"),
+            entry.get("document_format"),
+            entry.get("business_intent"),
+            entry.get("filename"),
+            entry.get("confidence_score"),
+            len(body),
+            body
+        ), wait=True)
+
+    def get_classification(self, result_id):
+        row = self._connect().execute(_SQL_GET_CLASSIFICATION, (result_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_encoded_classification(self, result_id):
+        row = self._connect().execute(_SQL_GET_CLASSIFICATION, (result_id,)).fetchone()
+        return EncodedJSON.from_bytes(row[0].encode("utf-8")) if row else None
+
+    def list_classifications(self):
+        return [json.loads(row[0]) for row in self._connect().execute(_SQL_LIST_CLASSIFICATIONS)]
+
+    def count_classifications(self):
+        return self._connect().execute(_SQL_COUNT_CLASSIFICATIONS).fetchone()[0]
+
+    def referenced_blobs(self):
+        return {blob_id for (body,) in self._connect().execute(_SQL_LIST_BLOB_REFERENCES)
+                for blob_id in blob_ids(json.loads(body))}
+
+    def query_classifications(self, filters, fields=None, cursor=None, limit=50):
+        rows = self._query_rows(filters, cursor, limit)
+        records = [project(json.loads(body), fields) for _, body in rows]
+        return records, (rows[-1][0] if len(rows) >= limit else None)
+
+    def query_encoded_classifications(self, filters, cursor=None, limit=50):
+        rows = self._query_rows(filters, cursor, limit)
+        records = [EncodedJSON.from_bytes(body.encode("utf-8")) for _, body in rows]
+        return records, (rows[-1][0] if len(rows) >= limit else None)
+
+    def _query_rows(self, filters: Dict[str, Any], cursor: Optional[int], limit: int) -> List[Tuple[int, str]]:
+        clauses, params = [], []
+        if cursor:
+            clauses.append("rowid < ?")
+            params.append(cursor)
+        for field in INDEXED_FIELDS:
+            if filters.get(field) is not None:
+                clauses.append(f"{field} = ?")
+                params.append(filters[field])
+        if filters.get("min_confidence") is not None:
+            clauses.append("confidence_score >= ?")
+            params.append(filters["min_confidence"])
+        if filters.get("max_confidence") is not None:
+            clauses.append("confidence_score <= ?")
+            params.append(filters["max_confidence"])
+        if filters.get("since"):
+            clauses.append("stored_at >= ?")
+            params.append(filters["since"])
+        if filters.get("until"):
+            clauses.append("stored_at < ?")
+            params.append(filters["until"])
+
+        sql = _SQL_QUERY_CLASSIFICATIONS.format(where=" AND ".join(clauses) or "1")
+        return self._connect().execute(sql, (*params, limit)).fetchall()
+
+    def append_trace_log(self, entry):
+        body = entry.to_dict()
+        del body["seq"]
+        self._submit(_SQL_INSERT_TRACE, (
+            entry.log_id,
+            body["timestamp"],
+            entry.action,
+            json.dumps(body, default=str)
+        ), wait=False)
+
+    def list_trace_logs(self, limit=None):
+        self.flush()
+        rows = self._connect().execute(_SQL_LIST_TRACE, (limit if limit else -1,))
+        return [{**json.loads(body), "seq": seq} for seq, body in rows]
+
+    def trace_logs_since(self, cursor, limit=None):
+        self.flush()
+        conn = self._connect()
+        first, last = conn.execute(_SQL_TRACE_BOUNDS).fetchone()
+        if last is not None and cursor > last:
+            # Cursor from before the log was cleared: replay everything retained
+            cursor = 0
+        truncated = first is not None and cursor + 1 < first
+
+        rows = conn.execute(_SQL_TRACE_SINCE, (cursor, limit if limit else -1)).fetchall()
+        entries = [{**json.loads(body), "seq": seq} for seq, body in rows]
+        return entries, (entries[-1]["seq"] if entries else cursor), truncated
+
+    def count_trace_logs(self):
+        self.flush()
+        return self._connect().execute(_SQL_COUNT_TRACE).fetchone()[0]
+
+    def put_agent_state(self, agent_name, entry):
+        self._submit(_SQL_PUT_AGENT_STATE, (agent_name, json.dumps(entry, default=str)), wait=False)
+
+    def get_agent_state(self, agent_name):
+        self.flush()
+        row = self._connect().execute(_SQL_GET_AGENT_STATE, (agent_name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count_agent_states(self):
+        self.flush()
+        return self._connect().execute(_SQL_COUNT_AGENT_STATES).fetchone()[0]
+
+    def list_agent_states(self):
+        self.flush()
+        return [(name, json.loads(body)) for name, body in self._connect().execute(_SQL_LIST_AGENT_STATES)]
+
+    def increment_counters(self, increments):
+        self._submit(_SQL_INCREMENT_COUNTER, list(increments.items()), wait=False)
+
+    def get_counters(self):
+        self.flush()
+        return dict(self._connect().execute(_SQL_GET_COUNTERS).fetchall())
+
+    def prune_counters(self, cutoffs):
+        self._submit(_SQL_PRUNE_COUNTERS, [(f"{scope}|", cutoff) for scope, cutoff in cutoffs.items()], wait=False)
+
+    def enforce_retention(self, policy):
+        # Results are never read through a shared access order here, so eviction is always by age
+        conn = self._connect()
+        before = conn.execute(_SQL_COUNT_CLASSIFICATIONS).fetchone()[0]
+        changes_before = conn.total_changes
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if policy.ttl_seconds:
+                cutoff = (datetime.now() - timedelta(seconds=policy.ttl_seconds)).isoformat()
+                conn.execute(_SQL_EXPIRE_CLASSIFICATIONS, (cutoff,))
+            if policy.max_records:
+                conn.execute(_SQL_CAP_CLASSIFICATION_COUNT, (policy.max_records,))
+            if policy.max_bytes:
+                conn.execute(_SQL_CAP_CLASSIFICATION_BYTES, (policy.max_bytes,))
+            if conn.total_changes != changes_before:
+                conn.execute(_SQL_BUMP_VERSION, ("classifications",))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return before - conn.execute(_SQL_COUNT_CLASSIFICATIONS).fetchone()[0]
+
+    def version(self, collection):
+        self.flush()
+        conn = self._connect()
+        if collection == "trace_logs":
+            # AUTOINCREMENT never reuses a sequence number, even after the table is emptied
+            row = conn.execute(_SQL_TRACE_VERSION).fetchone()
+        else:
+            row = conn.execute(_SQL_GET_VERSION, (collection,)).fetchone()
+        return row[0] if row else 0
+
+    def memory_usage(self):
+        self.flush()
+        conn = self._connect()
+        usage = {}
+        for collection, sql in (("classifications", _SQL_CLASSIFICATION_USAGE),
+                                ("trace_logs", _SQL_TRACE_USAGE),
+                                ("agent_states", _SQL_AGENT_STATE_USAGE)):
+            records, size_bytes = conn.execute(sql).fetchone()
+            usage[collection] = {"records": records, "bytes": size_bytes}
+
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        usage["database_file"] = {"records": None, "bytes": page_count * page_size}
+        return usage
+
+    def clear(self):
+        self.flush()
+        self._connect().executescript(
+            "BEGIN; DELETE FROM classifications; DELETE FROM trace_logs; DELETE FROM agent_states; "
+            "DELETE FROM counters; "
+            "INSERT INTO versions (collection, value) VALUES ('classifications', 1) "
+            "ON CONFLICT(collection) DO UPDATE SET value = value + 1; COMMIT;"
+        )
+
+    def close(self):
+        self.flush()
+        if self._writer_pid == os.getpid():
+            self._queue.put(None)
+            self._writer_pid = None
+
+def create_backend(kind: Optional[str] = None, policy: Optional[RetentionPolicy] = None) -> StoreBackend:
+    """
+    Build the storage backend selected by MEMORY_STORE_BACKEND
+
+    Args:
+        kind: "memory" or "sqlite"; defaults to the environment setting
+        policy: Retention policy, used to pick the in-memory eviction order
+
+    Returns:
+        Configured backend instance
+    """
+    kind = (kind or os.environ.get("MEMORY_STORE_BACKEND", "memory")).lower()
+
+    if kind == "memory":
+        return InMemoryBackend(eviction=policy.eviction if policy else "lru")
+    if kind == "sqlite":
+        return SQLiteBackend(os.environ.get("MEMORY_STORE_PATH", MEMORY_STORE_DB))
+
+    raise ValueError(f"Unknown memory store backend: {kind}")
@@ -0,0 +1,274 @@
+import os
+import re
+import json
+import mmap
+import zlib
+import fcntl
+import struct
+import marshal
+import logging
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple, Iterator
+
+JOURNAL_COMPACT_BYTES = int(os.environ.get("MEMORY_STORE_JOURNAL_COMPACT_BYTES", 64 * 1024 * 1024))
+
+# Journal operations
+OP_PUT_CLASSIFICATION = 1
+OP_TRACE_LOG = 2
+OP_AGENT_STATE = 3
+OP_COUNTERS = 4
+OP_PRUNE_COUNTERS = 5
+OP_CLEAR = 6
+
+# Every record is framed as (op, payload length, crc32 of payload) followed by a marshal payload
+_FRAME = struct.Struct("<BII")
+
+# Snapshot header: magic, marshal format version, journal generation it precedes
+_SNAPSHOT_MAGIC = b"FBSNAP01"
+_SNAPSHOT_HEADER = struct.Struct("<8sII")
+
+_JOURNAL_NAME = re.compile(r"^journal-(\d+)\.bin$")
+
+def _encode(payload: Any) -> bytes:
+    try:
+        return marshal.dumps(payload)
+    except ValueError:
+        # Values marshal cannot encode (datetimes and the like) are stored as their JSON form
+        return marshal.dumps(json.loads(json.dumps(payload, default=str)))
+
+def _iter_frames(data, offset: int = 0) -> Iterator[Tuple[int, Any, int]]:
+    """Decode frames from a buffer, stopping at the first torn or corrupt one; yields (op, payload, end offset)"""
+    size = len(data)
+    while offset + _FRAME.size <= size:
+        op, length, crc = _FRAME.unpack_from(data, offset)
+        start = offset + _FRAME.size
+        end = start + length
+        if end > size:
+            return
+        body = data[start:end]
+        if zlib.crc32(body) != crc:
+            return
+        yield op, marshal.loads(body), end
+        offset = end
+
+class _WriteGate:
+    """Many concurrent mutations, or one exclusive snapshot capture"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._active = 0
+        self._exclusive = False
+
+    def acquire_shared(self) -> None:
+        with self._cond:
+            while self._exclusive:
+                self._cond.wait()
+            self._active += 1
+
+    def release_shared(self) -> None:
+        with self._cond:
+            self._active -= 1
+            if not self._active and self._exclusive:
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            while self._exclusive:
+                self._cond.wait()
+            self._exclusive = True
+            while self._active:
+                self._cond.wait()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+class StoreJournal:
+    """
+    Append-only binary journal of memory store mutations with snapshot compaction.
+    The directory holds snapshot.bin and journal-<generation>.bin files; the
+    snapshot covers everything before the generation recorded in its header.
+    Only one process may own a journal directory at a time.
+
+    Appends reach the operating system before the mutation returns but are not
+    fsynced: a crashed process loses nothing, a power failure or kernel crash
+    can lose the most recent mutations. Snapshots and close() are fsynced.
+    """
+
+    def __init__(self, directory: str, compact_bytes: int = JOURNAL_COMPACT_BYTES):
+        """
+        Initialize the journal
+
+        Args:
+            directory: Directory holding the snapshot and journal files
+            compact_bytes: Journal size that triggers a background snapshot
+        """
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.compact_bytes = compact_bytes
+        self.gate = _WriteGate()
+
+        self._lock = threading.Lock()
+        self._compacting = False
+        self._file = None
+        self._size = 0
+        self.generation = 0
+        self.snapshot_source = None
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Refuse to share the journal with another process
+        self._lock_file = open(os.path.join(directory, ".lock"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            raise RuntimeError(f"Memory store journal {directory} is in use by another process")
+
+    def _journal_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"journal-{generation}.bin")
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.directory, "snapshot.bin")
+
+    def _generations(self) -> List[int]:
+        return sorted(int(m.group(1)) for m in map(_JOURNAL_NAME.match, os.listdir(self.directory)) if m)
+
+    def _set_aside(self, reason: str) -> None:
+        """Move the snapshot and journals into a subdirectory so the store starts empty without losing them"""
+        aside = os.path.join(self.directory, f"unreadable-{datetime.now():%Y%m%d-%H%M%S}")
+        os.makedirs(aside, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if name == "snapshot.bin" or _JOURNAL_NAME.match(name):
+                os.replace(os.path.join(self.directory, name), os.path.join(aside, name))
+        self.logger.error(f"{reason}; starting with an empty store, previous files moved to {aside}")
+
+    def _readable_snapshot(self) -> bool:
+        """
+        Check the snapshot header. marshal reads the formats of earlier Python
+        versions, so only a snapshot from a newer Python, or not a snapshot at
+        all, is unreadable.
+        """
+        with open(self._snapshot_path(), "rb") as f:
+            magic, version, _ = _SNAPSHOT_HEADER.unpack(f.read(_SNAPSHOT_HEADER.size))
+        return magic == _SNAPSHOT_MAGIC and version <= marshal.version
+
+    def restore(self) -> Iterator[Tuple[int, Any]]:
+        """
+        Replay the last snapshot followed by every journal after it, memory-mapped.
+        Opens the journal for appending once the replay is consumed. A snapshot
+        this interpreter cannot read is set aside with its journals, and the
+        store starts empty.
+
+        Yields:
+            (op, payload) in the order the mutations happened
+        """
+        snapshot_generation = 0
+        path = self._snapshot_path()
+        if os.path.exists(path) and os.path.getsize(path) >= _SNAPSHOT_HEADER.size and not self._readable_snapshot():
+            self._set_aside(f"Unsupported memory store snapshot format in {path}")
+        if os.path.exists(path) and os.path.getsize(path) >= _SNAPSHOT_HEADER.size:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                _, _, snapshot_generation = _SNAPSHOT_HEADER.unpack_from(data, 0)
+                for op, payload, _ in _iter_frames(memoryview(data), _SNAPSHOT_HEADER.size):
+                    yield op, payload
+
+        generations = [g for g in self._generations() if g >= snapshot_generation]
+        for generation in generations:
+            journal_path = self._journal_path(generation)
+            good_end = 0
+            if os.path.getsize(journal_path):
+                with open(journal_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    for op, payload, good_end in _iter_frames(memoryview(data)):
+                        yield op, payload
+            if good_end < os.path.getsize(journal_path):
+                # Drop a record torn by a crash mid-write
+                self.logger.warning(f"Truncating torn tail of {journal_path} at byte {good_end}")
+                os.truncate(journal_path, good_end)
+
+        self.generation = max(generations + [snapshot_generation])
+        self._open(self.generation)
+
+    def _open(self, generation: int) -> None:
+        if self._file:
+            self._file.close()
+        self._file = open(self._journal_path(generation), "ab")
+        self._size = self._file.tell()
+        self.generation = generation
+
+    def append(self, op: int, payload: Any) -> None:
+        """Write one mutation to the OS, without fsync; the caller holds the gate in shared mode"""
+        body = _encode(payload)
+        frame = _FRAME.pack(op, len(body), zlib.crc32(body)) + body
+        with self._lock:
+            self._file.write(frame)
+            self._file.flush()
+            self._size += len(frame)
+            due = self._size >= self.compact_bytes and not self._compacting and self.snapshot_source
+            if due:
+                self._compacting = True
+
+        if due:
+            threading.Thread(target=self._compact_in_background, name="memory-store-snapshot", daemon=True).start()
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.snapshot(self.snapshot_source)
+        except Exception as e:
+            self.logger.error(f"Memory store snapshot failed: {str(e)}")
+        finally:
+            self._compacting = False
+
+    def snapshot(self, source) -> Dict[str, Any]:
+        """
+        Write a snapshot of the current state and drop the journals it covers
+
+        Args:
+            source: Callable returning the state as an iterable of (op, payload) records;
+                called while mutations are paused, so it should only collect references
+                and leave encoding to the iteration, which happens after they resume
+
+        Returns:
+            Generation, record count and snapshot size
+        """
+        # Pause mutations just long enough to switch journals and collect references
+        with self.gate.exclusive():
+            with self._lock:
+                self._open(self.generation + 1)
+            generation = self.generation
+            records = source()
+
+        tmp_path = self._snapshot_path() + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, marshal.version, generation))
+            count = 0
+            for op, payload in records:
+                count += 1
+                body = _encode(payload)
+                f.write(_FRAME.pack(op, len(body), zlib.crc32(body)))
+                f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path())
+
+        for old in self._generations():
+            if old < generation:
+                os.remove(self._journal_path(old))
+
+        size = os.path.getsize(self._snapshot_path())
+        self.logger.info(f"Memory store snapshot written: {count} records, {size} bytes, generation {generation}")
+        return {"generation": generation, "records": count, "size_bytes": size}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+        self._lock_file.close()
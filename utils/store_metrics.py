@@ -0,0 +1,196 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+# How many rollup buckets are kept and reported
+MINUTE_RETENTION = 120
+HOUR_RETENTION = 48
+
+CONFIDENCE_BINS = 10
+
+# Upper bounds of the stage latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+MINUTE_FORMAT = "%Y%m%d%H%M"
+HOUR_FORMAT = "%Y%m%d%H"
+
+# Counter keys are "<scope>|<metric>|<value>" where scope is "t" for all time,
+# "m|<minute>" or "h|<hour>"; bucket stamps are fixed width so keys sort by time.
+
+def metric_increments(entry: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Counter increments for one stored classification
+
+    Args:
+        entry: Stored classification record
+        now: Time used to pick the rollup buckets
+
+    Returns:
+        Counter key to increment
+    """
+    now = now or datetime.now()
+    increments: Dict[str, int] = {}
+
+    dimensions = [
+        ("documents", ""),
+        ("format", entry.get("document_format") or "unknown"),
+        ("intent", entry.get("business_intent") or "unknown")
+    ]
+
+    routing = entry.get("routing_decisions") or {}
+    for escalation in routing.get("escalations", []):
+        dimensions.append(("escalation", escalation.get("escalation_type", "unknown")))
+
+    if _is_fallback(entry):
+        dimensions.append(("fallback", ""))
+
+    confidence = entry.get("confidence_score")
+    if isinstance(confidence, (int, float)):
+        bin_index = min(int(confidence * CONFIDENCE_BINS), CONFIDENCE_BINS - 1)
+        dimensions.append(("confidence", str(max(bin_index, 0))))
+
+    for stage, elapsed_ms in (entry.get("stage_timings_ms") or {}).items():
+        dimensions.append(("latency", f"{stage}:{bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)}"))
+
+    for scope in _scopes(now):
+        for metric, value in dimensions:
+            key = f"{scope}|{metric}|{value}"
+            increments[key] = increments.get(key, 0) + 1
+
+    return increments
+
+_scope_cache = (None, ())
+
+def _scopes(now: datetime) -> tuple:
+    """Counter scopes a result stored at this time counts in; formatted once per minute"""
+    global _scope_cache
+    minute = now.replace(second=0, microsecond=0)
+    cached_minute, scopes = _scope_cache
+    if minute != cached_minute:
+        scopes = ("t", f"m|{now.strftime(MINUTE_FORMAT)}", f"h|{now.strftime(HOUR_FORMAT)}")
+        _scope_cache = (minute, scopes)
+    return scopes
+
+def rollup_cutoffs(now: Optional[datetime] = None) -> Dict[str, str]:
+    """Oldest rollup key prefix to keep per scope; older buckets can be pruned"""
+    now = now or datetime.now()
+    return {
+        "m": "m|" + (now - timedelta(minutes=MINUTE_RETENTION)).strftime(MINUTE_FORMAT),
+        "h": "h|" + (now - timedelta(hours=HOUR_RETENTION)).strftime(HOUR_FORMAT)
+    }
+
+def summarize(counters: Dict[str, int], minutes: int = 60, hours: int = 24, window_minutes: Optional[int] = None,
+              now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Turn raw counters into the dashboard analytics view
+
+    Args:
+        counters: Counter key to value, as kept by the store backend
+        minutes: Number of most recent per-minute buckets to report
+        hours: Number of most recent per-hour buckets to report
+        window_minutes: If set, also report totals, histogram and percentiles over
+            the last this many minutes (at most MINUTE_RETENTION)
+        now: End of the window
+
+    Returns:
+        Totals, rates, histograms, latency percentiles and rollup series
+    """
+    totals: Dict[str, Dict[str, int]] = {}
+    buckets: Dict[str, Dict[str, Dict[str, Dict[str, int]]]] = {"m": {}, "h": {}}
+
+    for key, value in counters.items():
+        parts = key.split("|")
+        if parts[0] == "t":
+            totals.setdefault(parts[1], {})[parts[2]] = value
+        elif parts[0] in buckets:
+            buckets[parts[0]].setdefault(parts[1], {}).setdefault(parts[2], {})[parts[3]] = value
+
+    analytics = {
+        **_view(totals),
+        "per_minute": _series(buckets["m"], minutes, MINUTE_FORMAT),
+        "per_hour": _series(buckets["h"], hours, HOUR_FORMAT)
+    }
+
+    if window_minutes:
+        window_minutes = min(window_minutes, MINUTE_RETENTION)
+        oldest = ((now or datetime.now()) - timedelta(minutes=window_minutes - 1)).strftime(MINUTE_FORMAT)
+        merged: Dict[str, Dict[str, int]] = {}
+        for stamp, metrics in buckets["m"].items():
+            if stamp < oldest:
+                continue
+            for metric, values in metrics.items():
+                target = merged.setdefault(metric, {})
+                for value, count in values.items():
+                    target[value] = target.get(value, 0) + count
+        analytics["window"] = {"minutes": window_minutes, **_view(merged)}
+
+    return analytics
+
+def _view(metrics: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+    """Totals, rates, confidence histogram and latency percentiles of one set of counters"""
+    documents = metrics.get("documents", {}).get("", 0)
+    fallbacks = metrics.get("fallback", {}).get("", 0)
+
+    return {
+        "documents": documents,
+        "by_format": metrics.get("format", {}),
+        "by_intent": metrics.get("intent", {}),
+        "escalations_by_type": metrics.get("escalation", {}),
+        "fallback_count": fallbacks,
+        "fallback_rate": round(fallbacks / documents, 4) if documents else 0.0,
+        "confidence_histogram": [
+            {
+                "range": f"{i / CONFIDENCE_BINS:.1f}-{(i + 1) / CONFIDENCE_BINS:.1f}",
+                "count": metrics.get("confidence", {}).get(str(i), 0)
+            }
+            for i in range(CONFIDENCE_BINS)
+        ],
+        "stage_latency_ms": _latency_percentiles(metrics.get("latency", {}))
+    }
+
+def _is_fallback(entry: Dict[str, Any]) -> bool:
+    """Whether any stage fell back to rule-based processing"""
+    if entry.get("model_used") == "fallback":
+        return True
+    specialized = entry.get("specialized_analysis") or {}
+    if specialized.get("model_used") == "fallback":
+        return True
+    return (entry.get("routing_decisions") or {}).get("routing_decision") == "fallback"
+
+def _latency_percentiles(histograms: Dict[str, int]) -> Dict[str, Dict[str, Any]]:
+    """Approximate p50/p95/p99 per stage from bucket counts (bucket upper bounds)"""
+    per_stage: Dict[str, List[int]] = {}
+    for key, count in histograms.items():
+        stage, bucket = key.rsplit(":", 1)
+        per_stage.setdefault(stage, [0] * (len(LATENCY_BUCKETS_MS) + 1))[int(bucket)] += count
+
+    report = {}
+    for stage, counts in per_stage.items():
+        total = sum(counts)
+        report[stage] = {"count": total}
+        for name, quantile in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            rank = quantile * total
+            seen = 0
+            for index, count in enumerate(counts):
+                seen += count
+                if seen >= rank:
+                    report[stage][name] = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+                    break
+    return report
+
+def _series(scope_buckets: Dict[str, Dict[str, Dict[str, int]]], limit: int, stamp_format: str) -> List[Dict[str, Any]]:
+    """Most recent rollup buckets, oldest first"""
+    series = []
+    for stamp in sorted(scope_buckets)[-limit:]:
+        metrics = scope_buckets[stamp]
+        series.append({
+            "bucket": datetime.strptime(stamp, stamp_format).isoformat(),
+            "documents": metrics.get("documents", {}).get("", 0),
+            "by_format": metrics.get("format", {}),
+            "by_intent": metrics.get("intent", {}),
+            "escalations": metrics.get("escalation", {}),
+            "fallbacks": metrics.get("fallback", {}).get("", 0),
+            "confidence_histogram": [metrics.get("confidence", {}).get(str(i), 0) for i in range(CONFIDENCE_BINS)],
+            "stage_latency_ms": _latency_percentiles(metrics.get("latency", {}))
+        })
+    return series
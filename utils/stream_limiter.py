@@ -0,0 +1,53 @@
+import os
+import threading
+from typing import Dict, Any
+
+# Event streams one process serves at once; gunicorn.conf.py sets this from the worker's thread count
+SSE_MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", 8))
+SSE_RETRY_AFTER = int(os.environ.get("SSE_RETRY_AFTER", 30))
+
+class StreamLimiter:
+    """
+    Cap on the server-sent event streams a process serves at once.
+    Under threaded gunicorn workers each open stream holds one of the
+    worker's request threads for as long as its client stays connected, so
+    streams past the cap are turned away and ordinary requests always find
+    a free thread. Turned-away clients fall back to polling.
+    """
+
+    def __init__(self, max_streams: int = SSE_MAX_STREAMS):
+        """
+        Initialize the limiter
+
+        Args:
+            max_streams: Streams served at once; 0 turns every stream away
+        """
+        self.max_streams = max_streams
+        self.active = 0
+        self.served = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Take a stream slot; False if all are in use"""
+        with self._lock:
+            if self.active >= self.max_streams:
+                self.rejected += 1
+                return False
+            self.active += 1
+            self.served += 1
+            return True
+
+    def release(self) -> None:
+        """Give back a slot taken by acquire()"""
+        with self._lock:
+            self.active -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active_streams": self.active,
+                "max_streams": self.max_streams,
+                "streams_served": self.served,
+                "streams_rejected": self.rejected
+            }
@@ -0,0 +1,105 @@
+import itertools
+from typing import List, Optional, Tuple
+
+from utils.records import TraceEntry
+
+class TraceRingBuffer:
+    """
+    Fixed-capacity ring buffer of trace log entries.
+    Entries get monotonic sequence numbers, so the buffer is always in
+    insertion order and reads cost O(k) in the number of entries returned.
+
+    Appends take no lock: the sequence number comes from an atomic counter
+    and the slot store is a single list assignment. A reader can briefly see
+    a sequence number whose slot is not written yet; it treats that as the
+    end of the log and picks the entry up on its next read.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        """Initialize the ring buffer"""
+        if capacity < 1:
+            raise ValueError("Trace buffer capacity must be positive")
+        self.capacity = capacity
+        self._slots: List[Optional[TraceEntry]] = [None] * capacity
+        self._counter = itertools.count(1)
+        self._hint = 0
+        self._floor = 1
+
+    def append(self, entry: TraceEntry) -> int:
+        """Store an entry, overwriting the oldest one when full; returns its sequence number"""
+        seq = next(self._counter)
+        entry.seq = seq
+        self._slots[seq % self.capacity] = entry
+        self._hint = seq
+        return seq
+
+    def _seq_at(self, seq: int) -> Optional[TraceEntry]:
+        """The entry with this sequence number, or None if not written yet or overwritten"""
+        entry = self._slots[seq % self.capacity]
+        return entry if entry is not None and entry.seq == seq else None
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the newest fully written entry, 0 if empty"""
+        # The hint only ever points at a written entry but can lag concurrent appends
+        seq = self._hint
+        entry = self._slots[seq % self.capacity] if seq else None
+        if entry is not None and entry.seq > seq:
+            seq = entry.seq
+        while self._seq_at(seq + 1) is not None:
+            seq += 1
+        return max(seq, self._floor - 1)
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest retained entry"""
+        return max(self._floor, self.last_seq - self.capacity + 1)
+
+    def __len__(self) -> int:
+        last = self.last_seq
+        return last - max(self._floor, last - self.capacity + 1) + 1
+
+    def latest(self, limit: Optional[int] = None) -> List[TraceEntry]:
+        """Most recent entries, newest first"""
+        last = self.last_seq
+        first = max(self._floor, last - self.capacity + 1)
+        count = last - first + 1 if not limit else min(limit, last - first + 1)
+
+        entries = []
+        for seq in range(last, last - count, -1):
+            entry = self._seq_at(seq)
+            if entry is None:
+                break
+            entries.append(entry)
+        return entries
+
+    def since(self, cursor: int, limit: Optional[int] = None) -> Tuple[List[TraceEntry], int, bool]:
+        """
+        Entries newer than a cursor, oldest first
+
+        Args:
+            cursor: Last sequence number the caller has seen
+            limit: Maximum number of entries to return
+
+        Returns:
+            (entries, next cursor, whether entries after the cursor were overwritten)
+        """
+        last = self.last_seq
+        if cursor > last:
+            # Cursor from before a restart: replay everything retained
+            cursor = 0
+        start = max(cursor + 1, self._floor, last - self.capacity + 1)
+        truncated = cursor + 1 < start
+        end = last if not limit else min(last, start + limit - 1)
+
+        entries = []
+        for seq in range(start, end + 1):
+            entry = self._seq_at(seq)
+            if entry is None:
+                break
+            entries.append(entry)
+        return entries, (entries[-1].seq if entries else max(cursor, 0)), truncated
+
+    def clear(self) -> None:
+        """Drop all entries; sequence numbers keep increasing"""
+        self._floor = self.last_seq + 1